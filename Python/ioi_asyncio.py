@@ -0,0 +1,278 @@
+# ioi_asyncio.py
+
+import asyncio
+import itertools
+import time
+import blpapi
+
+from ioi_metrics import requestLatency, requestFailures
+
+SESSION_STARTED                 = blpapi.Name("SessionStarted")
+SESSION_TERMINATED              = blpapi.Name("SessionTerminated")
+SESSION_STARTUP_FAILURE         = blpapi.Name("SessionStartupFailure")
+SERVICE_OPENED                  = blpapi.Name("ServiceOpened")
+SERVICE_OPEN_FAILURE            = blpapi.Name("ServiceOpenFailure")
+AUTHORIZATION_FAILURE           = blpapi.Name("AuthorizationFailure")
+
+# Correlation ids allocated by AsyncSession start here, well clear of the small
+# fixed ids the sample scripts use for their own requests and subscriptions
+d_firstCorrelationId = 1 << 24
+
+# Creates the session AsyncSession wraps, as blpapi.Session(sessionOptions,
+# handler); ioi_simulator replaces it to run the samples offline
+d_sessionFactory = blpapi.Session
+
+RESPONSE_EVENTS = (blpapi.Event.PARTIAL_RESPONSE, blpapi.Event.RESPONSE, blpapi.Event.REQUEST_STATUS)
+SUBSCRIPTION_EVENTS = (blpapi.Event.SUBSCRIPTION_DATA, blpapi.Event.SUBSCRIPTION_STATUS)
+
+
+class RequestError(Exception):
+
+    # Raised into the awaiting coroutine with the blpapi message that failed it
+
+    def __init__(self, msg):
+        Exception.__init__(self, str(msg))
+        self.msg = msg
+
+
+class AsyncSession():
+
+    # Bridges a blpapi.Session into an asyncio event loop. The blpapi dispatcher
+    # thread hands each relevant event to the loop with call_soon_threadsafe,
+    # where it resolves the future of whatever is waiting on it: session start
+    # and stop, service opens, and requests, which resolve with their response
+    # messages. An optional handler still receives every event on the
+    # dispatcher thread, so existing SessionEventHandler classes keep working.
+
+    def __init__(self, sessionOptions, handler=None):
+
+        self.loop = asyncio.get_running_loop()
+        self.handler = handler
+        self.correlationIds = itertools.count(d_firstCorrelationId)
+
+        self.started = self.loop.create_future()
+        self.terminated = self.loop.create_future()
+        self.services = {}
+        self.requests = {}
+        self.subscriptions = {}
+
+        self.session = d_sessionFactory(sessionOptions, self.__onEvent)
+
+    def __nextCorrelationId(self):
+        return blpapi.CorrelationId(next(self.correlationIds))
+
+    def __onEvent(self, event, session):
+
+        # Dispatcher thread
+        if self.handler is not None:
+            self.handler(event, session)
+
+        eventType = event.eventType()
+
+        if eventType in SUBSCRIPTION_EVENTS:
+            # Subscriptions made directly on the session, as the subscriber's,
+            # are the handler's alone; the event is not walked for them
+            if not self.subscriptions:
+                return
+            messages = [m for m in event if m.correlationIds() and m.correlationIds()[0].value() in self.subscriptions]
+        else:
+            messages = list(event)
+
+        if messages:
+            try:
+                self.loop.call_soon_threadsafe(self.__dispatch, eventType, messages)
+            except RuntimeError:
+                pass  # loop already closed during shutdown
+
+    def __dispatch(self, eventType, messages):
+
+        for msg in messages:
+
+            if eventType == blpapi.Event.SESSION_STATUS:
+                self.__processSessionStatus(msg)
+
+            elif eventType == blpapi.Event.SERVICE_STATUS:
+                self.__resolve(self.services, msg, msg.messageType() == SERVICE_OPENED)
+
+            elif eventType in RESPONSE_EVENTS:
+                self.__processResponse(eventType, msg)
+
+            elif eventType in SUBSCRIPTION_EVENTS:
+                queue = self.subscriptions.get(msg.correlationIds()[0].value())
+                if queue is not None:
+                    queue.put_nowait(msg)
+
+    def __processSessionStatus(self, msg):
+
+        if msg.messageType() == SESSION_STARTED:
+            if not self.started.done():
+                self.started.set_result(msg)
+
+        elif msg.messageType() == SESSION_STARTUP_FAILURE:
+            if not self.started.done():
+                self.started.set_exception(RequestError(msg))
+
+        elif msg.messageType() == SESSION_TERMINATED:
+            if not self.terminated.done():
+                self.terminated.set_result(msg)
+            for future in list(self.services.values()) + [f for f, partial in self.requests.values()]:
+                if not future.done():
+                    future.set_exception(RequestError(msg))
+
+    def __resolve(self, pending, msg, success):
+
+        for cid in msg.correlationIds():
+            future = pending.pop(cid.value(), None)
+            if future is not None and not future.done():
+                if success:
+                    future.set_result(msg)
+                else:
+                    future.set_exception(RequestError(msg))
+
+    def __processResponse(self, eventType, msg):
+
+        for cid in msg.correlationIds():
+            entry = self.requests.get(cid.value())
+            if entry is None:
+                continue
+
+            future, partial = entry
+            if eventType == blpapi.Event.PARTIAL_RESPONSE:
+                partial.append(msg)
+                continue
+
+            del self.requests[cid.value()]
+            if future.done():
+                continue
+
+            if eventType == blpapi.Event.RESPONSE:
+                partial.append(msg)
+                future.set_result(partial)
+            else:
+                future.set_exception(RequestError(msg))
+
+    async def start(self):
+
+        if not self.session.startAsync():
+            raise RuntimeError("Failed to start session.")
+
+        return await self.started
+
+    async def openService(self, serviceName):
+
+        cid = self.__nextCorrelationId()
+        future = self.services[cid.value()] = self.loop.create_future()
+
+        if not self.session.openServiceAsync(serviceName, cid):
+            del self.services[cid.value()]
+            raise RuntimeError("Failed to open service %s" % serviceName)
+
+        await self.__timed("serviceOpen", future)
+        return self.session.getService(serviceName)
+
+    async def __timed(self, operation, future, started=None):
+
+        # Records the time until future resolves, from started if given;
+        # operation None records nothing
+        if operation is None:
+            return await future
+
+        if started is None:
+            started = time.perf_counter()
+        try:
+            return await future
+        except RequestError:
+            requestFailures(operation, "error").inc()
+            raise
+        finally:
+            requestLatency(operation).record(time.perf_counter() - started)
+
+    def __track(self, send, operation=None):
+
+        # Registers a response future before send(cid) is called, so a reply
+        # can never arrive ahead of its registration. The request is sent
+        # before this returns; the result is awaited for its response.
+        cid = self.__nextCorrelationId()
+        future = self.loop.create_future()
+        self.requests[cid.value()] = (future, [])
+
+        started = time.perf_counter()
+        try:
+            send(cid)
+        except Exception:
+            del self.requests[cid.value()]
+            raise
+
+        return self.__response(cid, operation, future, started)
+
+    async def __response(self, cid, operation, future, started):
+
+        try:
+            return await self.__timed(operation, future, started)
+        finally:
+            self.requests.pop(cid.value(), None)
+
+    def sendRequest(self, request, identity=None, operation=None):
+
+        # Sends the request at once and returns an awaitable that resolves with
+        # the list of response messages (partials first), or raises
+        # RequestError if the request fails or the session terminates. With an
+        # operation name, such as "createIoi", its latency is recorded in
+        # ioi_metrics.
+        return self.__track(
+            lambda cid: self.session.sendRequest(request, identity=identity, correlationId=cid), operation)
+
+    async def authorize(self, authRequest):
+
+        # Resolves with a newly authorized Identity
+        identity = self.session.createIdentity()
+
+        messages = await self.__track(
+            lambda cid: self.session.sendAuthorizationRequest(authRequest, identity, cid), "authorization")
+
+        for msg in messages:
+            if msg.messageType() == AUTHORIZATION_FAILURE:
+                requestFailures("authorization", "error").inc()
+                raise RequestError(msg)
+
+        return identity
+
+    def subscribe(self, topic, options=None):
+
+        # Returns an asyncio.Queue receiving the topic's status and data messages
+        cid = self.__nextCorrelationId()
+        queue = self.subscriptions[cid.value()] = asyncio.Queue()
+
+        subscriptions = blpapi.SubscriptionList()
+        subscriptions.add(topic=topic, options=options, correlationId=cid)
+        self.session.subscribe(subscriptions)
+
+        return queue
+
+    async def stop(self):
+
+        if not self.terminated.done():
+            self.session.stopAsync()
+        await self.terminated
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
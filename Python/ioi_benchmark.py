@@ -0,0 +1,307 @@
+# ioi_benchmark.py
+
+import argparse
+import datetime
+import json
+import logging
+import random
+import sys
+import time
+import tracemalloc
+import blpapi
+
+from ioi_fields import IOIFieldExtractor
+from ioi_columnar import IOIColumnBatch
+from ioi_bulk import buildRequest
+from ioi_template import RequestTemplate, Param
+from ioi_simulator import IOIServiceSimulator, syntheticIOI, STRUCTURES
+import py_dapi_SubscribeIOI
+
+IOI_DATA                        = blpapi.Name("Ioidata")
+
+d_messages = 5000           # Ioidata messages per corpus
+d_requests = 2000           # requests per build variant
+d_ticksPerEvent = 10
+d_seed = 1
+
+# A benchmark more than this much slower (msgs/sec) than the baseline fails
+# --compare
+d_tolerance = 0.20
+
+# Fields a typical early filter looks at before dropping an IOI
+FILTER_FIELDS = ["ioi_instrument_type", "ioi_instrument_stock_security_ticker",
+                 "ioi_bid_price_fixed_price", "ioi_offer_price_fixed_price"]
+
+# Ioidata corpora: (name, syntheticIOI arguments)
+CORPORA = [
+    ("stock fixed",         dict(legs=0)),
+    ("stock pegged",        dict(legs=0, pegged=True)),
+    ("option 1 leg",        dict(legs=1)),
+    ("option 2 legs",       dict(legs=2)),
+    ("option 3 legs",       dict(legs=3)),
+    ("option 4 legs",       dict(legs=4)),
+    ("option 2 pegged",     dict(legs=2, pegged=True)),
+    ("stock qualifiers",    dict(legs=0, qualifiers=5)),
+    ("option 4 qualifiers", dict(legs=4, qualifiers=5)),
+]
+
+# Request variants: (name, operation, requestSpec arguments)
+VARIANTS = [
+    ("create stock",        "createIoi", dict(legs=0)),
+    ("create stock pegged", "createIoi", dict(legs=0, pegged=True)),
+    ("create option 1 leg", "createIoi", dict(legs=1)),
+    ("create option 2 legs", "createIoi", dict(legs=2)),
+    ("create option 4 legs", "createIoi", dict(legs=4)),
+    ("create qualifiers",   "createIoi", dict(legs=2, qualifiers=5)),
+    ("update stock",        "updateIoi", dict(legs=0)),
+    ("update option 2 legs", "updateIoi", dict(legs=2)),
+    ("cancel",              "cancelIoi", dict()),
+]
+
+
+def requestSpec(operation, legs=0, pegged=False, qualifiers=0, params=False):
+
+    # Request body in the nested form buildRequest takes. With params, the
+    # goodUntil, price and size fields are Param placeholders for a template.
+    handle = {"value": "d10e9ea6-7d84-4e1f-b7c0-7b2ac2cd0c5a"}
+    if operation == "cancelIoi":
+        return {"handle": handle}
+
+    if legs == 0:
+        instrument = {"stock": {"security": {"ticker": "VOD LN Equity"}}}
+    else:
+        instrument = {"option": {
+            "structure": STRUCTURES[legs],
+            "legs": [{
+                "type": "Call",
+                "strike": 230 + 10 * i,
+                "expiry": datetime.datetime(2017,12,15,12),
+                "style": "European",
+                "ratio": 1.0 if i % 2 == 0 else -1.0,
+                "exchange": "LN",
+                "underlying": {"ticker": "VOD LN Equity"},
+            } for i in range(legs)],
+        }}
+
+    def quote(side, price, size):
+        if params:
+            price, size = Param(side + "Price"), Param(side + "Size")
+        if pegged:
+            body = {"price": {"pegged": {"offsetAmount": 0.05, "offsetFrom": "MID", "limitPrice": price}}}
+        else:
+            body = {"price": {"fixed": {"price": price, "currency": "GBp"}}}
+        body["size"] = {"quantity": size}
+        body["referencePrice"] = {"price": 202.15, "currency": "GBp"}
+        body["notes"] = side + " notes"
+        if qualifiers:
+            body["qualifiers"] = ["AT_OPEN", "AT_CLOSE", "NATURAL", "VWAP", "IN_TOUCH"][:qualifiers]
+        return body
+
+    spec = {"ioi": {
+        "goodUntil": Param("goodUntil") if params else datetime.datetime.utcnow() + datetime.timedelta(0,900),
+        "instrument": instrument,
+        "bid": quote("bid", 83.63, 1000),
+        "offer": quote("offer", 83.64, 2000),
+        "targets": {"includes": [{"acronym": "BLPA"}, {"acronym": "BLPB"}]},
+    }}
+
+    if operation == "updateIoi":
+        spec["handle"] = handle
+
+    return spec
+
+
+def ioidataCorpus(simulator, rng, count, **kind):
+
+    # SUBSCRIPTION_DATA events holding count synthetic Ioidata messages
+    correlationId = blpapi.CorrelationId(1)
+    events = []
+
+    for start in range(0, count, d_ticksPerEvent):
+        ticks = [syntheticIOI(rng, "BENCH-%08d" % i, **kind) for i in range(start, min(count, start + d_ticksPerEvent))]
+        events.append(simulator.dataEvent(ticks, correlationId))
+
+    return events
+
+
+def measure(name, items, call):
+
+    # items are (argument, messages) pairs; each call processes that many
+    # messages. Timing and allocation tracing run as separate passes, since
+    # tracemalloc distorts the timings.
+    latencies = []
+    messages = 0
+
+    started = time.perf_counter_ns()
+    for argument, count in items:
+        t0 = time.perf_counter_ns()
+        call(argument)
+        latencies.append((time.perf_counter_ns() - t0) / float(count))
+        messages += count
+    elapsed = time.perf_counter_ns() - started
+
+    tracemalloc.start()
+    allocated = 0
+    for argument, count in items:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        call(argument)
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    latencies.sort()
+
+    return {
+        "name": name,
+        "msgsPerSec": messages * 1e9 / elapsed,
+        "p50us": latencies[len(latencies) // 2] / 1000.0,
+        "p99us": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] / 1000.0,
+        "bytesPerMsg": allocated / float(messages),
+    }
+
+
+def decodeBenchmarks(simulator, count, seed):
+
+    full = IOIFieldExtractor()
+
+    py_dapi_SubscribeIOI.log.setLevel(logging.WARNING)
+    handler = py_dapi_SubscribeIOI.SessionEventHandler()
+    batch = IOIColumnBatch(capacity=d_ticksPerEvent)
+
+    def filterView(msg):
+        view = full.view(msg)
+        for field in FILTER_FIELDS:
+            view.get(field)
+
+    def decodeBatch(event):
+        batch.decodeEvent(event, IOI_DATA)
+        batch.clear()
+
+    results = []
+
+    for corpus, kind in CORPORA:
+
+        events = ioidataCorpus(simulator, random.Random(seed), count, **kind)
+        perMessage = [(msg, 1) for event in events for msg in event]
+        perEvent = [(event, len(list(event))) for event in events]
+
+        results.append(measure("decode %s: extract" % corpus, perMessage, full.extract))
+        results.append(measure("decode %s: view filter" % corpus, perMessage, filterView))
+        results.append(measure("decode %s: columnar" % corpus, perEvent, decodeBatch))
+        results.append(measure("decode %s: subscriber" % corpus, perEvent, handler.processSubscriptionDataEvent))
+
+    return results
+
+
+def buildBenchmarks(simulator, count):
+
+    service = simulator.requestService
+    values = {"goodUntil": datetime.datetime.utcnow() + datetime.timedelta(0,900),
+              "bidPrice": 83.63, "bidSize": 1000, "offerPrice": 83.64, "offerSize": 2000}
+    items = [(None, 1)] * count
+
+    results = []
+
+    for variant, operation, kind in VARIANTS:
+
+        spec = requestSpec(operation, **kind)
+        results.append(measure("build %s: buildRequest" % variant, items,
+                               lambda unused: buildRequest(service, operation, spec)))
+
+        template = RequestTemplate(service, operation, requestSpec(operation, params=True, **kind), prepared=0)
+        results.append(measure("build %s: template" % variant, items,
+                               lambda unused: template.create(**values)))
+
+        # Stamping happens ahead of time here, so only the parameter writes
+        # are measured
+        template.prepare(2 * count)
+        results.append(measure("build %s: template prepared" % variant, items,
+                               lambda unused: template.create(**values)))
+
+    return results
+
+
+def report(results, baseline=None, tolerance=d_tolerance):
+
+    # Prints the results, and returns the names of those that regressed
+    # against the baseline
+    reference = dict((r["name"], r) for r in baseline or [])
+    regressions = []
+
+    print("%-52s %12s %10s %10s %10s" % ("benchmark", "msgs/sec", "p50 us", "p99 us", "B/msg"))
+
+    for r in results:
+        line = "%-52s %12.0f %10.2f %10.2f %10.0f" % (r["name"], r["msgsPerSec"], r["p50us"], r["p99us"], r["bytesPerMsg"])
+        base = reference.get(r["name"])
+        if base is not None:
+            change = r["msgsPerSec"] / base["msgsPerSec"] - 1.0
+            line += " %+6.1f%%" % (100.0 * change)
+            if change < -tolerance:
+                line += " REGRESSION"
+                regressions.append(r["name"])
+        print(line)
+
+    return regressions
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark Ioidata decode and IOI request construction")
+    parser.add_argument("--messages", type=int, default=d_messages, help="Ioidata messages per corpus")
+    parser.add_argument("--requests", type=int, default=d_requests, help="requests per build variant")
+    parser.add_argument("--only", choices=("decode", "build"))
+    parser.add_argument("--seed", type=int, default=d_seed)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=d_tolerance)
+    args = parser.parse_args()
+
+    simulator = IOIServiceSimulator(tickRate=0)
+
+    results = []
+    if args.only != "build":
+        results.extend(decodeBenchmarks(simulator, args.messages, args.seed))
+    if args.only != "decode":
+        results.extend(buildBenchmarks(simulator, args.requests))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    regressions = report(results, baseline, args.tolerance)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=1)
+
+    if regressions:
+        print("%d benchmark(s) regressed by more than %.0f%%" % (len(regressions), 100 * args.tolerance))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    print("Bloomberg - IOI API Example - Benchmarks")
+    main()
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
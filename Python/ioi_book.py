@@ -0,0 +1,195 @@
+# ioi_book.py
+
+from ioi_timestamps import TIMESTAMPS, NANOS
+from ioi_record import IOIRecord
+
+HANDLE_FIELDS = ("id_value", "ioi_id")
+
+# Values of the change/state fields that take an IOI out of the live set
+REMOVED = set(["cancel", "cancelled", "canceled", "delete", "deleted", "expire", "expired", "withdrawn"])
+
+MAX_LEGS = 4
+
+UNDERLYING_FIELDS = ["ioi_instrument_stock_security_ticker", "ioi_instrument_stock_security_figi"]
+for i in range(MAX_LEGS):
+    UNDERLYING_FIELDS.append("ioi_instrument_option_legs_%d_underlying_ticker" % i)
+    UNDERLYING_FIELDS.append("ioi_instrument_option_legs_%d_underlying_figi" % i)
+
+BROKER_FIELD = "ioi_routing_broker"
+GOOD_UNTIL_FIELD = "ioi_goodUntil"
+
+# Fields the book needs on every tick, whatever projection the subscriber decodes
+FIELDS = list(HANDLE_FIELDS) + ["change", "state", BROKER_FIELD, GOOD_UNTIL_FIELD] + UNDERLYING_FIELDS
+
+NEW     = "new"
+UPDATE  = "update"
+REMOVE  = "remove"
+
+
+def handleOf(ioi):
+    for field in HANDLE_FIELDS:
+        handle = ioi.get(field)
+        if handle:
+            return handle
+    return None
+
+
+def isRemoval(ioi):
+    for field in ("change", "state"):
+        value = ioi.get(field)
+        if value and value.lower() in REMOVED:
+            return True
+    return False
+
+
+class IOIBook():
+
+    # Live IOIs keyed by handle, holding the latest known value of every field
+    # received for that IOI in an IOIRecord. Ticks are merged in as they
+    # arrive, and secondary indexes map each underlying ticker/FIGI and each
+    # broker to the set of handles that reference it. With an ExpiryWheel, each IOI is scheduled on
+    # its goodUntil and evicted by expire().
+
+    def __init__(self, wheel=None):
+        self.wheel = wheel
+        self.iois = {}
+        self.byUnderlying = {}
+        self.byBroker = {}
+
+    def __len__(self):
+        return len(self.iois)
+
+    def __contains__(self, handle):
+        return handle in self.iois
+
+    def get(self, handle):
+        return self.iois.get(handle)
+
+    def forUnderlying(self, key):
+        return [self.iois[h] for h in self.byUnderlying.get(key, ())]
+
+    def forBroker(self, broker):
+        return [self.iois[h] for h in self.byBroker.get(broker, ())]
+
+    def apply(self, ioi):
+
+        # Applies one decoded tick, as flat fields or an IOIRecord. Returns
+        # (action, handle), with action None when the tick carries no handle
+        # or cancels an IOI that is not held.
+        handle = handleOf(ioi)
+        if handle is None:
+            return None, None
+
+        if isRemoval(ioi):
+            return (REMOVE, handle) if self.remove(handle) is not None else (None, handle)
+
+        current = self.iois.get(handle)
+
+        if current is None:
+            if isinstance(ioi, IOIRecord):
+                current = ioi.copy()
+            else:
+                current = IOIRecord.fromFields(ioi)
+            self.iois[handle] = current
+            self.__index(handle, current)
+            self.__schedule(handle, current.get(GOOD_UNTIL_FIELD))
+            return NEW, handle
+
+        goodUntil = ioi.get(GOOD_UNTIL_FIELD)
+        if goodUntil == current.get(GOOD_UNTIL_FIELD):
+            goodUntil = None
+
+        self.__unindex(handle, current)
+        current.update(ioi)
+        self.__index(handle, current)
+        self.__schedule(handle, goodUntil)
+        return UPDATE, handle
+
+    def expire(self, now):
+
+        # Evicts every IOI whose goodUntil is at or before now (epoch seconds)
+        # and returns their handles
+        if self.wheel is None:
+            return []
+
+        expired = self.wheel.advance(now)
+        for handle in expired:
+            ioi = self.iois.pop(handle, None)
+            if ioi is not None:
+                self.__unindex(handle, ioi)
+
+        return expired
+
+    def remove(self, handle):
+
+        ioi = self.iois.pop(handle, None)
+        if ioi is not None:
+            self.__unindex(handle, ioi)
+            if self.wheel is not None:
+                self.wheel.cancel(handle)
+        return ioi
+
+    def __schedule(self, handle, goodUntil):
+
+        if self.wheel is None or not goodUntil:
+            return
+
+        # Rounded up to the second, so an IOI never expires early
+        deadline = TIMESTAMPS.cached(goodUntil)
+        if deadline is not None:
+            self.wheel.schedule(handle, -(-deadline // NANOS))
+
+    def __keys(self, ioi):
+
+        for field in UNDERLYING_FIELDS:
+            key = ioi.get(field)
+            if key:
+                yield key
+
+    def __index(self, handle, ioi):
+
+        for key in self.__keys(ioi):
+            self.byUnderlying.setdefault(key, set()).add(handle)
+
+        broker = ioi.get(BROKER_FIELD)
+        if broker:
+            self.byBroker.setdefault(broker, set()).add(handle)
+
+    def __unindex(self, handle, ioi):
+
+        for key in self.__keys(ioi):
+            self.__discard(self.byUnderlying, key, handle)
+
+        broker = ioi.get(BROKER_FIELD)
+        if broker:
+            self.__discard(self.byBroker, broker, handle)
+
+    def __discard(self, index, key, handle):
+
+        handles = index.get(key)
+        if handles is not None:
+            handles.discard(handle)
+            if not handles:
+                del index[key]
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
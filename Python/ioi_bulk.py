@@ -0,0 +1,175 @@
+# ioi_bulk.py
+
+import threading
+import blpapi
+
+from ioi_requests import RequestRegistry
+
+HANDLE                          = blpapi.Name("handle")
+VALUE                           = blpapi.Name("value")
+
+d_window = 32
+d_timeout = 30.0            # seconds before an unanswered request is failed
+
+# Correlation ids for bulk requests start here, clear of the ids used by the
+# sample scripts and by AsyncSession
+d_firstCorrelationId = 1 << 28
+
+
+def fillElement(element, value):
+
+    # Populates a request element from nested Python values that mirror the
+    # request schema: a dict sets sub-elements (or the choice, on a choice
+    # element), a list appends array entries, anything else is set as the value
+    if isinstance(value, dict):
+        for name, sub in value.items():
+            if element.datatype() == blpapi.DataType.CHOICE:
+                child = element.setChoice(name)
+            else:
+                child = element.getElement(name)
+            fillElement(child, sub)
+
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            if isinstance(item, (dict, list, tuple)):
+                fillElement(element.appendElement(), item)
+            else:
+                element.appendValue(item)
+
+    else:
+        element.setValue(value)
+
+
+def buildRequest(service, operation, spec):
+
+    # operation is "createIoi", "updateIoi" or "cancelIoi"; spec holds the
+    # request body, e.g. {"handle": {"value": "..."}, "ioi": {...}}
+    request = service.createRequest(operation)
+    fillElement(request.asElement(), spec)
+    return request
+
+
+class BulkResult():
+
+    __slots__ = ("index", "operation", "spec", "correlationId", "handle", "error", "latency")
+
+    def __init__(self, index, operation, spec):
+        self.index = index
+        self.operation = operation
+        self.spec = spec
+        self.correlationId = None
+        self.handle = None
+        self.error = None
+        self.latency = None
+
+    def __repr__(self):
+        if self.error is not None:
+            return "BulkResult(%d %s error=%s)" % (self.index, self.operation, self.error)
+        return "BulkResult(%d %s handle=%s)" % (self.index, self.operation, self.handle)
+
+
+class BulkSubmitter():
+
+    # Pipelines (operation, spec) items through a window of in-flight requests.
+    # Every request carries its own CorrelationId in a RequestRegistry; the
+    # owning handler forwards RESPONSE and REQUEST_STATUS events to
+    # processResponseEvent, and each completed request, answered, failed or
+    # timed out, records the handle or error for that item and sends the next
+    # one. Completions arrive on the blpapi dispatcher thread or the registry's
+    # watchdog, so all bookkeeping happens under a lock.
+    # build(service, operation, spec) creates each request; it defaults to
+    # buildRequest, and a RequestTemplate can be plugged in instead.
+
+    def __init__(self, session, service, items, window=d_window, identity=None, onResult=None,
+                 build=buildRequest, timeout=d_timeout):
+
+        self.session = session
+        self.service = service
+        self.window = window
+        self.identity = identity
+        self.onResult = onResult
+        self.build = build
+
+        self.results = [BulkResult(i, op, spec) for i, (op, spec) in enumerate(items)]
+        self.queued = iter(self.results)
+        self.requests = RequestRegistry(timeout, d_firstCorrelationId)
+        self.completed = 0
+        self.done = threading.Event()
+        self.lock = threading.RLock()
+
+        if not self.results:
+            self.done.set()
+
+    def start(self):
+
+        with self.lock:
+            for i in range(self.window):
+                if not self.__sendNext():
+                    break
+
+    def __sendNext(self):
+
+        for result in self.queued:
+            try:
+                request = self.build(self.service, result.operation, result.spec)
+                pending = self.requests.send(self.session, request, result.operation, self.__onResponse,
+                                             identity=self.identity, context=result)
+                result.correlationId = pending.correlationId
+                return True
+            except Exception as e:
+                result.error = e
+                self.__complete(result)
+
+        return False
+
+    def __onResponse(self, pending):
+
+        result = pending.context
+        result.latency = pending.latency
+
+        if pending.error is not None:
+            result.error = pending.error if isinstance(pending.error, Exception) else pending.error.toString()
+        elif pending.response.messageType() == HANDLE:
+            result.handle = pending.response.getElementAsString(VALUE)
+        else:
+            result.error = pending.response.toString()
+
+        with self.lock:
+            self.__complete(result)
+            self.__sendNext()
+
+    def __complete(self, result):
+
+        self.completed += 1
+        if self.onResult is not None:
+            self.onResult(result)
+        if self.completed == len(self.results):
+            self.requests.close()
+            self.done.set()
+
+    def processResponseEvent(self, event):
+
+        # Returns False for messages that do not belong to this submission
+        return self.requests.processResponseEvent(event)
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
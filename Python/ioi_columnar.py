@@ -0,0 +1,302 @@
+# ioi_columnar.py
+
+import math
+from array import array
+
+from ioi_fields import IOIFieldExtractor
+from ioi_timestamps import TIMESTAMPS
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+FLOAT   = "float64"
+INT     = "int64"
+EPOCH   = "timestamp"
+DICT    = "dictionary"
+OBJECT  = "object"
+
+COLUMN_KINDS = {
+    "Float64":  FLOAT,
+    "Float32":  FLOAT,
+    "Int32":    INT,
+    "Int64":    INT,
+    "Bool":     INT,
+    "String":   DICT,
+    "Datetime": EPOCH,
+}
+
+# Free-text and identifier fields are close to unique per IOI, so they are kept
+# as plain values rather than dictionary-encoded
+FREE_TEXT_FIELDS = set([
+    "ioi_bid_notes",
+    "ioi_offer_notes",
+    "ioi_routing_strategy_brief",
+    "ioi_routing_strategy_detailed",
+    "ioi_routing_id",
+    "ioi_routing_customId",
+    "ioi_id",
+    "id_value",
+    "originalId_value",
+])
+
+NAN = float("nan")
+
+
+def _allocate(kind, capacity):
+
+    if numpy is not None:
+        if kind == FLOAT:
+            return numpy.full(capacity, numpy.nan, dtype=numpy.float64)
+        if kind in (INT, EPOCH):
+            return numpy.zeros(capacity, dtype=numpy.int64)
+        if kind == DICT:
+            return numpy.full(capacity, -1, dtype=numpy.int32)
+    else:
+        if kind == FLOAT:
+            return array("d", [NAN]) * capacity
+        if kind in (INT, EPOCH):
+            return array("q", [0]) * capacity
+        if kind == DICT:
+            return array("i", [-1]) * capacity
+
+    return [None] * capacity
+
+
+def _allocateMask(capacity):
+
+    if numpy is not None:
+        return numpy.zeros(capacity, dtype=numpy.bool_)
+
+    return array("b", [0]) * capacity
+
+
+class IOIColumnBatch():
+
+    # Decodes whole SUBSCRIPTION_DATA events into preallocated columns, one per
+    # projected field: float64 with NaN for absent values, int64 with a validity
+    # mask, int32 dictionary codes (-1 for absent) for categorical strings, and
+    # plain values for free text. Datetimes are decoded to epoch nanoseconds
+    # in int64 columns with a mask, through the shared TimestampDecoder:
+    # sentTime is parsed on every tick, recurring values such as expiries and
+    # goodUntil are looked up in its cache. NumPy is used when available,
+    # otherwise the standard array module. Dictionaries are kept across clear()
+    # so codes stay stable from batch to batch.
+
+    def __init__(self, fields=None, capacity=1024, extractor=None):
+
+        self.extractor = extractor if extractor is not None else IOIFieldExtractor(fields)
+        self.capacity = capacity
+        self.length = 0
+
+        self.kinds = {}
+        self.columns = {}
+        self.masks = {}
+        self.dictionaries = {}
+        self.codes = {}
+
+        for field in self.extractor.fields:
+            kind = COLUMN_KINDS.get(self.extractor.types[field], OBJECT)
+            if kind == DICT and field in FREE_TEXT_FIELDS:
+                kind = OBJECT
+            self.kinds[field] = kind
+            self.columns[field] = _allocate(kind, capacity)
+            if kind in (INT, EPOCH):
+                self.masks[field] = _allocateMask(capacity)
+            elif kind == DICT:
+                self.dictionaries[field] = []
+                self.codes[field] = {}
+
+        self.__buildPlan()
+
+    def __buildPlan(self):
+
+        # Columns are looked up once here, not per message; rebuilt after growth
+        self.plan = tuple(
+            (field, name, get, self.kinds[field], self.columns[field],
+             self.masks.get(field), self.codes.get(field), self.dictionaries.get(field),
+             TIMESTAMPS.parserFor(field) if self.kinds[field] == EPOCH else None)
+            for field, name, get in self.extractor.plan)
+
+    def __grow(self):
+
+        capacity = self.capacity * 2
+
+        for field, kind in self.kinds.items():
+            extra = _allocate(kind, capacity - self.capacity)
+            if numpy is not None and kind != OBJECT:
+                self.columns[field] = numpy.concatenate((self.columns[field], extra))
+            else:
+                self.columns[field].extend(extra)
+            if kind in (INT, EPOCH):
+                extra = _allocateMask(capacity - self.capacity)
+                if numpy is not None:
+                    self.masks[field] = numpy.concatenate((self.masks[field], extra))
+                else:
+                    self.masks[field].extend(extra)
+
+        self.capacity = capacity
+        self.__buildPlan()
+
+    def clear(self):
+
+        # Resets the rows written so far; capacity and dictionaries are kept
+        self.__reset(0, self.length)
+        self.length = 0
+
+    def __reset(self, start, end):
+
+        n = end - start
+
+        for field, name, get, kind, col, mask, codes, dictionary, parse in self.plan:
+            if kind == FLOAT:
+                col[start:end] = _allocate(FLOAT, n)
+            elif kind in (INT, EPOCH):
+                mask[start:end] = _allocateMask(n)
+            elif kind == DICT:
+                col[start:end] = _allocate(DICT, n)
+            else:
+                col[start:end] = [None] * n
+
+    def appendMessage(self, msg):
+
+        # A message that fails to decode leaves no partial row behind
+        if self.length == self.capacity:
+            self.__grow()
+
+        row = self.length
+        try:
+            self.__write(row, msg)
+        except Exception:
+            self.__reset(row, row + 1)
+            raise
+
+        self.length = row + 1
+
+    def __write(self, row, msg):
+
+        el = msg.asElement()
+        has = el.hasElement
+
+        for field, name, get, kind, col, mask, codes, dictionary, parse in self.plan:
+            if not has(name):
+                continue
+            value = get(el, name)
+            if kind == DICT:
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(dictionary)
+                    dictionary.append(value)
+                col[row] = code
+            elif kind == EPOCH:
+                value = parse(value)
+                if value is not None:
+                    col[row] = value
+                    mask[row] = 1
+            else:
+                col[row] = value
+                if mask is not None:
+                    mask[row] = 1
+
+    def decodeEvent(self, event, messageType, onError=None):
+
+        # Appends every message of the given type; returns the number appended.
+        # With onError, a message that fails to decode is skipped and passed to
+        # onError(msg) from inside the except block, and the rest of the event
+        # is still decoded.
+        start = self.length
+
+        for msg in event:
+            if msg.messageType() == messageType:
+                try:
+                    self.appendMessage(msg)
+                except Exception:
+                    if onError is None:
+                        raise
+                    onError(msg)
+
+        return self.length - start
+
+    def column(self, field):
+        return self.columns[field][:self.length]
+
+    def valid(self, field):
+
+        # Validity mask of the rows written so far
+        kind = self.kinds[field]
+        col = self.column(field)
+
+        if kind in (INT, EPOCH):
+            return self.masks[field][:self.length]
+        if kind == FLOAT:
+            return [not math.isnan(v) for v in col] if numpy is None else ~numpy.isnan(col)
+        if kind == DICT:
+            return [c >= 0 for c in col] if numpy is None else col >= 0
+
+        return [v is not None for v in col]
+
+    def values(self, field):
+
+        # Decoded Python values for one column, None where absent
+        kind = self.kinds[field]
+
+        if kind == DICT:
+            dictionary = self.dictionaries[field]
+            return [dictionary[c] if c >= 0 else None for c in self.column(field)]
+        if kind in (INT, EPOCH):
+            return [int(v) if m else None for v, m in zip(self.column(field), self.valid(field))]
+        if kind == FLOAT:
+            return [None if math.isnan(v) else float(v) for v in self.column(field)]
+
+        return list(self.column(field))
+
+    def toArrow(self):
+
+        if pyarrow is None:
+            raise RuntimeError("pyarrow is not installed")
+
+        arrays = []
+
+        for field in self.extractor.fields:
+            kind = self.kinds[field]
+            if kind == DICT:
+                col = numpy.asarray(self.column(field))
+                codes = pyarrow.array(col, type=pyarrow.int32(), mask=col < 0)
+                arrays.append(pyarrow.DictionaryArray.from_arrays(codes, pyarrow.array(self.dictionaries[field], type=pyarrow.string())))
+            elif kind in (INT, EPOCH):
+                arrow = pyarrow.int64() if kind == INT else pyarrow.timestamp("ns", tz="UTC")
+                arrays.append(pyarrow.array(self.column(field), type=arrow, mask=~numpy.asarray(self.valid(field), dtype=bool)))
+            elif kind == FLOAT:
+                arrays.append(pyarrow.array(self.column(field), type=pyarrow.float64(), from_pandas=True))
+            else:
+                arrays.append(pyarrow.array(self.values(field)))
+
+        return pyarrow.RecordBatch.from_arrays(arrays, names=list(self.extractor.fields))
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
@@ -0,0 +1,84 @@
+# ioi_conflation.py
+
+import collections
+import threading
+
+
+class ConflatingQueue():
+
+    # Hand-off between the blpapi dispatcher thread and a consumer, keyed by
+    # IOI handle. A tick for an IOI that is still queued is merged into the
+    # queued record instead of being queued again, so a consumer that falls
+    # behind receives one record per IOI holding its latest fields, and its
+    # work grows with the number of distinct IOIs rather than with tick
+    # volume. IOIs keep the queue position of their first pending tick;
+    # conflated counts the intermediate updates that were merged away.
+
+    def __init__(self):
+        self.pending = collections.OrderedDict()
+        self.condition = threading.Condition()
+        self.conflated = 0
+        self.closed = False
+
+    def __len__(self):
+        return len(self.pending)
+
+    def put(self, handle, ioi):
+
+        with self.condition:
+            queued = self.pending.get(handle)
+            if queued is None:
+                self.pending[handle] = dict(ioi)
+                self.condition.notify()
+            else:
+                queued.update(ioi)
+                self.conflated += 1
+
+    def get(self, timeout=None):
+
+        # Oldest (handle, ioi), or None once closed and drained, or on timeout
+        with self.condition:
+            if not self.pending and not self.closed:
+                self.condition.wait(timeout)
+            if not self.pending:
+                return None
+            return self.pending.popitem(last=False)
+
+    def drain(self, timeout=None):
+
+        # Every queued (handle, ioi), oldest first, waiting up to timeout for
+        # the first one; empty once closed and drained, or on timeout
+        with self.condition:
+            if not self.pending and not self.closed:
+                self.condition.wait(timeout)
+            items = list(self.pending.items())
+            self.pending.clear()
+            return items
+
+    def close(self):
+
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
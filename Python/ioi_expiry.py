@@ -0,0 +1,118 @@
+# ioi_expiry.py
+
+import math
+
+SLOT_BITS   = 6
+SLOTS       = 1 << SLOT_BITS
+SLOT_MASK   = SLOTS - 1
+LEVELS      = 4
+
+# Longest delay the wheel can represent (64^4 seconds, about 194 days). Later
+# deadlines are parked in the top level and re-placed when it cascades.
+SPAN = 1 << (SLOT_BITS * LEVELS)
+
+class ExpiryWheel():
+
+    # Hierarchical timing wheel with one-second ticks: four levels of 64 slots
+    # covering 64s, ~68m, ~3d and ~194d. schedule() and cancel() are O(1), and
+    # an entry moves down a level at most three times before it expires, so the
+    # cost per IOI is amortized O(1) regardless of how many are live.
+
+    def __init__(self, now):
+        self.now = int(now)
+        self.levels = [[{} for i in range(SLOTS)] for l in range(LEVELS)]
+        self.where = {}
+
+    def __len__(self):
+        return len(self.where)
+
+    def __place(self, key, deadline, earliest):
+
+        # Deadlines already due go into the earliest slot still to be processed
+        delta = deadline - self.now
+        if delta < earliest:
+            deadline = self.now + earliest
+            delta = earliest
+
+        position = min(deadline, self.now + SPAN - 1)
+
+        level = 0
+        while delta >= (1 << (SLOT_BITS * (level + 1))) and level < LEVELS - 1:
+            level += 1
+
+        slot = self.levels[level][(position >> (SLOT_BITS * level)) & SLOT_MASK]
+        slot[key] = deadline
+        self.where[key] = slot
+
+    def schedule(self, key, deadline):
+
+        # (Re)schedules key to expire at the given epoch second
+        self.cancel(key)
+        self.__place(key, int(math.ceil(deadline)), 1)
+
+    def cancel(self, key):
+
+        slot = self.where.pop(key, None)
+        if slot is not None:
+            del slot[key]
+
+    def advance(self, now):
+
+        # Moves the wheel to now and returns the keys whose deadline has passed
+        target = int(now)
+        expired = []
+
+        if not self.where:
+            self.now = max(self.now, target)
+            return expired
+
+        while self.now < target:
+
+            self.now += 1
+            tick = self.now
+
+            for level in range(1, LEVELS):
+                shift = SLOT_BITS * level
+                if tick & ((1 << shift) - 1):
+                    break
+                index = (tick >> shift) & SLOT_MASK
+                slot = self.levels[level][index]
+                if slot:
+                    self.levels[level][index] = {}
+                    for key, deadline in slot.items():
+                        self.__place(key, deadline, 0)
+
+            index = tick & SLOT_MASK
+            slot = self.levels[0][index]
+            if slot:
+                self.levels[0][index] = {}
+                for key in slot:
+                    del self.where[key]
+                expired.extend(slot)
+
+            if not self.where:
+                self.now = target
+
+        return expired
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
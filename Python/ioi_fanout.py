@@ -0,0 +1,288 @@
+# ioi_fanout.py
+
+import logging
+import marshal
+import multiprocessing
+import struct
+import time
+import zlib
+from multiprocessing import shared_memory
+
+from ioi_book import handleOf, isRemoval, UNDERLYING_FIELDS, GOOD_UNTIL_FIELD
+from ioi_expiry import ExpiryWheel
+from ioi_timestamps import TIMESTAMPS, NANOS
+
+# Ring header: consumer position, producer position, closed flag. Positions
+# only ever grow; the byte offset of a position is position % capacity.
+HEAD        = struct.Struct("<Q")
+TAIL        = struct.Struct("<Q")
+CLOSED      = struct.Struct("<Q")
+HEAD_AT     = 0
+TAIL_AT     = 8
+CLOSED_AT   = 16
+DATA_AT     = 24
+
+LENGTH      = struct.Struct("<I")
+WRAP        = 0xFFFFFFFF
+
+d_capacity = 1 << 22        # bytes of record data per worker ring
+d_putTimeout = 0.0          # seconds to wait for space before dropping a record
+d_idleSleep = 0.0005        # consumer poll interval while its ring is empty
+
+log = logging.getLogger("ioi.fanout")
+
+
+class RingBuffer():
+
+    # Single-producer, single-consumer byte ring in a SharedMemory block.
+    # Records are a 4-byte length and the payload, padded to 4 bytes; a record
+    # that would straddle the end is preceded by a WRAP marker instead. Each
+    # side only writes its own position, after the data it covers, so no lock
+    # is needed between the two processes.
+
+    def __init__(self, name=None, capacity=d_capacity, create=False):
+
+        if capacity % 4:
+            raise ValueError("Ring capacity must be a multiple of 4")
+
+        self.capacity = capacity
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=DATA_AT + capacity if create else 0)
+        self.name = self.shm.name
+        self.buf = self.shm.buf
+
+        if create:
+            self.buf[:DATA_AT] = bytes(DATA_AT)
+
+        self.head = HEAD.unpack_from(self.buf, HEAD_AT)[0]
+        self.tail = TAIL.unpack_from(self.buf, TAIL_AT)[0]
+
+    def put(self, payload, timeout=d_putTimeout):
+
+        # Producer side. Returns False if no space freed up within timeout; with
+        # a timeout of 0, as soon as the ring is found full.
+        size = (LENGTH.size + len(payload) + 3) & ~3
+        if size > self.capacity // 2:
+            raise ValueError("Record of %d bytes is too large for the ring" % len(payload))
+
+        deadline = None
+
+        while True:
+            offset = self.tail % self.capacity
+            pad = self.capacity - offset if offset + size > self.capacity else 0
+            head = HEAD.unpack_from(self.buf, HEAD_AT)[0]
+            if self.tail + pad + size - head <= self.capacity:
+                break
+            if deadline is None:
+                if timeout <= 0:
+                    return False
+                deadline = time.time() + timeout
+            elif time.time() > deadline:
+                return False
+            time.sleep(d_idleSleep)
+
+        if pad:
+            LENGTH.pack_into(self.buf, DATA_AT + offset, WRAP)
+            self.tail += pad
+            offset = 0
+
+        start = DATA_AT + offset + LENGTH.size
+        LENGTH.pack_into(self.buf, DATA_AT + offset, len(payload))
+        self.buf[start:start + len(payload)] = payload
+
+        self.tail += size
+        TAIL.pack_into(self.buf, TAIL_AT, self.tail)
+        return True
+
+    def get(self):
+
+        # Consumer side. Returns the next payload, or None if the ring is empty.
+        tail = TAIL.unpack_from(self.buf, TAIL_AT)[0]
+
+        while self.head < tail:
+            offset = self.head % self.capacity
+            length = LENGTH.unpack_from(self.buf, DATA_AT + offset)[0]
+
+            if length == WRAP:
+                self.head += self.capacity - offset
+                continue
+
+            start = DATA_AT + offset + LENGTH.size
+            payload = bytes(self.buf[start:start + length])
+
+            self.head += (LENGTH.size + length + 3) & ~3
+            HEAD.pack_into(self.buf, HEAD_AT, self.head)
+            return payload
+
+        return None
+
+    def close(self):
+        CLOSED.pack_into(self.buf, CLOSED_AT, 1)
+
+    @property
+    def closed(self):
+        return CLOSED.unpack_from(self.buf, CLOSED_AT)[0] != 0
+
+    def release(self, unlink=False):
+
+        self.buf = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def runWorker(name, capacity, index, target):
+
+    # Worker process: target(index) builds the callable each record is passed
+    # to; it may also have a close() method, called once the ring is closed
+    # and drained
+    ring = RingBuffer(name, capacity)
+    handler = target(index)
+
+    try:
+        while True:
+            payload = ring.get()
+
+            if payload is None:
+                if not ring.closed:
+                    time.sleep(d_idleSleep)
+                    continue
+                # Closed is set after the last record, so one more read
+                # after seeing it cannot miss anything
+                payload = ring.get()
+                if payload is None:
+                    break
+
+            handler(marshal.loads(payload))
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        close = getattr(handler, "close", None)
+        if close is not None:
+            close()
+        ring.release()
+
+
+class IOIFanout():
+
+    # Moves decoded IOIs from the blpapi dispatcher thread to a pool of worker
+    # processes. Each worker has its own shared-memory ring and records are
+    # marshalled dicts, so the dispatcher's share of the work is one dumps()
+    # and a copy. IOIs are sharded by underlying: the first ticker or FIGI
+    # found on an IOI picks its worker, and the handle stays with that worker
+    # until the IOI is removed or its goodUntil passes, so every update for an
+    # instrument is handled by one process in arrival order. Pins are expired
+    # on their own ExpiryWheel, as the workers' books expire the IOIs.
+    # put() runs on the dispatcher thread and never waits: an IOI for a
+    # worker whose ring is full is dropped and counted, and once a worker is
+    # found to have exited, its IOIs are dropped without being marshalled.
+
+    def __init__(self, workers, target, capacity=d_capacity):
+
+        self.rings = [RingBuffer(capacity=capacity, create=True) for i in range(workers)]
+        self.processes = [multiprocessing.Process(target=runWorker, args=(ring.name, capacity, i, target), daemon=True)
+                          for i, ring in enumerate(self.rings)]
+        self.shards = {}
+        self.wheel = ExpiryWheel(time.time())
+        self.sent = [0] * workers
+        self.dead = [False] * workers
+        self.dropped = 0
+
+    def start(self):
+
+        for process in self.processes:
+            process.start()
+        return self
+
+    def shardOf(self, ioi):
+
+        handle = handleOf(ioi)
+        pinned = self.shards.get(handle)
+
+        if pinned is None:
+            key = handle or ""
+            for field in UNDERLYING_FIELDS:
+                if ioi.get(field):
+                    key = ioi[field]
+                    break
+            shard = zlib.crc32(key.encode("utf-8")) % len(self.rings)
+            goodUntil = None
+        else:
+            shard, goodUntil = pinned
+
+        if handle is None:
+            return shard
+
+        if isRemoval(ioi):
+            self.shards.pop(handle, None)
+            self.wheel.cancel(handle)
+            return shard
+
+        # Rescheduled only when goodUntil changes, rounded up as in IOIBook
+        value = ioi.get(GOOD_UNTIL_FIELD)
+        if value and value != goodUntil:
+            deadline = TIMESTAMPS.cached(value)
+            if deadline is not None:
+                self.wheel.schedule(handle, -(-deadline // NANOS))
+            goodUntil = value
+
+        if pinned is None or goodUntil != pinned[1]:
+            self.shards[handle] = (shard, goodUntil)
+
+        return shard
+
+    def expire(self, now):
+
+        # Unpins the handles whose goodUntil is at or before now
+        for handle in self.wheel.advance(now):
+            self.shards.pop(handle, None)
+
+    def put(self, ioi):
+
+        self.expire(time.time())
+        shard = self.shardOf(ioi)
+        if not self.dead[shard] and self.rings[shard].put(marshal.dumps(ioi)):
+            self.sent[shard] += 1
+            return
+
+        self.dropped += 1
+
+        # Liveness is only checked when a ring is full, which is where a
+        # worker that stalled or died ends up
+        process = self.processes[shard]
+        if not self.dead[shard] and process.pid is not None and not process.is_alive():
+            self.dead[shard] = True
+            log.error("Worker %d exited with code %s: its IOIs are dropped", shard, process.exitcode)
+
+    def stop(self):
+
+        # Lets the workers drain their rings and exit, then frees the rings
+        for ring in self.rings:
+            ring.close()
+        for process in self.processes:
+            process.join()
+        for ring in self.rings:
+            ring.release(unlink=True)
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
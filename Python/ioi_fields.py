@@ -0,0 +1,182 @@
+# ioi_fields.py
+
+import os
+import xml.etree.ElementTree as ET
+import blpapi
+
+d_schema = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ioisub_1.0.0.8.xml")
+
+APIDD_NS = "{http://bloomberg.com/schemas/apidd}"
+
+# Fields read by the subscriber that the service publishes but which are not
+# declared in ioisub_1.0.0.8.xml
+EXTRA_FIELDS = [
+    ("ioi_bid_price_moneyness", "Float64"),
+    ("ioi_offer_price_moneyness", "Float64"),
+    ("ioi_routing_strategy_name", "String"),
+    ("ioi_routing_customId", "String"),
+    ("change", "String"),
+]
+
+# Typed getter used for each schema datatype. Datetime fields are read as
+# strings, which is how the subscriber has always reported them.
+GETTERS = {
+    "String":   blpapi.Element.getElementAsString,
+    "Datetime": blpapi.Element.getElementAsString,
+    "Float64":  blpapi.Element.getElementAsFloat,
+    "Float32":  blpapi.Element.getElementAsFloat,
+    "Int32":    blpapi.Element.getElementAsInteger,
+    "Int64":    blpapi.Element.getElementAsInteger,
+    "Bool":     blpapi.Element.getElementAsBool,
+}
+
+DEFAULTS = {
+    "String":   "",
+    "Datetime": "",
+    "Float64":  0.0,
+    "Float32":  0.0,
+    "Int32":    0,
+    "Int64":    0,
+    "Bool":     False,
+}
+
+
+def loadSchema(path=d_schema, eventName="Ioidata"):
+
+    # Returns the [(fieldName, datatype)] list of the named event, in schema order
+    root = ET.parse(path).getroot()
+
+    for seq in root.iter(APIDD_NS + "sequenceType"):
+        if seq.get("name") == eventName:
+            return [(e.get("name"), e.get("type")) for e in seq.findall(APIDD_NS + "element")]
+
+    raise ValueError("Event %s not found in %s" % (eventName, path))
+
+
+class IOIFieldExtractor():
+
+    # Built once at startup. The schema is parsed, a blpapi.Name and a typed
+    # getter are resolved for every projected field, and extract() then walks
+    # that precomputed plan against the message's root element.
+
+    def __init__(self, fields=None, schemaPath=d_schema):
+
+        self.types = dict(loadSchema(schemaPath))
+
+        for name, datatype in EXTRA_FIELDS:
+            self.types.setdefault(name, datatype)
+
+        if fields is None:
+            fields = list(self.types)
+
+        unknown = [f for f in fields if f not in self.types]
+        if unknown:
+            raise ValueError("Unknown Ioidata field(s): %s" % ", ".join(unknown))
+
+        self.fields = tuple(fields)
+        self.names = dict((f, blpapi.Name(f)) for f in self.fields)
+        self.plan = tuple((f, self.names[f], GETTERS[self.types[f]]) for f in self.fields)
+
+        # Every known field, projected or not, for IOIView
+        self.lookup = dict((f, (self.names.get(f) or blpapi.Name(f), GETTERS[t])) for f, t in self.types.items())
+
+    def default(self, field):
+        return DEFAULTS.get(self.types[field], "")
+
+    def extract(self, msg):
+
+        # Only fields present on the message are returned
+        el = msg.asElement()
+        has = el.hasElement
+        values = {}
+
+        for field, name, get in self.plan:
+            if has(name):
+                values[field] = get(el, name)
+
+        return values
+
+    def view(self, msg):
+        return IOIView(self, msg)
+
+
+# Cached in place of a field the message does not carry
+ABSENT = object()
+
+
+class IOIView():
+
+    # Read-only, dict-like view of one Ioidata message. Nothing is decoded up
+    # front: each field is read from the message the first time it is asked
+    # for and cached, so deciding to drop an IOI costs only the fields that
+    # decision looks at. extract() then decodes the rest of the extractor's
+    # fields, reusing those already read. A view is only valid while its
+    # message is; anything kept beyond the event should be the extracted dict.
+
+    __slots__ = ("extractor", "el", "values")
+
+    def __init__(self, extractor, msg):
+        self.extractor = extractor
+        self.el = msg.asElement()
+        self.values = {}
+
+    def get(self, field, default=None):
+
+        value = self.values.get(field)
+        if value is None:
+            entry = self.extractor.lookup.get(field)
+            if entry is None:
+                return default
+            name, get = entry
+            value = get(self.el, name) if self.el.hasElement(name) else ABSENT
+            self.values[field] = value
+
+        return default if value is ABSENT else value
+
+    def __getitem__(self, field):
+        value = self.get(field, ABSENT)
+        if value is ABSENT:
+            raise KeyError(field)
+        return value
+
+    def __contains__(self, field):
+        return self.get(field, ABSENT) is not ABSENT
+
+    def extract(self):
+
+        # Same result as IOIFieldExtractor.extract() on the message
+        el = self.el
+        has = el.hasElement
+        values = self.values
+        result = {}
+
+        for field, name, get in self.extractor.plan:
+            value = values.get(field)
+            if value is None:
+                value = get(el, name) if has(name) else ABSENT
+            if value is not ABSENT:
+                result[field] = value
+
+        return result
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
@@ -0,0 +1,124 @@
+# ioi_filter.py
+
+from ioi_book import MAX_LEGS, BROKER_FIELD
+
+INSTRUMENT_TYPE_FIELD   = "ioi_instrument_type"
+STRUCTURE_FIELD         = "ioi_instrument_option_structure"
+LEGS_COUNT_FIELD        = "ioi_instrument_option_legs_count"
+
+STOCK_UNDERLYING_FIELDS = ("ioi_instrument_stock_security_ticker", "ioi_instrument_stock_security_figi")
+LEG_UNDERLYING_FIELDS   = tuple(("ioi_instrument_option_legs_%d_underlying_ticker" % i,
+                                 "ioi_instrument_option_legs_%d_underlying_figi" % i) for i in range(MAX_LEGS))
+
+SIZE_FIELDS             = ("ioi_bid_size_quantity", "ioi_offer_size_quantity")
+MONEYNESS_FIELDS        = ("ioi_bid_price_moneyness", "ioi_offer_price_moneyness")
+
+
+def oneOf(field, values):
+    values = frozenset(values)
+    return lambda ioi: ioi.get(field) in values
+
+
+def underlyingIn(keys):
+
+    # Matches on the stock's ticker or FIGI, or on any leg's underlying; only
+    # the legs the IOI actually has are looked at
+    keys = frozenset(keys)
+
+    def predicate(ioi):
+        for field in STOCK_UNDERLYING_FIELDS:
+            if ioi.get(field) in keys:
+                return True
+        for fields in LEG_UNDERLYING_FIELDS[:ioi.get(LEGS_COUNT_FIELD) or 0]:
+            for field in fields:
+                if ioi.get(field) in keys:
+                    return True
+        return False
+
+    return predicate
+
+
+def anySideWithin(fields, low, high):
+
+    # True if the bid or the offer carries the field within [low, high]; a
+    # None bound is open
+    def predicate(ioi):
+        for field in fields:
+            value = ioi.get(field)
+            if value is not None and (low is None or value >= low) and (high is None or value <= high):
+                return True
+        return False
+
+    return predicate
+
+
+# Rule name: (cost, builder). The cost is the number of fields the predicate
+# reads in the common case, and orders the compiled predicates cheapest-first,
+# so an IOI is usually rejected after one or two field reads.
+RULES = {
+    "instrumentTypes":  (1, lambda values: oneOf(INSTRUMENT_TYPE_FIELD, values)),
+    "structures":       (1, lambda values: oneOf(STRUCTURE_FIELD, values)),
+    "brokers":          (1, lambda values: oneOf(BROKER_FIELD, values)),
+    "minSize":          (2, lambda size: anySideWithin(SIZE_FIELDS, size, None)),
+    "maxSize":          (2, lambda size: anySideWithin(SIZE_FIELDS, None, size)),
+    "moneyness":        (2, lambda bounds: anySideWithin(MONEYNESS_FIELDS, bounds[0], bounds[1])),
+    "underlyings":      (4, underlyingIn),
+}
+
+
+class IOIFilter():
+
+    # Compiles declarative rules into a single predicate over an IOI, given
+    # as an IOIView, a decoded dict or an IOIRecord. Rules are a dict such as
+    #
+    #   IOIFilter({"underlyings": ["VOD LN Equity", "BBG000C6K6G9"],
+    #              "instrumentTypes": ["option"],
+    #              "structures": ["CallSpread", "PutSpread"],
+    #              "minSize": 1000,
+    #              "moneyness": (0.9, 1.1)})
+    #
+    # and an IOI passes if it satisfies every rule. Set rules are hash lookups
+    # against frozensets. rejected counts, per rule, the IOIs that rule
+    # turned away.
+
+    def __init__(self, rules):
+
+        unknown = [r for r in rules if r not in RULES]
+        if unknown:
+            raise ValueError("Unknown IOI filter rule(s): %s" % ", ".join(unknown))
+
+        ordered = sorted(rules, key=lambda r: RULES[r][0])
+
+        self.rules = tuple(ordered)
+        self.predicates = tuple(RULES[r][1](rules[r]) for r in ordered)
+        self.rejected = dict((r, 0) for r in ordered)
+
+    def __call__(self, ioi):
+
+        for rule, predicate in zip(self.rules, self.predicates):
+            if not predicate(ioi):
+                self.rejected[rule] += 1
+                return False
+        return True
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
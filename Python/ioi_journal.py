@@ -0,0 +1,289 @@
+# ioi_journal.py
+
+import argparse
+import bisect
+import logging
+import marshal
+import mmap
+import os
+import struct
+import time
+
+from ioi_fields import d_schema
+from ioi_timestamps import TIMESTAMPS
+
+# File header: magic, format version and the length of the marshalled
+# (schema, fields) tuple that follows it. schema is the ioisub schema the
+# journal was written against, fields the field names records refer to by
+# index.
+MAGIC       = b"IOIJ"
+VERSION     = 2
+HEADER      = struct.Struct("<4sHI")
+
+# Record header: payload length, the local time the record was written and
+# ioi_sentTime (0 if the tick had none), both as epoch nanoseconds. Write
+# times never decrease within a journal, so records are in write time order;
+# sentTimes are not ordered (recap ticks carry the time an IOI was last sent).
+# The payload is a marshalled {field index: value} dict, or a marshalled None
+# for a gap marker.
+RECORD      = struct.Struct("<Iqq")
+
+SENT_TIME_FIELD = "ioi_sentTime"
+
+d_schemaTag = os.path.splitext(os.path.basename(d_schema))[0]
+d_buffering = 1 << 20       # bytes buffered before a write reaches the file
+
+log = logging.getLogger("ioi.journal")
+
+
+def sentTimeNs(ioi):
+    return TIMESTAMPS.nanos(ioi.get(SENT_TIME_FIELD)) or 0
+
+
+def readHeader(buf):
+
+    magic, version, length = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError("Not an IOI journal")
+    if version != VERSION:
+        raise ValueError("Unsupported IOI journal version %d" % version)
+
+    schema, fields = marshal.loads(bytes(buf[HEADER.size:HEADER.size + length]))
+    return schema, list(fields), HEADER.size + length
+
+
+def scanRecords(buf, offset):
+
+    # (offset, length, writtenAt, sentTime) of every complete record from
+    # offset on. Only the record headers are read; a record cut short by a
+    # crash ends the scan.
+    end = len(buf)
+    while offset + RECORD.size <= end:
+        length, writtenAt, sentTime = RECORD.unpack_from(buf, offset)
+        if offset + RECORD.size + length > end:
+            break
+        yield offset, length, writtenAt, sentTime
+        offset += RECORD.size + length
+
+
+class JournalWriter():
+
+    # Append-only journal of decoded Ioidata ticks. Each tick costs one
+    # marshal.dumps() and a buffered write on the calling thread. Reopening an
+    # existing journal appends to it, after dropping any record left
+    # incomplete by a crash; its fields must match.
+
+    def __init__(self, path, fields, schema=d_schemaTag):
+
+        self.path = path
+        self.fields = tuple(fields)
+        self.index = dict((f, i) for i, f in enumerate(self.fields))
+        self.count = 0
+        self.writtenAt = 0
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self.__truncate(schema)
+            self.file = open(path, "ab", buffering=d_buffering)
+        else:
+            self.file = open(path, "wb", buffering=d_buffering)
+            header = marshal.dumps((schema, self.fields))
+            self.file.write(HEADER.pack(MAGIC, VERSION, len(header)))
+            self.file.write(header)
+
+        # Offset the next record will be written at
+        self.position = self.file.tell()
+
+    def __truncate(self, schema):
+
+        with open(self.path, "r+b") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                existing, fields, offset = readHeader(buf)
+                if tuple(fields) != self.fields:
+                    raise ValueError("%s was written with different fields" % self.path)
+                if existing != schema:
+                    log.warning("Appending %s ticks to a %s journal", schema, existing)
+                end = offset
+                for offset, length, writtenAt, sentTime in scanRecords(buf, offset):
+                    end = offset + RECORD.size + length
+                    self.writtenAt = writtenAt
+            f.truncate(end)
+
+    def __stamp(self):
+
+        # Held at the last write time if the clock steps back, so the journal
+        # stays ordered by it
+        self.writtenAt = max(time.time_ns(), self.writtenAt)
+        return self.writtenAt
+
+    def write(self, ioi, sentTime=None):
+
+        # Every field of a decoded tick is in the journal's field list.
+        # sentTime is the tick's ioi_sentTime in epoch nanoseconds, if the
+        # caller has already parsed it.
+        index = self.index
+        payload = marshal.dumps({index[f]: v for f, v in ioi.items()})
+        self.file.write(RECORD.pack(len(payload), self.__stamp(), sentTimeNs(ioi) if sentTime is None else sentTime))
+        self.file.write(payload)
+        self.position += RECORD.size + len(payload)
+        self.count += 1
+
+    def writeGap(self):
+
+        # Marks where the subscriber stopped receiving ticks
+        payload = marshal.dumps(None)
+        self.file.write(RECORD.pack(len(payload), self.__stamp(), 0))
+        self.file.write(payload)
+        self.position += RECORD.size + len(payload)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class JournalReader():
+
+    # Memory-maps a journal for replay. Records come back as the dicts the
+    # subscriber decoded, so replayed ticks go through the same handler code
+    # as live ones; nothing is re-parsed beyond marshal.loads().
+
+    def __init__(self, path):
+
+        self.file = open(path, "rb")
+        self.buf = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.schema, self.fields, self.start = readHeader(self.buf)
+        self.offsets = None
+        self.times = None
+
+    def __iter__(self):
+        return self.records()
+
+    def __len__(self):
+        self.__index()
+        return len(self.offsets)
+
+    def __index(self):
+
+        # Built on first use from the record headers alone
+        if self.offsets is None:
+            records = list(scanRecords(self.buf, self.start))
+            self.offsets = [r[0] for r in records]
+            self.times = [r[2] for r in records]
+
+    def seek(self, writtenAt):
+
+        # Offset of the first record written at or after writtenAt (epoch ns).
+        # Write times are the journal's order; sentTimes are not, so ranges
+        # are always taken on write times.
+        self.__index()
+        i = bisect.bisect_left(self.times, writtenAt)
+        return self.offsets[i] if i < len(self.offsets) else len(self.buf)
+
+    def records(self, start=None, end=None, offset=None):
+
+        # (writtenAt, sentTime, ioi) for each record written in
+        # start <= writtenAt < end, or from the record at offset on; ioi is
+        # None for a gap marker
+        if offset is None:
+            offset = self.start if start is None else self.seek(start)
+        fields = self.fields
+        buf = self.buf
+
+        for offset, length, writtenAt, sentTime in scanRecords(buf, offset):
+            if end is not None and writtenAt >= end:
+                return
+            values = marshal.loads(buf[offset + RECORD.size:offset + RECORD.size + length])
+            if values is None:
+                yield writtenAt, sentTime, None
+            else:
+                yield writtenAt, sentTime, dict((fields[i], v) for i, v in values.items())
+
+    def replay(self, handler, speed=None, start=None, end=None, offset=None, onGap=None):
+
+        # Calls handler(ioi) for each record, and onGap(writtenAt) for each gap
+        # marker. With speed, ticks are paced on the times they were written,
+        # speed times faster than they arrived; without, as fast as the
+        # handler takes them. Returns the number of ticks replayed.
+        count = 0
+        origin = None
+
+        for writtenAt, sentTime, ioi in self.records(start, end, offset):
+
+            if ioi is None:
+                if onGap is not None:
+                    onGap(writtenAt)
+                continue
+
+            if speed:
+                if origin is None:
+                    origin = (writtenAt, time.perf_counter())
+                delay = (writtenAt - origin[0]) / (1e9 * speed) - (time.perf_counter() - origin[1])
+                if delay > 0:
+                    time.sleep(delay)
+
+            handler(ioi)
+            count += 1
+
+        return count
+
+    def close(self):
+        self.buf.close()
+        self.file.close()
+
+
+def main():
+
+    # Replays a journal through the subscriber's handler
+    import py_dapi_SubscribeIOI
+
+    parser = argparse.ArgumentParser(description="Replay an IOI journal through the subscriber")
+    parser.add_argument("journal")
+    parser.add_argument("--speed", type=float, help="pace ticks at this multiple of real time (default: unpaced)")
+    args = parser.parse_args()
+
+    reader = JournalReader(args.journal)
+    print("%s: %d ticks, schema %s" % (args.journal, len(reader), reader.schema))
+
+    py_dapi_SubscribeIOI.d_journal = None
+    handler = py_dapi_SubscribeIOI.SessionEventHandler()
+
+    def onGap(writtenAt):
+        print("Gap in the recorded stream at %s" % time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(writtenAt / 1e9)))
+
+    started = time.perf_counter()
+    try:
+        count = reader.replay(handler.deliverIOI, args.speed, onGap=onGap)
+    finally:
+        handler.stop()
+        reader.close()
+    elapsed = time.perf_counter() - started
+
+    print("Replayed %d ticks in %.2fs (%.0f ticks/sec), %d IOIs live" % (count, elapsed, count / max(elapsed, 1e-9), len(handler.book)))
+
+
+if __name__ == "__main__":
+    print("Bloomberg - IOI API Example - Journal Replay")
+    main()
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
@@ -0,0 +1,110 @@
+# ioi_latency.py
+
+import array
+import logging
+
+d_samples = 4096            # latencies the rolling percentiles are taken over
+d_window = 5.0              # seconds per lag window
+d_lagThreshold = 0.5        # seconds a window's mean may exceed the baseline by
+
+NANOS = 1000000000
+
+log = logging.getLogger("ioi.latency")
+
+
+class TickLatency():
+
+    # Tick-to-handler latency: ioi_sentTime against the local time the event
+    # reached the handler, so wire and queueing delay together. record() only
+    # writes the sample into a ring buffer and adds it to the current window;
+    # percentiles are taken over the last d_samples ticks when asked for.
+    #
+    # The two clocks are not synchronized, so latencies carry their offset.
+    # Lag is measured relative to a baseline instead: the lowest window mean
+    # seen, taken as wire latency plus offset. When a window's mean exceeds
+    # it by more than d_lagThreshold, processing has fallen behind the feed
+    # and lagging is set; it clears with the first window back under it.
+    # Rising lag alongside a flat ioi_event_processing_seconds points
+    # upstream; rising together, at this process.
+
+    def __init__(self, samples=d_samples, window=d_window, threshold=d_lagThreshold):
+
+        self.ring = array.array("q", bytes(8 * samples))
+        self.size = samples
+        self.count = 0
+
+        self.window = int(window * NANOS)
+        self.threshold = int(threshold * NANOS)
+        self.windowEnd = None
+        self.windowTotal = 0
+        self.windowCount = 0
+
+        self.baseline = None
+        self.lag = 0
+        self.lagging = False
+
+    def record(self, sentTime, receivedTime):
+
+        # Both in epoch nanoseconds
+        latency = receivedTime - sentTime
+        self.ring[self.count % self.size] = latency
+        self.count += 1
+
+        if self.windowEnd is None:
+            self.windowEnd = receivedTime + self.window
+        elif receivedTime >= self.windowEnd:
+            self.__closeWindow(receivedTime)
+
+        self.windowTotal += latency
+        self.windowCount += 1
+
+    def __closeWindow(self, now):
+
+        mean = self.windowTotal // self.windowCount
+        self.windowEnd = now + self.window
+        self.windowTotal = 0
+        self.windowCount = 0
+
+        if self.baseline is None or mean < self.baseline:
+            self.baseline = mean
+        self.lag = mean - self.baseline
+
+        lagging = self.lag > self.threshold
+        if lagging and not self.lagging:
+            log.warning("Tick latency %.3fs above its baseline: processing is falling behind",
+                        self.lag / NANOS)
+        elif self.lagging and not lagging:
+            log.warning("Tick latency back within %.3fs of its baseline", self.lag / NANOS)
+        self.lagging = lagging
+
+    def percentiles(self, quantiles=(0.5, 0.9, 0.99)):
+
+        # {quantile: seconds} over the last d_samples ticks
+        n = min(self.count, self.size)
+        if not n:
+            return dict((q, 0.0) for q in quantiles)
+
+        ordered = sorted(self.ring[:n])
+        return dict((q, ordered[min(n - 1, int(q * n))] / NANOS) for q in quantiles)
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
@@ -0,0 +1,126 @@
+# ioi_logging.py
+
+import logging
+import logging.handlers
+import queue
+import sys
+
+d_queueSize = 10000
+d_stopTimeout = 5.0         # seconds stop() waits for the writer to make room
+d_format = "%(asctime)s %(levelname)-7s %(threadName)s %(name)s: %(message)s"
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+
+    # Runs on the calling (blpapi dispatcher) thread. The message and any
+    # traceback are rendered here and the extra fields copied, so the writer
+    # thread logs the values as they were at the call; the timestamp prefix
+    # and key=value rendering are still left to the writer. A full queue drops
+    # the record and counts it instead of blocking the caller.
+
+    def __init__(self, q):
+        logging.handlers.QueueHandler.__init__(self, q)
+        self.dropped = 0
+
+    def prepare(self, record):
+
+        record = logging.handlers.QueueHandler.prepare(self, record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            record.fields = dict(fields)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class KeyValueFormatter(logging.Formatter):
+
+    # Appends the mapping passed as extra={"fields": {...}} as key=value pairs
+
+    def format(self, record):
+
+        line = logging.Formatter.format(self, record)
+        fields = getattr(record, "fields", None)
+
+        if fields:
+            line += " " + " ".join("%s=%s" % (k, v) for k, v in fields.items())
+
+        return line
+
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+
+    # The stop sentinel waits for room on a full queue instead of raising
+    # queue.Full, which the base class's put_nowait() does on exactly the
+    # saturated queue this exists for
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel, timeout=d_stopTimeout)
+
+
+class AsyncLogging():
+
+    # Owns the bounded queue and the background writer thread behind the
+    # "ioi" logger hierarchy
+
+    def __init__(self, level=logging.INFO, stream=None, queueSize=d_queueSize, fmt=d_format):
+
+        self.queue = queue.Queue(queueSize)
+        self.handler = DroppingQueueHandler(self.queue)
+
+        writer = logging.StreamHandler(stream if stream is not None else sys.stdout)
+        writer.setFormatter(KeyValueFormatter(fmt))
+
+        self.logger = logging.getLogger("ioi")
+        self.logger.setLevel(level)
+        self.logger.addHandler(self.handler)
+        self.logger.propagate = False
+
+        self.listener = DrainingQueueListener(self.queue, writer)
+
+    def start(self):
+        self.listener.start()
+        return self
+
+    def stop(self):
+
+        # Flushes everything already queued before returning. Nothing more is
+        # queued once the handler is removed, so the writer only has to drain.
+        self.logger.removeHandler(self.handler)
+        try:
+            self.listener.stop()
+        except queue.Full:
+            sys.stderr.write("Log writer did not drain in %.0fs: %d records unwritten\n"
+                             % (d_stopTimeout, self.queue.qsize()))
+
+        if self.handler.dropped:
+            sys.stderr.write("Log queue full: %d records dropped\n" % self.handler.dropped)
+
+    def setLevel(self, level):
+        self.logger.setLevel(level)
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
@@ -0,0 +1,282 @@
+# ioi_metrics.py
+
+import http.server
+import logging
+import threading
+
+d_host = "127.0.0.1"
+d_port = 9464
+
+# Histogram resolution: values are kept in microseconds, in buckets
+# 2**-(d_precisionBits - 1) of their value wide (under 2% with 7 bits), up to
+# d_maxSeconds. Larger values land in the last bucket.
+d_precisionBits = 7
+d_maxSeconds = 3600.0
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+log = logging.getLogger("ioi.metrics")
+
+
+def bucketIndex(value):
+
+    # Values below 2**d_precisionBits have a bucket each; above that, each
+    # power of two is split into 2**(d_precisionBits - 1) equal buckets
+    shift = value.bit_length() - d_precisionBits
+    if shift <= 0:
+        return value
+    return (shift << (d_precisionBits - 1)) + (value >> shift)
+
+
+def bucketCeiling(index):
+
+    # Highest value that falls in the bucket
+    half = 1 << (d_precisionBits - 1)
+    if index < 2 * half:
+        return index
+    shift = (index >> (d_precisionBits - 1)) - 1
+    return ((index - (shift << (d_precisionBits - 1))) << shift) + (1 << shift) - 1
+
+
+class LatencyHistogram():
+
+    # HDR-style histogram of durations in seconds. record() is one bucket
+    # index computation and a few additions under a lock; percentiles are
+    # only worked out when asked for, from the bucket counts, and are
+    # reported as the top of their bucket.
+
+    def __init__(self, maxSeconds=d_maxSeconds):
+        self.counts = [0] * (bucketIndex(int(maxSeconds * 1000000)) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+
+        index = bucketIndex(int(seconds * 1000000)) if seconds > 0 else 0
+        with self.lock:
+            self.counts[min(index, len(self.counts) - 1)] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentiles(self, quantiles=QUANTILES):
+
+        # {quantile: seconds}, in one pass over the buckets
+        with self.lock:
+            counts = list(self.counts)
+            count = self.count
+
+        result = dict((q, 0.0) for q in quantiles)
+        if not count:
+            return result
+
+        targets = sorted((max(1, int(q * count + 0.5)), q) for q in quantiles)
+        seen = 0
+        i = 0
+        for index, n in enumerate(counts):
+            if not n:
+                continue
+            seen += n
+            while i < len(targets) and seen >= targets[i][0]:
+                result[targets[i][1]] = bucketCeiling(index) / 1000000.0
+                i += 1
+            if i == len(targets):
+                break
+
+        return result
+
+    def percentile(self, quantile):
+        return self.percentiles((quantile,))[quantile]
+
+    def reset(self):
+        with self.lock:
+            self.counts = [0] * len(self.counts)
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+
+
+class Counter():
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self.lock:
+            self.value += n
+
+
+class MetricsRegistry():
+
+    # Named metrics with optional labels, rendered in the Prometheus text
+    # format. Asking for an existing name and labels returns the same metric,
+    # so instrumented code can look metrics up where it needs them. Values
+    # something else already counts are registered with sampled() and only
+    # read when the metrics are rendered.
+
+    def __init__(self):
+        self.metrics = {}
+        self.help = {}
+        self.lock = threading.Lock()
+
+    def __get(self, kind, name, help, labels, factory):
+
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            entry = self.metrics.get(key)
+            if entry is None:
+                entry = self.metrics[key] = (kind, factory())
+                self.help[name] = (kind, help)
+            return entry[1]
+
+    def histogram(self, name, help, **labels):
+        return self.__get("summary", name, help, labels, LatencyHistogram)
+
+    def counter(self, name, help, **labels):
+        return self.__get("counter", name, help, labels, Counter)
+
+    def sampled(self, name, help, function, kind="gauge", **labels):
+
+        # function() is called at each render; registering it again replaces it
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.metrics[key] = (kind, function)
+            self.help[name] = (kind, help)
+
+    def render(self):
+
+        with self.lock:
+            entries = sorted(self.metrics.items(), key=lambda entry: entry[0])
+            help = dict(self.help)
+
+        lines = []
+        last = None
+
+        for (name, labels), (kind, metric) in entries:
+
+            if name != last:
+                lines.append("# HELP %s %s" % (name, help[name][1]))
+                lines.append("# TYPE %s %s" % (name, help[name][0]))
+                last = name
+
+            if isinstance(metric, LatencyHistogram):
+                for quantile, value in sorted(metric.percentiles().items()):
+                    lines.append("%s%s %.6f" % (name, formatLabels(labels + (("quantile", quantile),)), value))
+                lines.append("%s_sum%s %.6f" % (name, formatLabels(labels), metric.total))
+                lines.append("%s_count%s %d" % (name, formatLabels(labels), metric.count))
+
+            elif isinstance(metric, Counter):
+                lines.append("%s%s %d" % (name, formatLabels(labels), metric.value))
+
+            else:
+                try:
+                    value = metric()
+                except Exception as e:
+                    log.warning("Failed to sample %s: %s", name, e)
+                    continue
+                lines.append("%s%s %s" % (name, formatLabels(labels), value))
+
+        return "\n".join(lines) + "\n"
+
+
+def formatLabels(labels):
+
+    if not labels:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                             for k, v in labels)
+
+
+# Shared by every module in the process
+METRICS = MetricsRegistry()
+
+
+def requestLatency(operation):
+
+    # Round trip of createIoi, updateIoi and cancelIoi requests, and of the
+    # session's authorization and service opens
+    return METRICS.histogram("ioi_request_latency_seconds",
+                             "Time from sending a request to its completion", operation=operation)
+
+
+def requestFailures(operation, reason):
+    return METRICS.counter("ioi_request_failures_total",
+                           "Requests that failed or timed out", operation=operation, reason=reason)
+
+
+class MetricsServer():
+
+    # Serves registry.render() at http://host:port/metrics from a daemon
+    # thread. Rendering happens on that thread, so a scrape costs the
+    # instrumented threads nothing beyond the locks it briefly takes.
+
+    def __init__(self, registry=METRICS, host=d_host, port=d_port):
+
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server = None
+
+    def start(self):
+
+        registry = self.registry
+
+        class MetricsHandler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self.server = http.server.ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+        except OSError as e:
+            log.warning("Metrics endpoint not started on %s:%d: %s", self.host, self.port, e)
+            return self
+
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        log.info("Serving metrics on http://%s:%d/metrics", self.host, self.port)
+        return self
+
+    def stop(self):
+
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
@@ -0,0 +1,296 @@
+# ioi_record.py
+
+import re
+
+from ioi_fields import loadSchema, EXTRA_FIELDS
+
+LEG_FIELD = re.compile(r"^ioi_instrument_option_legs_(\d+)_(\w+)$")
+QUALIFIER_FIELD = re.compile(r"^ioi_(bid|offer)_qualifiers_(\d+)$")
+QUOTE_FIELD = re.compile(r"^ioi_(bid|offer)_(\w+)$")
+
+# Where each flat Ioidata field lives in a record:
+#   ("ioi", attr)               on the IOIRecord
+#   ("quote", side, attr)       on the bid or offer QuoteRecord
+#   ("qualifier", side, i)      in that quote's qualifiers tuple
+#   ("leg", i, attr)            on the i'th LegRecord
+# IOIRecord attributes drop the "ioi_" prefix (ioi_goodUntil is goodUntil,
+# ioi_id is id); quote and leg attributes are what follows the side or leg.
+LOCATIONS = {}
+
+# Flat field name of each IOIRecord attribute
+FIELD_NAMES = {}
+
+IOI_SLOTS = []
+QUOTE_SLOTS = []
+LEG_SLOTS = []
+
+for field, datatype in loadSchema() + EXTRA_FIELDS:
+
+    if field in LOCATIONS:
+        continue
+
+    match = LEG_FIELD.match(field)
+    if match:
+        if match.group(2) not in LEG_SLOTS:
+            LEG_SLOTS.append(match.group(2))
+        LOCATIONS[field] = ("leg", int(match.group(1)), match.group(2))
+        continue
+
+    match = QUALIFIER_FIELD.match(field)
+    if match:
+        LOCATIONS[field] = ("qualifier", match.group(1), int(match.group(2)))
+        continue
+
+    match = QUOTE_FIELD.match(field)
+    if match:
+        if match.group(2) not in QUOTE_SLOTS:
+            QUOTE_SLOTS.append(match.group(2))
+        LOCATIONS[field] = ("quote", match.group(1), match.group(2))
+        continue
+
+    attr = field[4:] if field.startswith("ioi_") else field
+    IOI_SLOTS.append(attr)
+    FIELD_NAMES[attr] = field
+    LOCATIONS[field] = ("ioi", attr)
+
+
+def compileRecord(cls):
+
+    # Gives a Record class a straight-line __init__ and shallowCopy(), one
+    # statement per slot, so neither loops over the slots in Python
+    names = {"new": object.__new__, "cls": cls}
+    lines = ["def __init__(self):"]
+    lines += ["    self.%s = None" % attr for attr in cls.__slots__]
+    lines += ["def shallowCopy(self):", "    other = new(cls)"]
+    lines += ["    other.%s = self.%s" % (attr, attr) for attr in cls.__slots__]
+    lines += ["    return other"]
+    exec("\n".join(lines), names)
+
+    cls.__init__ = names["__init__"]
+    cls.shallowCopy = names["shallowCopy"]
+    return cls
+
+
+class Record():
+
+    # Fixed-layout record: every field is a slot, None while the field has
+    # not been received, so a record costs its slots and values and none of
+    # a dict's hash table
+
+    __slots__ = ()
+
+    def get(self, attr, default=None):
+        value = getattr(self, attr, None)
+        return default if value is None else value
+
+    def copy(self):
+        return self.shallowCopy()
+
+    def update(self, other):
+        for attr in other.__slots__:
+            value = getattr(other, attr)
+            if value is not None:
+                setattr(self, attr, value)
+
+    def __eq__(self, other):
+        return (self.__class__ is other.__class__ and
+                all(getattr(self, a) == getattr(other, a) for a in self.__slots__))
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, ", ".join(
+            "%s=%r" % (a, getattr(self, a)) for a in self.__slots__ if getattr(self, a) is not None))
+
+
+@compileRecord
+class LegRecord(Record):
+
+    __slots__ = tuple(LEG_SLOTS)
+
+
+@compileRecord
+class QuoteRecord(Record):
+
+    # qualifiers is a tuple, in schema order
+    __slots__ = tuple(QUOTE_SLOTS) + ("qualifiers",)
+
+
+@compileRecord
+class IOIRecord(Record):
+
+    # One IOI: top-level fields as slots, bid and offer as QuoteRecords and the
+    # option legs as a tuple of LegRecords, each created when a tick first
+    # carries one of its fields. get() also takes the flat Ioidata field names
+    # (get("ioi_bid_price_fixed_price")), so a record can stand in for a
+    # decoded dict wherever fields are looked up by name.
+
+    __slots__ = tuple(IOI_SLOTS) + ("bid", "offer", "legs")
+
+    @classmethod
+    def fromFields(cls, fields):
+        record = cls()
+        record.setFields(fields)
+        return record
+
+    def get(self, field, default=None):
+
+        location = LOCATIONS.get(field)
+        if location is None:
+            return Record.get(self, field, default)
+
+        kind = location[0]
+        if kind == "ioi":
+            value = getattr(self, location[1])
+
+        elif kind == "leg":
+            legs = self.legs
+            if legs is None or location[1] >= len(legs) or legs[location[1]] is None:
+                return default
+            value = getattr(legs[location[1]], location[2])
+
+        else:
+            quote = getattr(self, location[1])
+            if quote is None:
+                return default
+            if kind == "quote":
+                value = getattr(quote, location[2])
+            elif quote.qualifiers is None or location[2] >= len(quote.qualifiers):
+                return default
+            else:
+                value = quote.qualifiers[location[2]]
+
+        return default if value is None else value
+
+    def __quote(self, side):
+        quote = getattr(self, side)
+        if quote is None:
+            quote = QuoteRecord()
+            setattr(self, side, quote)
+        return quote
+
+    def __leg(self, index):
+        legs = self.legs
+        if legs is not None and index < len(legs) and legs[index] is not None:
+            return legs[index]
+        legs = list(legs or ())
+        while len(legs) <= index:
+            legs.append(None)
+        legs[index] = LegRecord()
+        self.legs = tuple(legs)
+        return legs[index]
+
+    def setFields(self, fields):
+
+        # Sets the record from flat Ioidata fields; unknown names are ignored
+        for field, value in fields.items():
+
+            location = LOCATIONS.get(field)
+            if location is None:
+                continue
+
+            kind = location[0]
+            if kind == "ioi":
+                setattr(self, location[1], value)
+
+            elif kind == "quote":
+                setattr(self.__quote(location[1]), location[2], value)
+
+            elif kind == "leg":
+                setattr(self.__leg(location[1]), location[2], value)
+
+            else:
+                quote = self.__quote(location[1])
+                qualifiers = list(quote.qualifiers or ())
+                while len(qualifiers) <= location[2]:
+                    qualifiers.append(None)
+                qualifiers[location[2]] = value
+                quote.qualifiers = tuple(qualifiers)
+
+    def toFields(self):
+
+        fields = {}
+
+        for attr in IOI_SLOTS:
+            value = getattr(self, attr)
+            if value is not None:
+                fields[FIELD_NAMES[attr]] = value
+
+        for side in ("bid", "offer"):
+            quote = getattr(self, side)
+            if quote is None:
+                continue
+            for attr in QUOTE_SLOTS:
+                value = getattr(quote, attr)
+                if value is not None:
+                    fields["ioi_%s_%s" % (side, attr)] = value
+            for i, qualifier in enumerate(quote.qualifiers or ()):
+                if qualifier is not None:
+                    fields["ioi_%s_qualifiers_%d" % (side, i)] = qualifier
+
+        for i, leg in enumerate(self.legs or ()):
+            if leg is None:
+                continue
+            for attr in LEG_SLOTS:
+                value = getattr(leg, attr)
+                if value is not None:
+                    fields["ioi_instrument_option_legs_%d_%s" % (i, attr)] = value
+
+        return fields
+
+    def items(self):
+        return self.toFields().items()
+
+    def copy(self):
+
+        # Sub-records are copied too; qualifier tuples are immutable and shared
+        other = self.shallowCopy()
+        if self.bid is not None:
+            other.bid = self.bid.shallowCopy()
+        if self.offer is not None:
+            other.offer = self.offer.shallowCopy()
+        if self.legs is not None:
+            other.legs = tuple(leg.shallowCopy() if leg is not None else None for leg in self.legs)
+        return other
+
+    def update(self, other):
+
+        # Merges a newer tick, given as a record or as flat fields; fields the
+        # tick does not carry keep their current value
+        if isinstance(other, dict):
+            self.setFields(other)
+            return
+
+        for attr in IOI_SLOTS:
+            value = getattr(other, attr)
+            if value is not None:
+                setattr(self, attr, value)
+
+        for side in ("bid", "offer"):
+            quote = getattr(other, side)
+            if quote is not None:
+                self.__quote(side).update(quote)
+
+        for i, leg in enumerate(other.legs or ()):
+            if leg is not None:
+                self.__leg(i).update(leg)
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
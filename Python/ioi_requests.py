@@ -0,0 +1,226 @@
+# ioi_requests.py
+
+import concurrent.futures
+import heapq
+import itertools
+import threading
+import time
+import blpapi
+
+from ioi_metrics import requestLatency, requestFailures
+
+# Correlation ids allocated by RequestRegistry start here, clear of the small
+# fixed ids the sample scripts use and below those of AsyncSession
+d_firstCorrelationId = 1 << 20
+
+d_timeout = 30.0            # seconds a request may wait for its response
+
+
+class RequestTimeout(Exception):
+    pass
+
+
+class PendingRequest():
+
+    # One request in flight, and once it completes, its outcome: response is
+    # the final RESPONSE message (partial holds any PARTIAL_RESPONSEs before
+    # it), error the failing message or exception, and latency the seconds
+    # from send to completion. future resolves with the record itself.
+
+    __slots__ = ("correlationId", "operation", "context", "callback", "future",
+                 "sentAt", "deadline", "partial", "response", "error", "latency")
+
+    def __init__(self, correlationId, operation, context, callback, timeout):
+        self.correlationId = correlationId
+        self.operation = operation
+        self.context = context
+        self.callback = callback
+        self.future = concurrent.futures.Future()
+        self.sentAt = time.perf_counter()
+        self.deadline = self.sentAt + timeout
+        self.partial = []
+        self.response = None
+        self.error = None
+        self.latency = None
+
+    def __repr__(self):
+        outcome = "pending" if self.latency is None else "error" if self.error is not None else "ok"
+        return "PendingRequest(%d %s %s)" % (self.correlationId.value(), self.operation, outcome)
+
+
+class RequestRegistry():
+
+    # Tracks any number of outstanding requests by correlation id. send()
+    # registers the request before it goes out, so its response can never
+    # arrive first; processResponseEvent() matches PARTIAL_RESPONSE, RESPONSE
+    # and REQUEST_STATUS messages back to their request. A request completes
+    # once: on its response, on a REQUEST_STATUS failure, or with a
+    # RequestTimeout error when its deadline passes, checked by a watchdog
+    # thread. Completion sets the request's latency, calls its callback and
+    # resolves its future, outside the registry's lock, so a callback may
+    # send further requests. Latencies of requests sent with an operation
+    # name are recorded in ioi_metrics.
+
+    def __init__(self, timeout=d_timeout, firstCorrelationId=d_firstCorrelationId):
+
+        self.timeout = timeout
+        self.correlationIds = itertools.count(firstCorrelationId)
+
+        self.pending = {}
+        self.deadlines = []
+        self.condition = threading.Condition()
+        self.watchdog = None
+        self.closed = False
+
+        self.completed = 0
+        self.failed = 0
+        self.timedOut = 0
+        self.histograms = {}
+
+    def __len__(self):
+        return len(self.pending)
+
+    def send(self, session, request, operation=None, callback=None, timeout=None, identity=None,
+             context=None):
+
+        # Returns the PendingRequest; callback(pending) is called when it
+        # completes. context is kept on the record for the caller's use.
+        pending = PendingRequest(blpapi.CorrelationId(next(self.correlationIds)), operation, context,
+                                 callback, self.timeout if timeout is None else timeout)
+        key = pending.correlationId.value()
+
+        with self.condition:
+            self.pending[key] = pending
+            heapq.heappush(self.deadlines, (pending.deadline, key))
+            if self.watchdog is None:
+                self.watchdog = threading.Thread(target=self.__watch, daemon=True)
+                self.watchdog.start()
+            elif self.deadlines[0][1] == key:
+                self.condition.notify()
+
+        try:
+            session.sendRequest(request, identity=identity, correlationId=pending.correlationId)
+        except Exception:
+            with self.condition:
+                self.pending.pop(key, None)
+            raise
+
+        return pending
+
+    def processResponseEvent(self, event):
+
+        # Returns False if no message in the event belonged to a tracked request
+        eventType = event.eventType()
+        finished = []
+        handled = False
+
+        with self.condition:
+            for msg in event:
+                for cid in msg.correlationIds():
+                    pending = self.pending.get(cid.value())
+                    if pending is None:
+                        continue
+
+                    handled = True
+                    if eventType == blpapi.Event.PARTIAL_RESPONSE:
+                        pending.partial.append(msg)
+                        continue
+
+                    del self.pending[cid.value()]
+                    if eventType == blpapi.Event.RESPONSE:
+                        pending.response = msg
+                    else:
+                        pending.error = msg
+                    finished.append(pending)
+
+        for pending in finished:
+            self.__complete(pending)
+
+        return handled
+
+    def __complete(self, pending):
+
+        pending.latency = time.perf_counter() - pending.sentAt
+        if pending.error is None:
+            self.completed += 1
+        else:
+            self.failed += 1
+
+        if pending.operation is not None:
+            histogram = self.histograms.get(pending.operation)
+            if histogram is None:
+                histogram = self.histograms[pending.operation] = requestLatency(pending.operation)
+            histogram.record(pending.latency)
+            if pending.error is not None:
+                reason = "timeout" if isinstance(pending.error, RequestTimeout) else "error"
+                requestFailures(pending.operation, reason).inc()
+
+        # A failing callback fails the future instead of the calling thread,
+        # which may be the watchdog
+        try:
+            if pending.callback is not None:
+                pending.callback(pending)
+        except Exception as e:
+            pending.future.set_exception(e)
+        else:
+            pending.future.set_result(pending)
+
+    def __watch(self):
+
+        # Watchdog thread: sleeps until the earliest deadline, then fails every
+        # request still pending past it. Deadlines of completed requests are
+        # discarded as they come up.
+        while True:
+
+            with self.condition:
+                while not self.closed:
+                    now = time.perf_counter()
+                    while self.deadlines and self.deadlines[0][1] not in self.pending:
+                        heapq.heappop(self.deadlines)
+                    if self.deadlines and self.deadlines[0][0] <= now:
+                        break
+                    self.condition.wait(self.deadlines[0][0] - now if self.deadlines else None)
+
+                if self.closed:
+                    return
+
+                expired = []
+                while self.deadlines and self.deadlines[0][0] <= now:
+                    deadline, key = heapq.heappop(self.deadlines)
+                    pending = self.pending.pop(key, None)
+                    if pending is not None:
+                        expired.append(pending)
+
+            for pending in expired:
+                pending.error = RequestTimeout("%s request timed out" % (pending.operation or "Request"))
+                self.timedOut += 1
+                self.__complete(pending)
+
+    def close(self):
+
+        # Stops the watchdog; requests still pending are left unresolved
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
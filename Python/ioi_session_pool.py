@@ -0,0 +1,169 @@
+# ioi_session_pool.py
+
+import asyncio
+import itertools
+import blpapi
+
+from ioi_asyncio import AsyncSession
+
+AUTHORIZATION_REVOKED           = blpapi.Name("AuthorizationRevoked")
+ENTITLEMENT_CHANGED             = blpapi.Name("EntitlementChanged")
+
+d_sessions = 2
+d_reauthInterval = 3600
+
+# Event types the pool handles itself; everything else (ADMIN, misc) still goes
+# to the caller's handler
+POOL_EVENTS = (
+    blpapi.Event.SESSION_STATUS,
+    blpapi.Event.SERVICE_STATUS,
+    blpapi.Event.AUTHORIZATION_STATUS,
+    blpapi.Event.PARTIAL_RESPONSE,
+    blpapi.Event.RESPONSE,
+    blpapi.Event.REQUEST_STATUS,
+)
+
+
+class PooledSession():
+
+    # One member of the pool. Requests must be created from this member's
+    # service and sent on its session, with its identity.
+
+    __slots__ = ("session", "identity", "service")
+
+    def __init__(self, session):
+        self.session = session
+        self.identity = None
+        self.service = None
+
+    def sendRequest(self, request, operation=None):
+
+        # Sent at once; returns an awaitable for the response messages
+        return self.session.sendRequest(request, identity=self.identity, operation=operation)
+
+
+class SessionPool():
+
+    # Long-lived set of started, authorized sessions for the server-side
+    # samples. Each member runs the start / open //blp/apiauth / open service /
+    # authorize chain once; acquire() then hands the members out round-robin,
+    # and each request is built from and sent on one member, with its cached
+    # Identity. Identities are renewed in the background, every
+    # reauthInterval seconds and whenever the service revokes or changes one,
+    # and a renewed Identity only replaces the old one once authorized.
+
+    def __init__(self, sessionOptions, authService, requestService, emrsId, ipAddress,
+                 size=d_sessions, reauthInterval=d_reauthInterval, handler=None):
+
+        self.sessionOptions = sessionOptions
+        self.authService = authService
+        self.requestService = requestService
+        self.emrsId = emrsId
+        self.ipAddress = ipAddress
+        self.size = size
+        self.reauthInterval = reauthInterval
+        self.handler = handler
+
+        self.members = []
+        self.next = None
+        self.reauthTask = None
+
+    def __onEvent(self, event, session):
+
+        # Dispatcher thread
+        if event.eventType() == blpapi.Event.AUTHORIZATION_STATUS:
+            for msg in event:
+                if msg.messageType() in (AUTHORIZATION_REVOKED, ENTITLEMENT_CHANGED):
+                    member = self.__memberFor(session)
+                    if member is not None:
+                        self.loop.call_soon_threadsafe(self.__reauthorizeSoon, member)
+
+        elif event.eventType() not in POOL_EVENTS and self.handler is not None:
+            self.handler(event, session)
+
+    def __memberFor(self, session):
+        for member in self.members:
+            if member.session.session is session:
+                return member
+        return None
+
+    def __createAuthRequest(self, member):
+
+        authReq = member.session.session.getService(self.authService).createAuthorizationRequest()
+        authReq.set("emrsId", self.emrsId)
+        authReq.set("ipAddress", self.ipAddress)
+        return authReq
+
+    async def __startMember(self, member):
+
+        await member.session.start()
+        await member.session.openService(self.authService)
+        member.service = await member.session.openService(self.requestService)
+        member.identity = await member.session.authorize(self.__createAuthRequest(member))
+
+    async def start(self):
+
+        self.loop = asyncio.get_running_loop()
+        self.members = [PooledSession(AsyncSession(self.sessionOptions, self.__onEvent)) for i in range(self.size)]
+
+        try:
+            await asyncio.gather(*[self.__startMember(m) for m in self.members])
+        except Exception:
+            await self.stop()
+            raise
+
+        self.next = itertools.cycle(self.members)
+        self.reauthTask = asyncio.ensure_future(self.__reauthorizeLoop())
+
+    async def __reauthorize(self, member):
+
+        try:
+            member.identity = await member.session.authorize(self.__createAuthRequest(member))
+        except Exception as e:
+            print("Re-authorization failed, keeping current identity: %s" % e)
+
+    def __reauthorizeSoon(self, member):
+        asyncio.ensure_future(self.__reauthorize(member))
+
+    async def __reauthorizeLoop(self):
+
+        while True:
+            await asyncio.sleep(self.reauthInterval)
+            await asyncio.gather(*[self.__reauthorize(m) for m in self.members])
+
+    def acquire(self):
+
+        # Next member in rotation. Each request is built from that member's
+        # service and sent with its sendRequest(), never on another member.
+        return next(self.next)
+
+    async def stop(self):
+
+        if self.reauthTask is not None:
+            self.reauthTask.cancel()
+            self.reauthTask = None
+
+        await asyncio.gather(*[m.session.stop() for m in self.members if m.session.started.done()],
+                             return_exceptions=True)
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
@@ -0,0 +1,738 @@
+# ioi_simulator.py
+
+import argparse
+import datetime
+import heapq
+import importlib
+import itertools
+import os
+import random
+import threading
+import time
+import blpapi
+import blpapi.test
+
+import ioi_asyncio
+from ioi_fields import loadSchema
+
+d_requestSchema = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ioiapi-request_1.0.0.3.xml")
+d_subscriptionSchema = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ioisub_1.0.0.8.xml")
+
+d_tickRate = 100.0          # Ioidata ticks per second, across all live IOIs
+d_ticksPerEvent = 10        # messages per SUBSCRIPTION_DATA event
+d_liveIOIs = 500            # IOIs the synthetic stream keeps alive
+d_latency = 0.005           # seconds from sendRequest to its response
+d_jitter = 0.002            # uniform +/- jitter on the latency
+d_failureRate = 0.0         # share of requests answered with RequestFailure
+d_disconnectFor = 2.0       # seconds a simulated connection loss lasts
+
+# Subscription data queued for a session beyond this many messages is dropped.
+# SlowConsumerWarning is raised at the high water mark and cleared once the
+# backlog is back under the low water mark, as the SDK does.
+d_maxEventQueueSize = 10000
+d_highWaterMark = 0.75
+d_lowWaterMark = 0.50
+
+# Correlation ids the simulator allocates when the caller does not pass one
+d_firstCorrelationId = 1 << 20
+
+TICKERS = ["VOD LN Equity", "BP/ LN Equity", "HSBA LN Equity", "AAPL US Equity",
+           "MSFT US Equity", "IBM US Equity", "SAP GR Equity", "7203 JT Equity"]
+BROKERS = ["BLPA", "BLPB", "BLPC", "BLPD"]
+QUALIFIERS = ["AT_OPEN", "AT_CLOSE", "NATURAL", "VWAP", "IN_TOUCH", "LIMIT", "MARKET_ON_CLOSE"]
+# OptionStructure of a call-only option with that many legs
+STRUCTURES = {1: "SingleLegCall", 2: "CallSpread", 3: "CallButterfly", 4: "CallCondor"}
+
+ACTIVE = "active"
+CANCELLED = "cancelled"
+
+OPERATIONS = ("createIoi", "updateIoi", "cancelIoi")
+
+COERCE = {
+    "String":   str,
+    "Datetime": lambda value: value,
+    "Float64":  float,
+    "Float32":  float,
+    "Int32":    int,
+    "Int64":    int,
+    "Bool":     bool,
+}
+
+
+def syntheticIOI(rng, handle, legs=0, pegged=False, qualifiers=0, now=None):
+
+    # Ioidata fields of one IOI: a stock when legs is 0, otherwise an option
+    # with 1-4 legs; fixed or pegged prices; up to qualifiers per side
+    if now is None:
+        now = datetime.datetime.utcnow()
+
+    ioi = {
+        "id_value": handle,
+        "ioi_id": handle,
+        "state": ACTIVE,
+        "ioi_goodUntil": now + datetime.timedelta(0, rng.randint(60, 3600)),
+        "ioi_sentTime": now,
+        "ioi_routing_broker": rng.choice(BROKERS),
+        "trader_uuid": rng.randint(1000000, 9999999),
+        "trader_acronym": rng.choice(BROKERS),
+    }
+
+    ticker = rng.choice(TICKERS)
+    reference = round(rng.uniform(10.0, 500.0), 2)
+
+    if legs == 0:
+        ioi["ioi_instrument_type"] = "stock"
+        ioi["ioi_instrument_stock_security_type"] = "ticker"
+        ioi["ioi_instrument_stock_security_ticker"] = ticker
+    else:
+        ioi["ioi_instrument_type"] = "option"
+        ioi["ioi_instrument_option_structure"] = STRUCTURES[legs]
+        ioi["ioi_instrument_option_legs_count"] = legs
+        for i in range(legs):
+            leg = "ioi_instrument_option_legs_%d_" % i
+            ioi[leg + "type"] = "Call"
+            ioi[leg + "strike"] = round(reference * rng.uniform(0.8, 1.2), 0)
+            ioi[leg + "expiry"] = now + datetime.timedelta(rng.randint(7, 365))
+            ioi[leg + "style"] = "European"
+            ioi[leg + "ratio"] = rng.choice((1.0, -1.0, 2.0, -1.25))
+            ioi[leg + "exchange"] = ticker.split()[1]
+            ioi[leg + "underlying_type"] = "ticker"
+            ioi[leg + "underlying_ticker"] = ticker
+
+    for side, sign in (("bid", -1), ("offer", +1)):
+        quote = "ioi_%s_" % side
+        if pegged:
+            ioi[quote + "price_type"] = "pegged"
+            ioi[quote + "price_pegged_offsetAmount"] = round(rng.uniform(0.0, 0.5), 2)
+            ioi[quote + "price_pegged_offsetFrom"] = "MID"
+            ioi[quote + "price_pegged_limitPrice"] = round(reference * (1 + sign * 0.01), 2)
+        else:
+            ioi[quote + "price_type"] = "fixed"
+            ioi[quote + "price_fixed_price"] = round(reference * (1 + sign * rng.uniform(0.0, 0.01)), 2)
+            ioi[quote + "price_fixed_currency"] = "GBp" if ticker.endswith("LN Equity") else "USD"
+        ioi[quote + "size_type"] = "quantity"
+        ioi[quote + "size_quantity"] = rng.randint(1, 100) * 100
+        ioi[quote + "referencePrice_price"] = reference
+        ioi[quote + "notes"] = "%s notes" % side
+        if qualifiers:
+            ioi[quote + "qualifiers_count"] = qualifiers
+            for i, qualifier in enumerate(rng.sample(QUALIFIERS, qualifiers)):
+                ioi[quote + "qualifiers_%d" % i] = qualifier
+
+    return ioi
+
+
+def flattenElement(element, prefix, out):
+
+    # Maps a request element onto Ioidata field names: path components joined
+    # with "_", arrays as <name>_count and <name>_<i>, and the selection of a
+    # choice as <name>_type
+    if element.isArray():
+        if element.numValues():
+            out[prefix + "_count"] = element.numValues()
+        for i in range(element.numValues()):
+            if element.isComplexType():
+                flattenElement(element.getValueAsElement(i), "%s_%d" % (prefix, i), out)
+            else:
+                out["%s_%d" % (prefix, i)] = element.getValue(i)
+
+    elif element.datatype() == blpapi.DataType.CHOICE:
+        choice = element.getChoice()
+        out[prefix + "_type"] = str(choice.name())
+        flattenElement(choice, "%s_%s" % (prefix, choice.name()), out)
+
+    elif element.isComplexType():
+        for sub in element.elements():
+            if sub.isArray() or not sub.isNull():
+                flattenElement(sub, "%s_%s" % (prefix, sub.name()), out)
+
+    elif not element.isNull():
+        out[prefix] = element.getValue()
+
+
+def responseDefinition(service, operation, selection):
+
+    # Element definition of one selection (handle, exception) of the response
+    op = service.getOperation(operation)
+    for i in range(op.numResponseDefinitions()):
+        definition = op.getResponseDefinitionAt(i)
+        if str(definition.name()) == selection:
+            return definition
+        typeDefinition = definition.typeDefinition()
+        if typeDefinition.hasElementDefinition(selection):
+            return typeDefinition.getElementDefinition(selection)
+    raise ValueError("%s has no %s response" % (operation, selection))
+
+
+def adminEvent(eventType, messageType, correlationId=None, fields=None):
+
+    event = blpapi.test.createEvent(eventType)
+
+    properties = blpapi.test.MessageProperties()
+    if correlationId is not None:
+        properties.setCorrelationIds([correlationId])
+
+    definition = blpapi.test.getAdminMessageDefinition(blpapi.Name(messageType))
+    formatter = blpapi.test.appendMessage(event, definition, properties)
+    if fields:
+        formatter.formatMessageDict(fields)
+
+    return event
+
+
+class SimulatedAuthRequest():
+
+    def __init__(self):
+        self.fields = {}
+
+    def set(self, name, value):
+        self.fields[str(name)] = value
+
+    def toString(self):
+        return "AuthorizationRequest %s" % self.fields
+
+    __str__ = toString
+
+
+class SimulatedAuthService():
+
+    def __init__(self, name):
+        self.serviceName = name
+
+    def name(self):
+        return self.serviceName
+
+    def createAuthorizationRequest(self):
+        return SimulatedAuthRequest()
+
+
+class SimulatedIdentity():
+
+    def getSeatType(self):
+        return 0
+
+    def isAuthorized(self, service):
+        return True
+
+
+class IOIServiceSimulator():
+
+    # Local stand-in for the IOI services, for offline and load testing. The
+    # request and subscription services are deserialized from the schemas in
+    # this repository, and every event is built with blpapi.test, so handlers
+    # receive real blpapi Events and Messages:
+    #
+    #  - createIoi / updateIoi / cancelIoi answer with a handle (or an
+    #    exception for an unknown handle) after latency +/- jitter, or with a
+    #    RequestFailure for failureRate of requests
+    #  - a synthetic stream creates, updates and cancels liveIOIs IOIs at
+    #    tickRate ticks per second, published as Ioidata to every subscriber,
+    #    together with the IOIs created through requests
+    #  - each session queues events as the SDK does, raising and clearing
+    #    SlowConsumerWarning around the watermarks and dropping data past
+    #    maxEventQueueSize
+    #
+    # install() makes AsyncSession, and so every sample script, create
+    # SimulatedSessions instead of connecting to d_host:d_port.
+
+    def __init__(self, tickRate=d_tickRate, ticksPerEvent=d_ticksPerEvent, liveIOIs=d_liveIOIs,
+                 latency=d_latency, jitter=d_jitter, failureRate=d_failureRate,
+                 maxEventQueueSize=d_maxEventQueueSize, seed=None):
+
+        self.tickRate = tickRate
+        self.ticksPerEvent = ticksPerEvent
+        self.liveIOIs = liveIOIs
+        self.latency = latency
+        self.jitter = jitter
+        self.failureRate = failureRate
+        self.maxEventQueueSize = maxEventQueueSize
+
+        with open(d_requestSchema, encoding="utf-8-sig") as f:
+            self.requestService = blpapi.test.deserializeService(f.read())
+        with open(d_subscriptionSchema, encoding="utf-8-sig") as f:
+            self.subscriptionService = blpapi.test.deserializeService(f.read())
+
+        self.ioidata = self.subscriptionService.getEventDefinition("Ioidata")
+        self.responses = dict(((op, selection), responseDefinition(self.requestService, op, selection))
+                              for op in OPERATIONS for selection in ("handle", "exception"))
+
+        self.types = dict(loadSchema(d_subscriptionSchema))
+        self.names = dict((f, blpapi.Name(f)) for f in self.types)
+
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.handles = itertools.count(1)
+        self.iois = {}
+        self.live = []
+        self.sessions = []
+        self.ticker = None
+        self.running = False
+        self.stopped = False
+
+    def install(self):
+        ioi_asyncio.d_sessionFactory = self.createSession
+
+    def createSession(self, sessionOptions=None, handler=None):
+        return SimulatedSession(self, sessionOptions, handler)
+
+    def service(self, name):
+        if "apiauth" in name:
+            return SimulatedAuthService(name)
+        if "ioisub" in name:
+            return self.subscriptionService
+        return self.requestService
+
+    def delay(self):
+        return max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+
+    def __newHandle(self):
+        return "SIM-%08d" % next(self.handles)
+
+    def __add(self, handle, ioi):
+        if handle not in self.iois:
+            self.live.append(handle)
+        self.iois[handle] = ioi
+
+    def __remove(self, handle):
+        ioi = self.iois.pop(handle)
+        self.live.remove(handle)
+        return ioi
+
+    def processRequest(self, request):
+
+        # Returns (messageType, fields, tick): the RequestFailure / handle /
+        # exception answer, and the Ioidata tick to publish, if any
+        if self.rng.random() < self.failureRate:
+            return "RequestFailure", {"reason": {"source": "ioi_simulator", "errorCode": -1,
+                                                 "category": "INJECTED_FAILURE",
+                                                 "description": "Simulated request failure"}}, None
+
+        element = request.asElement()
+        operation = str(element.name())
+        if operation not in OPERATIONS:
+            # Tell the operations apart by content when the request element
+            # reports the request choice rather than the selection
+            hasHandle = element.hasElement("handle", True)
+            hasIOI = element.hasElement("ioi", True)
+            operation = "updateIoi" if hasHandle and hasIOI else "cancelIoi" if hasHandle else "createIoi"
+
+        fields = {}
+        if element.hasElement("ioi", True):
+            flattenElement(element.getElement("ioi"), "ioi", fields)
+        fields = dict((f, COERCE[self.types[f]](v)) for f, v in fields.items() if f in self.types)
+        fields["ioi_sentTime"] = datetime.datetime.utcnow()
+
+        with self.lock:
+
+            if operation == "createIoi":
+                handle = self.__newHandle()
+                fields.update(id_value=handle, ioi_id=handle, state=ACTIVE)
+                self.__add(handle, fields)
+                return (operation, "handle"), {"value": handle}, fields
+
+            handle = element.getElement("handle").getElementAsString("value")
+            if handle not in self.iois:
+                return (operation, "exception"), {"what": "Unknown IOI handle %s" % handle}, None
+
+            if operation == "updateIoi":
+                ioi = dict(self.iois[handle], **fields)
+                self.__add(handle, ioi)
+                return (operation, "handle"), {"value": handle}, ioi
+
+            ioi = self.__remove(handle)
+            return (operation, "handle"), {"value": handle}, dict(ioi, state=CANCELLED, ioi_sentTime=fields["ioi_sentTime"])
+
+    def nextTick(self):
+
+        # One step of the synthetic stream: a new IOI until liveIOIs are live,
+        # then mostly price/size updates with some cancels and replacements
+        rng = self.rng
+        now = datetime.datetime.utcnow()
+
+        with self.lock:
+
+            action = rng.random()
+
+            if len(self.live) < self.liveIOIs or not self.live:
+                handle = self.__newHandle()
+                ioi = syntheticIOI(rng, handle, legs=rng.choice((0, 0, 1, 2, 3, 4)),
+                                   pegged=rng.random() < 0.2, qualifiers=rng.randint(0, 5), now=now)
+                self.__add(handle, ioi)
+                return ioi
+
+            handle = rng.choice(self.live)
+
+            if action < 0.9:
+                ioi = dict(self.iois[handle], ioi_sentTime=now)
+                for side in ("bid", "offer"):
+                    price = "ioi_%s_price_fixed_price" % side
+                    if price in ioi:
+                        ioi[price] = round(ioi[price] * rng.uniform(0.999, 1.001), 2)
+                    size = "ioi_%s_size_quantity" % side
+                    ioi[size] = max(100, ioi[size] + rng.choice((-100, 0, 100)))
+                self.__add(handle, ioi)
+                return ioi
+
+            return dict(self.__remove(handle), state=CANCELLED, ioi_sentTime=now)
+
+    def dataEvent(self, ticks, correlationId, recap=False):
+
+        # recap marks the ticks as part of a subscription's initial paint
+        event = blpapi.test.createEvent(blpapi.Event.SUBSCRIPTION_DATA)
+        properties = blpapi.test.MessageProperties()
+        properties.setCorrelationIds([correlationId])
+        if recap:
+            properties.setRecapType(blpapi.Message.RECAPTYPE_SOLICITED, blpapi.Message.FRAGMENT_NONE)
+
+        for tick in ticks:
+            formatter = blpapi.test.appendMessage(event, self.ioidata, properties)
+            for field, value in tick.items():
+                formatter.setElement(self.names[field], value)
+
+        return event
+
+    def publish(self, ticks):
+        for session in list(self.sessions):
+            session.publish(ticks)
+
+    def paint(self):
+
+        # The current state of every live IOI, as sent to a new subscription
+        with self.lock:
+            return [dict(self.iois[handle]) for handle in self.live]
+
+    def __tick(self):
+
+        # Schedules each event on a fixed cadence, so a slow publish does not
+        # lower the configured rate
+        interval = self.ticksPerEvent / float(self.tickRate)
+        deadline = time.time()
+
+        while self.running:
+            self.publish([self.nextTick() for i in range(self.ticksPerEvent)])
+            deadline += interval
+            pause = deadline - time.time()
+            if pause > 0:
+                time.sleep(pause)
+
+    def subscribed(self, session):
+
+        # A session that subscribes once the run is stopped, such as one the
+        # subscriber started to replace a terminated one, is stopped as well
+        if self.stopped:
+            session.stopAsync()
+            return
+
+        with self.lock:
+            if session not in self.sessions:
+                self.sessions.append(session)
+            if self.tickRate > 0 and self.ticker is None:
+                self.running = True
+                self.ticker = threading.Thread(target=self.__tick, daemon=True)
+                self.ticker.start()
+
+    def unsubscribed(self, session):
+
+        with self.lock:
+            if session in self.sessions:
+                self.sessions.remove(session)
+
+    def stop(self):
+
+        # Stops the stream and every session subscribed to it, now or later
+        self.stopped = True
+        self.running = False
+        for session in list(self.sessions):
+            session.stopAsync()
+
+    def disconnect(self, duration):
+
+        # Drops the connection of every subscribed session for duration seconds
+        for session in list(self.sessions):
+            session.disconnect(duration)
+
+    def disconnectEvery(self, interval, duration):
+
+        def outages():
+            while True:
+                time.sleep(interval)
+                self.disconnect(duration)
+
+        threading.Thread(target=outages, daemon=True).start()
+
+
+class SimulatedSession():
+
+    # Implements the part of blpapi.Session the samples use. Events are queued
+    # with a delivery time and handed to the handler, in order, on a dispatcher
+    # thread of their own, as the SDK does.
+
+    def __init__(self, simulator, sessionOptions=None, handler=None):
+
+        self.simulator = simulator
+        self.handler = handler
+        self.correlationIds = itertools.count(d_firstCorrelationId)
+        self.subscriptions = []
+
+        self.queue = []
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.queued = 0
+        self.dropped = 0
+        self.slow = False
+        self.terminated = None
+        self.connected = True
+        self.stale = []
+
+        self.dispatcher = threading.Thread(target=self.__dispatch, daemon=True)
+
+    def __correlationId(self, correlationId):
+        if correlationId is None:
+            correlationId = blpapi.CorrelationId(next(self.correlationIds))
+        return correlationId
+
+    def __post(self, event, delay=0.0, messages=0):
+
+        # messages counts subscription data towards the slow consumer watermarks
+        maxSize = self.simulator.maxEventQueueSize
+
+        with self.condition:
+            if messages and self.queued + messages > maxSize:
+                self.dropped += messages
+                return
+
+            due = time.time() + delay if delay else 0.0
+            heapq.heappush(self.queue, (due, next(self.sequence), event, messages))
+            self.queued += messages
+
+            if not self.slow and self.queued >= maxSize * d_highWaterMark:
+                self.slow = True
+                heapq.heappush(self.queue, (0.0, next(self.sequence),
+                                            adminEvent(blpapi.Event.ADMIN, "SlowConsumerWarning"), 0))
+
+            self.condition.notify()
+
+    def __dispatch(self):
+
+        while True:
+            with self.condition:
+                while not self.queue or self.queue[0][0] > time.time():
+                    self.condition.wait(self.queue[0][0] - time.time() if self.queue else None)
+
+                due, sequence, event, messages = heapq.heappop(self.queue)
+                self.queued -= messages
+
+                if self.slow and self.queued <= self.simulator.maxEventQueueSize * d_lowWaterMark:
+                    self.slow = False
+                    heapq.heappush(self.queue, (0.0, next(self.sequence),
+                                                adminEvent(blpapi.Event.ADMIN, "SlowConsumerWarningCleared"), 0))
+
+            if self.handler is not None:
+                self.handler(event, self)
+
+            if event is self.terminated:
+                return
+
+    def startAsync(self):
+
+        self.dispatcher.start()
+        self.__post(adminEvent(blpapi.Event.SESSION_STATUS, "SessionConnectionUp"))
+        self.__post(adminEvent(blpapi.Event.SESSION_STATUS, "SessionStarted"))
+        return True
+
+    def stopAsync(self):
+
+        with self.condition:
+            if self.terminated is not None:
+                return True
+            self.terminated = adminEvent(blpapi.Event.SESSION_STATUS, "SessionTerminated")
+
+        self.simulator.unsubscribed(self)
+        self.__post(self.terminated)
+        return True
+
+    def stop(self):
+
+        self.stopAsync()
+        if self.dispatcher.is_alive() and self.dispatcher is not threading.current_thread():
+            self.dispatcher.join()
+        return True
+
+    def disconnect(self, duration):
+
+        # Nothing is delivered while the connection is down, and services and
+        # subscriptions fail to open; subscriptions already made stay in
+        # place, but only deliver again once the client resubscribes
+        with self.condition:
+            if not self.connected or self.terminated is not None:
+                return
+            self.connected = False
+
+        self.__post(adminEvent(blpapi.Event.SESSION_STATUS, "SessionConnectionDown"))
+
+        timer = threading.Timer(duration, self.__reconnect)
+        timer.daemon = True
+        timer.start()
+
+    def __reconnect(self):
+
+        with self.condition:
+            self.connected = True
+            self.stale = list(self.subscriptions)
+
+        self.__post(adminEvent(blpapi.Event.SESSION_STATUS, "SessionConnectionUp"))
+
+    def openServiceAsync(self, serviceName, correlationId=None):
+
+        correlationId = self.__correlationId(correlationId)
+        status = "ServiceOpened" if self.connected else "ServiceOpenFailure"
+        self.__post(adminEvent(blpapi.Event.SERVICE_STATUS, status, correlationId,
+                               {"serviceName": serviceName}), self.simulator.delay())
+        return correlationId
+
+    def getService(self, serviceName):
+        return self.simulator.service(serviceName)
+
+    def createIdentity(self):
+        return SimulatedIdentity()
+
+    def sendAuthorizationRequest(self, request, identity, correlationId=None):
+
+        correlationId = self.__correlationId(correlationId)
+        self.__post(adminEvent(blpapi.Event.RESPONSE, "AuthorizationSuccess", correlationId),
+                    self.simulator.delay())
+        return correlationId
+
+    def sendRequest(self, request, identity=None, correlationId=None, eventQueue=None, requestLabel=""):
+
+        correlationId = self.__correlationId(correlationId)
+        response, fields, tick = self.simulator.processRequest(request)
+
+        if response == "RequestFailure":
+            event = adminEvent(blpapi.Event.REQUEST_STATUS, response, correlationId, fields)
+        else:
+            event = blpapi.test.createEvent(blpapi.Event.RESPONSE)
+            properties = blpapi.test.MessageProperties()
+            properties.setCorrelationIds([correlationId])
+            formatter = blpapi.test.appendMessage(event, self.simulator.responses[response], properties)
+            formatter.formatMessageDict(fields)
+
+        self.__post(event, self.simulator.delay())
+
+        if tick is not None:
+            self.simulator.publish([tick])
+
+        return correlationId
+
+    def subscribe(self, subscriptionList, identity=None, requestLabel=""):
+
+        for i in range(subscriptionList.size()):
+            correlationId = subscriptionList.correlationIdAt(i)
+
+            if not self.connected:
+                self.__post(adminEvent(blpapi.Event.SUBSCRIPTION_STATUS, "SubscriptionFailure", correlationId))
+                continue
+
+            if correlationId in self.stale:
+                self.stale.remove(correlationId)
+            if correlationId not in self.subscriptions:
+                self.subscriptions.append(correlationId)
+
+            # Started and painted ahead of any live tick, as the service does
+            self.__post(adminEvent(blpapi.Event.SUBSCRIPTION_STATUS, "SubscriptionStarted", correlationId))
+            ticks = self.simulator.paint()
+            for start in range(0, len(ticks), self.simulator.ticksPerEvent):
+                chunk = ticks[start:start + self.simulator.ticksPerEvent]
+                self.__post(self.simulator.dataEvent(chunk, correlationId, recap=True), messages=len(chunk))
+
+        self.simulator.subscribed(self)
+
+    def unsubscribe(self, subscriptionList):
+
+        for i in range(subscriptionList.size()):
+            correlationId = subscriptionList.correlationIdAt(i)
+            if correlationId in self.stale:
+                self.stale.remove(correlationId)
+            if correlationId in self.subscriptions:
+                self.subscriptions.remove(correlationId)
+                self.__post(adminEvent(blpapi.Event.SUBSCRIPTION_STATUS, "SubscriptionTerminated", correlationId))
+
+        if not self.subscriptions:
+            self.simulator.unsubscribed(self)
+
+    def publish(self, ticks):
+
+        if not self.connected:
+            return
+
+        for correlationId in list(self.subscriptions):
+            if correlationId in self.stale:
+                continue
+            self.__post(self.simulator.dataEvent(ticks, correlationId), messages=len(ticks))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Run an IOI sample script against the local IOI service simulator")
+    parser.add_argument("script", help="sample module to run, e.g. py_dapi_SubscribeIOI")
+    parser.add_argument("--tick-rate", type=float, default=d_tickRate, help="Ioidata ticks per second")
+    parser.add_argument("--ticks-per-event", type=int, default=d_ticksPerEvent)
+    parser.add_argument("--live", type=int, default=d_liveIOIs, help="IOIs kept live by the synthetic stream")
+    parser.add_argument("--latency", type=float, default=d_latency, help="request latency in seconds")
+    parser.add_argument("--jitter", type=float, default=d_jitter)
+    parser.add_argument("--failure-rate", type=float, default=d_failureRate)
+    parser.add_argument("--queue-size", type=int, default=d_maxEventQueueSize,
+                        help="event queue size; slow consumer warnings start at 75%% of it")
+    parser.add_argument("--duration", type=float, help="stop the subscribed sessions after this many seconds")
+    parser.add_argument("--disconnect-every", type=float, help="drop the connection every this many seconds")
+    parser.add_argument("--disconnect-for", type=float, default=d_disconnectFor, help="seconds each disconnect lasts")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    simulator = IOIServiceSimulator(tickRate=args.tick_rate, ticksPerEvent=args.ticks_per_event,
+                                    liveIOIs=args.live, latency=args.latency, jitter=args.jitter,
+                                    failureRate=args.failure_rate, maxEventQueueSize=args.queue_size,
+                                    seed=args.seed)
+    simulator.install()
+
+    script = importlib.import_module(args.script[:-3] if args.script.endswith(".py") else args.script)
+
+    if args.disconnect_every:
+        simulator.disconnectEvery(args.disconnect_every, args.disconnect_for)
+
+    if args.duration:
+        timer = threading.Timer(args.duration, simulator.stop)
+        timer.daemon = True
+        timer.start()
+
+    script.main()
+
+
+if __name__ == "__main__":
+    print("Bloomberg - IOI API Example - Service Simulator")
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("Ctrl+C pressed. Stopping...")
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
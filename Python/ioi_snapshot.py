@@ -0,0 +1,175 @@
+# ioi_snapshot.py
+
+import logging
+import marshal
+import os
+import threading
+import time
+
+from ioi_journal import JournalReader, d_schemaTag
+
+MAGIC       = b"IOIS"
+VERSION     = 1
+
+d_interval = 60.0           # seconds between snapshots
+d_paintTimeout = 30.0       # seconds to wait for the initial paint to finish
+d_holdTimeout = 5.0         # seconds to wait for the held handles at the end of the paint
+
+log = logging.getLogger("ioi.snapshot")
+
+
+class IOISnapshots():
+
+    # Periodic snapshots of the live IOI book. A snapshot holds every live IOI
+    # and the journal offset it is current to: the book reflects every tick
+    # journalled before that offset, and recover() rebuilds it by loading the
+    # snapshot and replaying the journal from there. Ticks journalled after the
+    # offset may already be in the snapshot too; applying them again in order
+    # leaves the book as it was. Snapshots are written to a temporary file and
+    # renamed over the last one, so a crash leaves the previous snapshot.
+
+    def __init__(self, path, fields, interval=d_interval):
+
+        self.path = path
+        self.fields = tuple(fields)
+        self.index = dict((f, i) for i, f in enumerate(self.fields))
+        self.interval = interval
+        self.last = time.time()
+        self.count = 0
+
+    def due(self, now):
+        return now - self.last >= self.interval
+
+    def write(self, book, position, now=None):
+
+        self.last = time.time() if now is None else now
+
+        index = self.index
+        iois = [{index[f]: v for f, v in ioi.items()} for ioi in book.iois.values()]
+        data = marshal.dumps((VERSION, d_schemaTag, self.fields, position, self.last, iois))
+
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(MAGIC)
+            f.write(data)
+        os.replace(temporary, self.path)
+
+        self.count += 1
+        return len(iois)
+
+    def read(self):
+
+        # (position, takenAt, [ioi]) of the last snapshot, or None if there is none
+        if not os.path.exists(self.path):
+            return None
+
+        with open(self.path, "rb") as f:
+            data = f.read()
+
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("%s is not an IOI snapshot" % self.path)
+
+        version, schema, fields, position, takenAt, iois = marshal.loads(data[len(MAGIC):])
+        if version != VERSION:
+            raise ValueError("Unsupported IOI snapshot version %d" % version)
+        if schema != d_schemaTag:
+            log.warning("Loading a %s snapshot into a %s subscriber", schema, d_schemaTag)
+
+        return position, takenAt, [dict((fields[i], v) for i, v in ioi.items()) for ioi in iois]
+
+    def recover(self, book, journalPath=None):
+
+        # Loads the last snapshot into book, then the journal after it.
+        # Returns the number of IOIs loaded and of ticks replayed.
+        snapshot = self.read()
+        if snapshot is None:
+            return 0, 0
+
+        position, takenAt, iois = snapshot
+        for ioi in iois:
+            book.apply(ioi)
+
+        replayed = 0
+        if journalPath and os.path.exists(journalPath):
+            reader = JournalReader(journalPath)
+            try:
+                if position > len(reader.buf):
+                    log.warning("%s ends before the snapshot's offset %d: not replayed", journalPath, position)
+                else:
+                    replayed = reader.replay(book.apply, offset=position)
+            finally:
+                reader.close()
+
+        log.info("Recovered %d IOIs from a snapshot taken %.0fs ago, and %d journalled ticks",
+                 len(iois), time.time() - takenAt, replayed)
+        return len(iois), replayed
+
+
+class PaintReconciliation():
+
+    # Tracks which recovered IOIs the service repaints when the subscription
+    # starts. Paint ticks are the recap messages; the paint is over at the
+    # first live tick after them, and whatever was held but not painted is no
+    # longer live. The held handles may be given later, with hold(), by the
+    # thread that owns the book; painted handles are collected meanwhile.
+
+    def __init__(self, handles=None, timeout=d_paintTimeout):
+        self.held = None
+        self.confirmed = set()
+        self.ready = threading.Event()
+        self.timeout = timeout
+        self.deadline = None
+        self.painted = 0
+
+        if handles is not None:
+            self.hold(handles)
+
+    def hold(self, handles):
+        self.held = set(handles)
+        self.ready.set()
+
+    def wait(self, timeout=d_holdTimeout):
+
+        # True once the held handles are known
+        return self.ready.wait(timeout)
+
+    @property
+    def unconfirmed(self):
+        return self.held - self.confirmed if self.held is not None else set()
+
+    def start(self, now):
+        self.deadline = now + self.timeout
+
+    def tick(self, handle, recap):
+
+        # Returns True once the paint is over
+        if recap:
+            self.painted += 1
+            self.confirmed.add(handle)
+            return False
+        return self.painted > 0
+
+    def expired(self, now):
+        return self.deadline is not None and now >= self.deadline
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
@@ -0,0 +1,249 @@
+# ioi_supervisor.py
+
+import logging
+import random
+import threading
+import time
+import blpapi
+
+from ioi_metrics import requestLatency, requestFailures
+
+STARTING    = "starting"        # waiting for the session to start
+OPENING     = "opening"         # service open requested
+SUBSCRIBING = "subscribing"     # subscriptions sent, waiting for them to start
+LIVE        = "live"            # every subscription started
+DOWN        = "down"            # connection lost, waiting for it to come back
+STOPPED     = "stopped"
+
+d_backoffBase = 0.5         # seconds before the first retry
+d_backoffCap = 30.0         # longest wait between retries
+
+log = logging.getLogger("ioi.supervisor")
+
+
+class Backoff():
+
+    # Exponential backoff with jitter: the n'th delay is drawn from the upper
+    # half of min(cap, base * 2**n), so clients that lost the same connection
+    # do not all retry at the same moment
+
+    def __init__(self, base=d_backoffBase, cap=d_backoffCap, rng=None):
+        self.base = base
+        self.cap = cap
+        self.rng = rng or random.Random()
+        self.attempts = 0
+
+    def next(self):
+        ceiling = min(self.cap, self.base * (2 ** self.attempts))
+        self.attempts += 1
+        return ceiling / 2 + self.rng.uniform(0, ceiling / 2)
+
+    def reset(self):
+        self.attempts = 0
+
+
+class SubscriptionSupervisor():
+
+    # Keeps a set of subscriptions alive across connection loss. The session
+    # event handler reports session, service and subscription status to it,
+    # and it drives the session back to LIVE:
+    #
+    #   STARTING -> OPENING -> SUBSCRIBING -> LIVE
+    #   LIVE -(connection down)-> DOWN -(connection up)-> OPENING
+    #   LIVE -(subscription terminated)-> SUBSCRIBING
+    #
+    # Failed opens and subscriptions are retried after a Backoff delay, on a
+    # timer thread. Subscriptions are always re-sent with their original
+    # correlation ids, so whatever is keyed on them carries on. onGap(reason)
+    # is called when data stops, and onRestored(seconds) once every
+    # subscription has started again.
+
+    def __init__(self, serviceName, subscriptions, onGap=None, onRestored=None, backoff=None):
+
+        self.serviceName = serviceName
+        self.subscriptions = list(subscriptions)    # [(topic, correlationId)]
+        self.onGap = onGap
+        self.onRestored = onRestored
+        self.backoff = backoff or Backoff()
+
+        self.lock = threading.Lock()
+        self.state = STARTING
+        self.started = set()
+        self.gapStart = None
+        self.timer = None
+        self.gaps = 0
+        self.openedAt = None
+
+    def __transition(self, state):
+        if state != self.state:
+            log.info("Subscription state: %s -> %s", self.state, state)
+            self.state = state
+
+    def __retry(self, action, session):
+
+        # Called with the lock held
+        if self.timer is not None:
+            self.timer.cancel()
+        delay = self.backoff.next()
+        log.info("Retrying in %.1fs (attempt %d)", delay, self.backoff.attempts)
+        self.timer = threading.Timer(delay, action, (session,))
+        self.timer.daemon = True
+        self.timer.start()
+
+    def __gap(self, reason):
+
+        # Called with the lock held
+        if self.gapStart is None:
+            self.gapStart = time.time()
+            self.gaps += 1
+            if self.onGap is not None:
+                self.onGap(reason)
+
+    # Session calls are made without the lock held, since their status
+    # events may be handled before they return
+
+    def open(self, session):
+
+        with self.lock:
+            if self.state == STOPPED:
+                return
+            self.__transition(OPENING)
+            self.openedAt = time.perf_counter()
+
+        if not session.openServiceAsync(self.serviceName):
+            with self.lock:
+                self.__retry(self.open, session)
+
+    def subscribe(self, session):
+
+        with self.lock:
+            if self.state == STOPPED:
+                return
+            self.__transition(SUBSCRIBING)
+            self.started.clear()
+
+        subscriptions = blpapi.SubscriptionList()
+        for topic, correlationId in self.subscriptions:
+            subscriptions.add(topic=topic, correlationId=correlationId)
+
+        # A subscription the session still holds would make its id a
+        # duplicate, so any left over are dropped first
+        try:
+            session.unsubscribe(subscriptions)
+        except Exception:
+            pass
+
+        try:
+            session.subscribe(subscriptions)
+        except Exception as e:
+            log.warning("Subscribe failed: %s", e)
+            with self.lock:
+                self.__retry(self.subscribe, session)
+
+    def sessionStarted(self, session):
+        self.open(session)
+
+    def connectionDown(self):
+
+        with self.lock:
+            if self.state == STOPPED:
+                return
+            if self.timer is not None:
+                self.timer.cancel()
+            self.__transition(DOWN)
+            self.__gap("connection down")
+
+    def connectionUp(self, session):
+
+        # The service is reopened before resubscribing, the same path as at
+        # startup
+        with self.lock:
+            if self.state != DOWN:
+                return
+            self.backoff.reset()
+        self.open(session)
+
+    def serviceOpened(self, session):
+
+        with self.lock:
+            if self.state != OPENING:
+                return
+            requestLatency("serviceOpen").record(time.perf_counter() - self.openedAt)
+        self.subscribe(session)
+
+    def serviceOpenFailed(self, session):
+
+        with self.lock:
+            if self.state == OPENING:
+                requestFailures("serviceOpen", "error").inc()
+                self.__retry(self.open, session)
+
+    def subscriptionStarted(self, correlationId):
+
+        with self.lock:
+            if self.state != SUBSCRIBING:
+                return
+            self.started.add(correlationId.value())
+            if len(self.started) < len(self.subscriptions):
+                return
+
+            self.__transition(LIVE)
+            self.backoff.reset()
+
+            if self.gapStart is not None:
+                seconds = time.time() - self.gapStart
+                self.gapStart = None
+                if self.onRestored is not None:
+                    self.onRestored(seconds)
+
+    def subscriptionLost(self, session, correlationId, reason):
+
+        # SubscriptionFailure or SubscriptionTerminated. Terminations while
+        # resubscribing are those of the subscriptions being replaced.
+        with self.lock:
+            if self.state == LIVE:
+                self.__gap(reason)
+                self.__retry(self.subscribe, session)
+            elif self.state == SUBSCRIBING and reason == "failure":
+                self.__gap(reason)
+                self.__retry(self.subscribe, session)
+
+    def sessionTerminated(self):
+
+        # True if the session ended while the connection was down, which is
+        # worth starting a new session for; otherwise it was stopped
+        with self.lock:
+            restart = self.state == DOWN
+            if self.timer is not None:
+                self.timer.cancel()
+            self.__transition(STARTING if restart else STOPPED)
+            return restart
+
+    def stop(self):
+
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+            self.__transition(STOPPED)
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
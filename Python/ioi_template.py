@@ -0,0 +1,194 @@
+# ioi_template.py
+
+import blpapi
+import datetime
+
+# Plan steps, compiled once per template
+SET             = 0     # element.setElement(name, value)
+ENTER           = 1     # child = element.getElement(name), then sub-steps
+CHOICE          = 2     # child = element.setChoice(name), then sub-steps
+APPEND          = 3     # child = element.appendElement(), then sub-steps
+VALUE           = 4     # element.setValue(value)
+APPEND_VALUE    = 5     # element.appendValue(value)
+PARAM           = 6     # remember where a parameter is written
+
+d_prepared = 16
+
+
+class Param():
+
+    # Placeholder for a field that changes per request, e.g. price or goodUntil.
+    # A parameter left out of create() takes the default, or stays unset if
+    # there is none.
+
+    __slots__ = ("name", "default")
+
+    def __init__(self, name, default=None):
+        self.name = name
+        self.default = default
+
+    def __repr__(self):
+        return "Param(%s)" % self.name
+
+
+class RequestTemplate():
+
+    # Prebuilt request shape for one operation. The spec uses the same nested
+    # dict/list layout as ioi_bulk.buildRequest, with Param placeholders for the
+    # fields that vary. It is compiled once into a flat plan of interned Names,
+    # with every choice already resolved, and requests are stamped from the plan
+    # ahead of use (prepare) so that create() only writes the parameters into a
+    # request whose static fields are already set. blpapi requests cannot be
+    # copied, so prestamping is what stands in for cloning.
+
+    def __init__(self, service, operation, spec, prepared=d_prepared):
+
+        self.service = service
+        self.operation = operation
+        self.prepared = prepared
+        self.pool = []
+
+        request = service.createRequest(operation)
+        self.plan = self.__compile(request.asElement(), spec)
+
+    def __compile(self, element, spec):
+
+        # Walks the spec against a scratch request so that choice elements can
+        # be told apart from sequences by their datatype
+        plan = []
+
+        if isinstance(spec, dict):
+            isChoice = element.datatype() == blpapi.DataType.CHOICE
+            for field, sub in spec.items():
+                name = blpapi.Name(field)
+                if isChoice:
+                    plan.append((CHOICE, name, self.__compileValue(element.setChoice(name), sub)))
+                elif isinstance(sub, Param):
+                    plan.append((PARAM, name, sub))
+                elif isinstance(sub, (dict, list, tuple)):
+                    plan.append((ENTER, name, self.__compile(element.getElement(name), sub)))
+                else:
+                    plan.append((SET, name, sub))
+
+        elif isinstance(spec, (list, tuple)):
+            for item in spec:
+                if isinstance(item, Param):
+                    raise ValueError("%s: array entries cannot be parameters" % item.name)
+                elif isinstance(item, (dict, list, tuple)):
+                    plan.append((APPEND, None, self.__compile(element.appendElement(), item)))
+                else:
+                    plan.append((APPEND_VALUE, None, item))
+
+        return tuple(plan)
+
+    def __compileValue(self, element, sub):
+        if isinstance(sub, Param):
+            return ((PARAM, None, sub),)
+        if isinstance(sub, (dict, list, tuple)):
+            return self.__compile(element, sub)
+        return ((VALUE, None, sub),)
+
+    def __run(self, element, plan, slots):
+
+        for step, name, arg in plan:
+            if step == SET:
+                element.setElement(name, arg)
+            elif step == ENTER:
+                self.__run(element.getElement(name), arg, slots)
+            elif step == CHOICE:
+                self.__run(element.setChoice(name), arg, slots)
+            elif step == APPEND:
+                self.__run(element.appendElement(), arg, slots)
+            elif step == VALUE:
+                element.setValue(arg)
+            elif step == APPEND_VALUE:
+                element.appendValue(arg)
+            else:
+                slots.append((element, name, arg))
+
+    def stamp(self):
+
+        # A new request with every static field set, and the (element, name,
+        # Param) slots its parameters are written to
+        request = self.service.createRequest(self.operation)
+        slots = []
+        self.__run(request.asElement(), self.plan, slots)
+        return request, slots
+
+    def prepare(self, count=None):
+
+        # Stamps requests ahead of time, off the send path
+        for i in range(self.prepared if count is None else count):
+            self.pool.append(self.stamp())
+
+    def create(self, **values):
+
+        request, slots = self.pool.pop() if self.pool else self.stamp()
+
+        for element, name, param in slots:
+            value = values.get(param.name, param.default)
+            if value is None:
+                continue
+            if name is None:
+                element.setValue(value)
+            else:
+                element.setElement(name, value)
+
+        return request
+
+
+# Request shape of the sample CallSpread IOI, shared by py_dapi_CreateIOI.py and
+# py_dapi_BulkIOI.py. Only the Param fields change between requests;
+# everything else is written once per request by the template.
+LEG = {
+    "type": "Call",
+    "expiry": datetime.datetime(2017,12,15,12),
+    "style": "European",
+    "exchange": "LN",
+    "underlying": {"ticker": "VOD LN Equity"},
+}
+
+CALL_SPREAD = {
+    "ioi": {
+        "goodUntil": Param("goodUntil"),
+        "instrument": {"option": {
+            "structure": "CallSpread",
+            "legs": [dict(LEG, strike=230, ratio=+1.00), dict(LEG, strike=240, ratio=-1.25)],
+        }},
+        "bid": {
+            "price": {"fixed": {"price": Param("bidPrice")}},
+            "size": {"quantity": Param("bidSize")},
+            "referencePrice": {"price": 202.15, "currency": "GBp"},
+            "notes": "bid notes",
+        },
+        "offer": {
+            "price": {"fixed": {"price": Param("offerPrice")}},
+            "size": {"quantity": Param("offerSize")},
+            "referencePrice": {"price": 202.15, "currency": "GBp"},
+            "notes": "offer notes",
+        },
+        "targets": {"includes": [{"acronym": "BLPA"}, {"acronym": "BLPB"}]},
+    },
+}
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
@@ -0,0 +1,164 @@
+# ioi_timestamps.py
+
+NANOS = 1000000000
+
+# Distinct recurring values (expiries, good-until times) kept by cached()
+d_cacheSize = 4096
+
+# Datetime fields that differ on every tick, so are never worth caching
+PER_TICK_FIELDS = frozenset(["ioi_sentTime", "receivedTime"])
+
+# Powers of ten that scale a fraction of n digits to nanoseconds
+FRACTION_SCALE = tuple(10 ** (9 - n) for n in range(10))
+
+
+def daysFromCivil(year, month, day):
+
+    # Days since 1970-01-01 of a proleptic Gregorian date, in integer
+    # arithmetic (H. Hinnant's days_from_civil)
+    if month <= 2:
+        year -= 1
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+class TimestampDecoder():
+
+    # Parses Datetime fields as getElementAsString reports them,
+    #
+    #   2017-12-15T12:00:00.000+00:00
+    #   2017-12-15 12:00:00.123456
+    #   2017-12-15
+    #   2017-12-15+00:00
+    #
+    # into integer epoch nanoseconds, without going through datetime. Values
+    # without an offset are UTC. The date and time up to the second are the
+    # costly part, and ticks arriving together share them, so the last ones
+    # parsed are kept and usually only the fraction and offset are read.
+    # Returns None for an empty or malformed value.
+    #
+    # Option expiries, future reference dates and good-until times repeat
+    # across thousands of IOIs; cached() looks those up whole, in a cache of
+    # two generations: when the recent one fills, it becomes the older one
+    # and the previous older one is dropped, so whatever is still recurring
+    # survives at the cost of one dict lookup.
+
+    def __init__(self, cacheSize=d_cacheSize):
+        self.lastSecond = (None, 0)
+        self.lastDate = (None, 0)
+        self.cacheSize = cacheSize
+        self.recent = {}
+        self.older = {}
+
+    def seconds(self, prefix):
+
+        # Epoch seconds of "YYYY-MM-DD" or "YYYY-MM-DD?HH:MM:SS" as UTC, where
+        # ? is "T" or a space
+        date = prefix[:10]
+        last = self.lastDate
+        if date == last[0]:
+            seconds = last[1]
+        else:
+            seconds = daysFromCivil(int(date[0:4]), int(date[5:7]), int(date[8:10])) * 86400
+            self.lastDate = (date, seconds)
+
+        if len(prefix) == 19 and prefix[10] in "T ":
+            seconds += int(prefix[11:13]) * 3600 + int(prefix[14:16]) * 60 + int(prefix[17:19])
+        elif len(prefix) != 10:
+            raise ValueError("Malformed date and time: %r" % prefix)
+        return seconds
+
+    def nanos(self, text):
+
+        if not text:
+            return None
+
+        try:
+            if len(text) > 10 and text[10] in "T ":
+                # Date and time: start is where the fraction or offset begins
+                start = 19
+                prefix = text[:19]
+                last = self.lastSecond
+                if prefix == last[0]:
+                    seconds = last[1]
+                else:
+                    seconds = self.seconds(prefix)
+                    self.lastSecond = (prefix, seconds)
+            else:
+                # A bare date, possibly followed by an offset
+                start = 10
+                seconds = self.seconds(text[:10])
+
+            end = len(text)
+            if end <= start:
+                return seconds * NANOS
+
+            if text[end - 1] == "Z":
+                end -= 1
+            elif end >= start + 6 and text[end - 3] == ":" and text[end - 6] in "+-":
+                offset = int(text[end - 5:end - 3]) * 3600 + int(text[end - 2:end]) * 60
+                seconds += -offset if text[end - 6] == "+" else offset
+                end -= 6
+
+            nanos = 0
+            if start == 19 and end > 20 and text[19] == ".":
+                digits = text[20:min(end, 29)]
+                nanos = int(digits) * FRACTION_SCALE[len(digits)]
+            elif end != start:
+                return None
+
+            return seconds * NANOS + nanos
+
+        except (ValueError, IndexError):
+            return None
+
+    def cached(self, text):
+
+        nanos = self.recent.get(text)
+        if nanos is not None:
+            return nanos
+
+        nanos = self.older.get(text)
+        if nanos is None:
+            nanos = self.nanos(text)
+            if nanos is None:
+                return None
+
+        if len(self.recent) >= self.cacheSize:
+            self.older = self.recent
+            self.recent = {}
+        self.recent[text] = nanos
+        return nanos
+
+    def parserFor(self, field):
+        return self.nanos if field in PER_TICK_FIELDS else self.cached
+
+
+# Shared by every module in the process. Its caches only ever hold values
+# that were correct when stored, so threads may share it without a lock.
+TIMESTAMPS = TimestampDecoder()
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
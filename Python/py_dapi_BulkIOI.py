@@ -0,0 +1,228 @@
+# py_dapi_BulkIOI.py
+
+import sys
+import blpapi
+import datetime
+import time
+import asyncio
+
+from ioi_asyncio import AsyncSession
+from ioi_bulk import BulkSubmitter
+from ioi_template import RequestTemplate, CALL_SPREAD
+
+SESSION_STARTED                 = blpapi.Name("SessionStarted")
+SESSION_STARTUP_FAILURE         = blpapi.Name("SessionStartupFailure")
+SERVICE_OPENED                  = blpapi.Name("ServiceOpened")
+SERVICE_OPEN_FAILURE            = blpapi.Name("ServiceOpenFailure")
+SLOW_CONSUMER_WARNING           = blpapi.Name("SlowConsumerWarning")
+SLOW_CONSUMER_WARNING_CLEARED   = blpapi.Name("SlowConsumerWarningCleared")
+
+
+d_ioi = "//blp/ioiapi-beta-request"
+d_host = "localhost"
+d_port = 8194
+
+# Number of IOIs to create, and how many createIoi requests may be in flight
+d_count = 100
+d_window = 32
+
+
+def createIOIParams(i):
+
+    # Prices and sizes stepped per IOI
+    return ("createIoi", {
+        "goodUntil": datetime.datetime.utcnow() + datetime.timedelta(0,900),
+        "bidPrice": 83.63 - 0.01 * i,
+        "bidSize": 1000 + 100 * i,
+        "offerPrice": 83.64 + 0.01 * i,
+        "offerSize": 2000 + 100 * i,
+    })
+
+
+class SessionEventHandler():
+
+    def __init__(self):
+        self.bulk = None
+        self.started = None
+        self.session = None
+
+    def sendBulkCreateIOI(self, session):
+
+        self.session = session
+        service = session.getService(d_ioi)
+
+        # Requests for the first window are stamped before the clock starts
+        template = RequestTemplate(service, "createIoi", CALL_SPREAD)
+        template.prepare(d_window)
+
+        self.bulk = BulkSubmitter(session, service, (createIOIParams(i) for i in range(d_count)),
+                                  window=d_window, onResult=self.processBulkResult,
+                                  build=lambda service, operation, params: template.create(**params))
+
+        print("Sending %d createIoi requests, %d in flight..." % (d_count, d_window))
+        self.started = time.time()
+        self.bulk.start()
+
+    def processBulkResult(self, result):
+
+        # Called for every request as it completes, answered, failed or timed
+        # out by the registry's watchdog, so the last one always ends the run
+        if result.error is not None:
+            print("IOI %d failed: %s" % (result.index, result.error))
+        else:
+            print("IOI %d created in %.1fms: %s" % (result.index, result.latency * 1000, result.handle))
+
+        if self.bulk.completed == len(self.bulk.results):
+
+            failed = len([r for r in self.bulk.results if r.error is not None])
+            elapsed = time.time() - self.started
+
+            print("%d IOIs sent, %d failed, in %.3fs" % (len(self.bulk.results), failed, elapsed))
+
+            # All requests complete; run() returns once the session has stopped
+            self.session.stopAsync()
+
+    def processAdminEvent(self,event):
+        print("Processing ADMIN event")
+
+        for msg in event:
+            if msg.messageType() == SLOW_CONSUMER_WARNING:
+                print("Warning: Entered Slow Consumer status")
+
+            elif msg.messageType() == SLOW_CONSUMER_WARNING_CLEARED:
+                sys.stderr.write("Slow consumer status cleared")
+
+            else:
+                print(msg)
+
+
+    def processSessionStatusEvent(self,event,session):
+        print("Processing SESSION_STATUS event")
+
+        for msg in event:
+            if msg.messageType() == SESSION_STARTED:
+                print("Session started...")
+                session.openServiceAsync(d_ioi)
+
+            elif msg.messageType() == SESSION_STARTUP_FAILURE:
+                sys.stderr.write("Error: Session startup failed")
+
+            else:
+                print(msg)
+
+
+    def processServiceStatusEvent(self,event,session):
+        print ("Processing SERVICE_STATUS event")
+
+        for msg in event:
+
+            if msg.messageType() == SERVICE_OPENED:
+
+                print("IOIAPI service opened... Sending requests...")
+                self.sendBulkCreateIOI(session)
+
+            elif msg.messageType() == SERVICE_OPEN_FAILURE:
+                    print("Error: Service Failed to open")
+
+
+    def processResponseEvent(self, event, session):
+
+        if self.bulk is None or not self.bulk.processResponseEvent(event):
+            for msg in event:
+                print ("Unexpected message...")
+                print (msg)
+
+
+    def processMiscEvents(self, event):
+
+        print("Processing %s event" % event.eventType())
+
+        for msg in event:
+
+            print("MISC MESSAGE: %s" % (msg))
+
+
+    def processEvent(self, event, session):
+        try:
+
+            if event.eventType() == blpapi.Event.ADMIN:
+                self.processAdminEvent(event)
+
+            elif event.eventType() == blpapi.Event.SESSION_STATUS:
+                self.processSessionStatusEvent(event,session)
+
+            elif event.eventType() == blpapi.Event.SERVICE_STATUS:
+                self.processServiceStatusEvent(event,session)
+
+            elif event.eventType() in (blpapi.Event.PARTIAL_RESPONSE, blpapi.Event.RESPONSE, blpapi.Event.REQUEST_STATUS):
+                self.processResponseEvent(event,session)
+
+            else:
+                self.processMiscEvents(event)
+
+        except Exception as e:
+            print("Exception:  %s" % str(e))
+
+        return False
+
+
+def main():
+
+    sessionOptions = blpapi.SessionOptions()
+    sessionOptions.setServerHost(d_host)
+    sessionOptions.setServerPort(d_port)
+
+    print("Connecting to %s:%d" % (d_host,d_port))
+
+    eventHandler = SessionEventHandler()
+
+    asyncio.run(run(sessionOptions, eventHandler))
+
+
+async def run(sessionOptions, eventHandler):
+
+    # The event handler still drives the workflow on the blpapi dispatcher
+    # thread; the event loop only waits here until the session terminates
+    session = AsyncSession(sessionOptions, eventHandler.processEvent)
+
+    try:
+        await session.start()
+    except Exception as e:
+        print("Failed to start session: %s" % e)
+        return
+
+    try:
+        await session.terminated
+        print ("Terminating...")
+    finally:
+        if not session.terminated.done():
+            session.session.stop()
+
+if __name__ == "__main__":
+    print("Bloomberg - IOI API Example - DesktopAPI - BulkIOI")
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("Ctrl+C pressed. Stopping...")
+
+
+__copyright__ = """
+Copyright 2017. Bloomberg Finance L.P.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:  The above
+copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
@@ -4,6 +4,10 @@ import sys
 import blpapi
 import datetime
 import time
+import asyncio
+
+from ioi_asyncio import AsyncSession
+from ioi_requests import RequestRegistry
 
 SESSION_STARTED                 = blpapi.Name("SessionStarted")
 SESSION_STARTUP_FAILURE         = blpapi.Name("SessionStartupFailure")
@@ -19,10 +23,12 @@ d_ioi = "//blp/ioiapi-beta-request"
 d_host = "localhost"
 d_port = 8194
 
-bEnd=False
 
 class SessionEventHandler():
 
+    def __init__(self):
+        self.requests = RequestRegistry()
+
     #start of create new equity IOI
     def sendCreateIOI(self, session):
  
@@ -92,7 +98,8 @@ class SessionEventHandler():
 
         print("Sending Request: %s" % request.toString())
 
-        self.requestID  = session.sendRequest(request)
+        self.requests.send(session, request, "createIoi",
+                           callback=lambda pending: self.processResult(pending, session))
         print("CreateIOI request sent.")
 
 
@@ -141,37 +148,45 @@ class SessionEventHandler():
                 
     def processResponseEvent(self, event, session):
         print("Processing RESPONSE event")
-        
-        for msg in event:
-            
+
+        if not self.requests.processResponseEvent(event):
+            for msg in event:
+                print ("Unexpected message...")
+                print (msg)
+
+
+    def processResult(self, pending, session):
+
+        # Called once per request, on its response, its failure or its timeout
+        print("CORRELATION ID: %d" % pending.correlationId.value())
+        print("ROUND TRIP: %.1fms" % (pending.latency * 1000))
+
+        if pending.error is not None:
+            print("Request failed: %s" % pending.error)
+
+        else:
+            msg = pending.response
             print("MESSAGE: %s" % msg.toString())
-            print("CORRELATION ID: %d" % msg.correlationIds()[0].value())
+            print("MESSAGE TYPE: %s" % msg.messageType())
+
+            if msg.messageType() == HANDLE:
+                val = msg.getElementAsString("value")
+                print("Response: Value=%s" % (val))
 
-            if msg.correlationIds()[0].value() == self.requestID.value():
-                print("MESSAGE TYPE: %s" % msg.messageType())
-                
-                if msg.messageType() == HANDLE:
-                    val = msg.getElementAsString("value")
-                    print("Response: Value=%s" % (val))
-                
-                else:
-                    print ("Unexpected message...")
-                    
-                global bEnd
-                bEnd = True
-            
             else:
                 print ("Unexpected message...")
-                print (msg)
-                    
-            
+
+        # Request complete; run() returns once the session has stopped
+        session.stopAsync()
+
+
     def processMiscEvents(self, event):
         
-        print("Processing " + event.eventType() + " event")
+        print("Processing %s event" % event.eventType())
         
         for msg in event:
 
-            print("MISC MESSAGE: %s" % (msg.tostring()))
+            print("MISC MESSAGE: %s" % (msg.toString()))
 
 
     def processEvent(self, event, session):
@@ -180,13 +195,13 @@ class SessionEventHandler():
             if event.eventType() == blpapi.Event.ADMIN:
                 self.processAdminEvent(event)
             
-            if event.eventType() == blpapi.Event.SESSION_STATUS:
+            elif event.eventType() == blpapi.Event.SESSION_STATUS:
                 self.processSessionStatusEvent(event,session)
 
             elif event.eventType() == blpapi.Event.SERVICE_STATUS:
                 self.processServiceStatusEvent(event,session)
 
-            elif event.eventType() == blpapi.Event.RESPONSE:
+            elif event.eventType() in (blpapi.Event.PARTIAL_RESPONSE, blpapi.Event.RESPONSE, blpapi.Event.REQUEST_STATUS):
                 self.processResponseEvent(event,session)
             
             else:
@@ -208,19 +223,27 @@ def main():
 
     eventHandler = SessionEventHandler()
 
-    session = blpapi.Session(sessionOptions, eventHandler.processEvent)
+    asyncio.run(run(sessionOptions, eventHandler))
+
+
+async def run(sessionOptions, eventHandler):
 
-    if not session.startAsync():
-        print("Failed to start session.")
+    # The event handler still drives the workflow on the blpapi dispatcher
+    # thread; the event loop only waits here until the session terminates
+    session = AsyncSession(sessionOptions, eventHandler.processEvent)
+
+    try:
+        await session.start()
+    except Exception as e:
+        print("Failed to start session: %s" % e)
         return
-    
-    global bEnd
-    while bEnd==False:
-        pass
-    
-    print ("Terminating...")
-    
-    session.stop()
+
+    try:
+        await session.terminated
+        print ("Terminating...")
+    finally:
+        if not session.terminated.done():
+            session.session.stop()
 
 if __name__ == "__main__":
     print("Bloomberg - IOI API Example - DesktopAPI - CreateIOI")
@@ -4,6 +4,11 @@ import sys
 import blpapi
 import datetime
 import time
+import asyncio
+
+from ioi_asyncio import AsyncSession
+from ioi_requests import RequestRegistry
+from ioi_template import RequestTemplate, CALL_SPREAD
 
 SESSION_STARTED                 = blpapi.Name("SessionStarted")
 SESSION_STARTUP_FAILURE         = blpapi.Name("SessionStartupFailure")
@@ -18,76 +23,29 @@ d_ioi = "//blp/ioiapi-beta-request"
 d_host = "localhost"
 d_port = 8194
 
-bEnd=False
 
 class SessionEventHandler():
+
+    def __init__(self):
+        self.requests = RequestRegistry()
+        self.template = None
     
     def sendCreateIOI(self, session):
 
-        service = session.getService(d_ioi)
-        request = service.createRequest("createIoi")
-
-        ioi = request.getElement("ioi")
-
-        # Set the good-until time of this option to 15 minutes from now
-        ioi.setElement("goodUntil", datetime.datetime.utcnow() + datetime.timedelta(0,900))
-
-        # Create the option
-        option = ioi.getElement("instrument").setChoice("option")
-        option.setElement("structure", "CallSpread")
-
-        # This option has two legs. Create the first leg
-        leg1 = option.getElement("legs").appendElement()
-        leg1.setElement("type","Call")
-        leg1.setElement("strike", 230)
-        leg1.setElement("expiry", datetime.datetime(2017,12,15,12))
-        leg1.setElement("style", "European")
-        leg1.setElement("ratio", +1.00)
-        leg1.setElement("exchange", "LN")
-        leg1.getElement("underlying").setChoice("ticker")
-        leg1.getElement("underlying").setElement("ticker", "VOD LN Equity")
-
-        # Create the second leg
-        leg2 = option.getElement("legs").appendElement()
-        leg1.setElement("type","Call")
-        leg2.setElement("strike", 240)
-        leg2.setElement("expiry", datetime.datetime(2017,12,15,12))
-        leg2.setElement("style", "European")
-        leg2.setElement("ratio", -1.25)
-        leg2.setElement("exchange", "LN")
-        leg2.getElement("underlying").setChoice("ticker")
-        leg2.getElement("underlying").setElement("ticker", "VOD LN Equity")
-
-        # Create a quote consisting of a bid and an offer
-        bid = ioi.getElement("bid")
-        bid.getElement("price").setChoice("fixed")
-        bid.getElement("price").getElement("fixed").getElement("price").setValue(83.63)
-        bid.getElement("size").getElement("quantity").setValue(1000)
-        bid.getElement("referencePrice").setElement("price", 202.15)
-        bid.getElement("referencePrice").setElement("currency", "GBp")
-        bid.setElement("notes", "bid notes")
-
-        # Set the offer
-        offer = ioi.getElement("offer")
-        offer.getElement("price").setChoice("fixed")
-        offer.getElement("price").getElement("fixed").getElement("price").setValue(83.64)
-        offer.getElement("size").setChoice("quantity")
-        offer.getElement("size").getElement("quantity").setValue(2000)
-        offer.getElement("referencePrice").setElement("price", 202.15)
-        offer.getElement("referencePrice").setElement("currency", "GBp")
-        offer.setElement("notes", "offer notes")
-
-        # Set targets
-        includes = ioi.getElement("targets").getElement("includes")
-        for acronym in ["BLPA", "BLPB"]:
-            target = includes.appendElement()
-            target.setChoice("acronym")
-            target.setElement("acronym", acronym)
-                    
+        # The template is compiled on first use and reused for every request
+        if self.template is None:
+            self.template = RequestTemplate(session.getService(d_ioi), "createIoi", CALL_SPREAD)
+
+        # Good-until time of this option is 15 minutes from now
+        request = self.template.create(
+            goodUntil=datetime.datetime.utcnow() + datetime.timedelta(0,900),
+            bidPrice=83.63, bidSize=1000,
+            offerPrice=83.64, offerSize=2000)
         
         print("Sending Request: %s" % request.toString())
 
-        self.requestID = session.sendRequest(request)
+        self.requests.send(session, request, "createIoi",
+                           callback=lambda pending: self.processResult(pending, session))
         print("CreateIOI request sent.")
 
     def processAdminEvent(self,event):  
@@ -135,37 +93,45 @@ class SessionEventHandler():
                 
     def processResponseEvent(self, event, session):
         print("Processing RESPONSE event")
-        
-        for msg in event:
-            
+
+        if not self.requests.processResponseEvent(event):
+            for msg in event:
+                print ("Unexpected message...")
+                print (msg)
+
+
+    def processResult(self, pending, session):
+
+        # Called once per request, on its response, its failure or its timeout
+        print("CORRELATION ID: %d" % pending.correlationId.value())
+        print("ROUND TRIP: %.1fms" % (pending.latency * 1000))
+
+        if pending.error is not None:
+            print("Request failed: %s" % pending.error)
+
+        else:
+            msg = pending.response
             print("MESSAGE: %s" % msg.toString())
-            print("CORRELATION ID: %d" % msg.correlationIds()[0].value())
+            print("MESSAGE TYPE: %s" % msg.messageType())
+
+            if msg.messageType() == HANDLE:
+                val = msg.getElementAsString("value")
+                print("Response: Value=%s" % (val))
 
-            if msg.correlationIds()[0].value() == self.requestID.value():
-                print("MESSAGE TYPE: %s" % msg.messageType())
-                
-                if msg.messageType() == HANDLE:
-                    val = msg.getElementAsString("value")
-                    print("Response: Value=%s" % (val))
-                
-                else:
-                    print ("Unexpected message...")
-                    
-                global bEnd
-                bEnd = True
-            
             else:
                 print ("Unexpected message...")
-                print (msg)
-                    
-            
+
+        # Request complete; run() returns once the session has stopped
+        session.stopAsync()
+
+
     def processMiscEvents(self, event):
         
-        print("Processing " + event.eventType() + " event")
+        print("Processing %s event" % event.eventType())
         
         for msg in event:
 
-            print("MISC MESSAGE: %s" % (msg.tostring()))
+            print("MISC MESSAGE: %s" % (msg.toString()))
 
 
     def processEvent(self, event, session):
@@ -174,13 +140,13 @@ class SessionEventHandler():
             if event.eventType() == blpapi.Event.ADMIN:
                 self.processAdminEvent(event)
             
-            if event.eventType() == blpapi.Event.SESSION_STATUS:
+            elif event.eventType() == blpapi.Event.SESSION_STATUS:
                 self.processSessionStatusEvent(event,session)
 
             elif event.eventType() == blpapi.Event.SERVICE_STATUS:
                 self.processServiceStatusEvent(event,session)
 
-            elif event.eventType() == blpapi.Event.RESPONSE:
+            elif event.eventType() in (blpapi.Event.PARTIAL_RESPONSE, blpapi.Event.RESPONSE, blpapi.Event.REQUEST_STATUS):
                 self.processResponseEvent(event,session)
             
             else:
@@ -202,19 +168,27 @@ def main():
 
     eventHandler = SessionEventHandler()
 
-    session = blpapi.Session(sessionOptions, eventHandler.processEvent)
+    asyncio.run(run(sessionOptions, eventHandler))
+
 
-    if not session.startAsync():
-        print("Failed to start session.")
+async def run(sessionOptions, eventHandler):
+
+    # The event handler still drives the workflow on the blpapi dispatcher
+    # thread; the event loop only waits here until the session terminates
+    session = AsyncSession(sessionOptions, eventHandler.processEvent)
+
+    try:
+        await session.start()
+    except Exception as e:
+        print("Failed to start session: %s" % e)
         return
-    
-    global bEnd
-    while bEnd==False:
-        pass
-    
-    print ("Terminating...")
-    
-    session.stop()
+
+    try:
+        await session.terminated
+        print ("Terminating...")
+    finally:
+        if not session.terminated.done():
+            session.session.stop()
 
 if __name__ == "__main__":
     print("Bloomberg - IOI API Example - DesktopAPI - CreateIOI")
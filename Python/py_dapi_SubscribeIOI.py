@@ -1,9 +1,26 @@
 # py_dapi_SubscribeIOI.py
 
-import sys
 import blpapi
-import datetime
 import time
+import logging
+import asyncio
+import threading
+
+from ioi_fields import IOIFieldExtractor
+from ioi_columnar import IOIColumnBatch
+from ioi_logging import AsyncLogging
+from ioi_asyncio import AsyncSession
+from ioi_book import IOIBook
+from ioi_expiry import ExpiryWheel
+from ioi_conflation import ConflatingQueue
+from ioi_fanout import IOIFanout
+from ioi_journal import JournalWriter, SENT_TIME_FIELD
+from ioi_snapshot import IOISnapshots, PaintReconciliation
+from ioi_supervisor import SubscriptionSupervisor
+from ioi_metrics import METRICS, MetricsServer
+from ioi_timestamps import TIMESTAMPS
+from ioi_latency import TickLatency
+import ioi_book
 
 SESSION_STARTED                 = blpapi.Name("SessionStarted")
 SESSION_TERMINATED              = blpapi.Name("SessionTerminated")
@@ -25,386 +42,667 @@ d_ioi = "//blp/ioisub-beta"
 d_host = "localhost"
 d_port = 8194
 ioiSubscriptionID=blpapi.CorrelationId(1)
-bEnd=False
+
+# Queued to the conflation consumer in place of an IOI handle, asking it for
+# the handles held when the stream was restored
+RESTORED = object()
+
+# Ioidata fields to decode on each tick. None decodes every field in the
+# service schema; a list such as ["ioi_instrument_type", "ioi_bid_price_fixed_price",
+# "ioi_offer_price_fixed_price", "change"] restricts decoding to those fields.
+d_fields = None
+
+# Optional early filter, called with an IOIView of each tick before it is
+# decoded; returning False drops the tick. Only the fields the filter reads
+# are decoded for ticks it drops. Either a compiled IOIFilter (see
+# ioi_filter.py), e.g.
+#   d_accept = IOIFilter({"instrumentTypes": ["option"], "minSize": 1000,
+#                         "underlyings": ["VOD LN Equity"]})
+# or any callable, e.g.
+#   d_accept = lambda ioi: ioi.get("ioi_instrument_type") == "stock"
+# Removals are never filtered, so an IOI already in the book is not left
+# behind when it is cancelled.
+d_accept = None
+
+# Path of a binary journal every tick delivered to the book is appended to
+# (see ioi_journal.py, which also replays it), or None. Ticks dropped by
+# d_accept are not journalled, and in slow consumer mode the coalesced
+# updates are.
+d_journal = None
+
+# Path of a periodic snapshot of the live IOI book, or None. On startup the
+# book is recovered from the snapshot and the journal written after it, then
+# reconciled against the service's initial paint when the subscription
+# starts. Snapshots need the book in this process, so are not taken with
+# d_workers.
+d_snapshot = None
+d_snapshotInterval = 60.0
+
+# When True, each SUBSCRIPTION_DATA event is decoded as a whole into typed
+# columns (see ioi_columnar.py) and handed to processIOIBatch. The live IOI
+# book is only maintained on the per-message path.
+d_batchMode = False
+
+# Fields decoded while the session reports a slow consumer: prices and sizes,
+# and the sent time, so tick latency is still measured when it matters most.
+# Everything the book keys, indexes and expires IOIs on (ioi_book.FIELDS) is
+# always added, so an IOI first seen in that mode is booked under its broker
+# and underlyings. Updates to the same IOI are coalesced in that mode and
+# applied to the book every d_coalesceInterval seconds.
+d_degradedFields = [SENT_TIME_FIELD,
+    "ioi_bid_price_fixed_price", "ioi_offer_price_fixed_price",
+    "ioi_bid_size_quantity", "ioi_offer_size_quantity"]
+d_coalesceInterval = 0.1
+
+# When True, decoded ticks pass through a ConflatingQueue keyed by IOI handle
+# to a consumer thread that owns the book, so an IOI updated several times
+# while the consumer is busy is only applied once, with its latest fields
+d_conflate = True
+
+# Number of worker processes IOIs are fanned out to (see ioi_fanout.py). With
+# workers, the dispatcher thread only decodes, and each worker keeps the book
+# for the underlyings sharded to it. 0 handles everything in this process.
+d_workers = 0
+
+# A message that fails to process is counted and skipped; the traceback is
+# logged for the first failure of each message type and every
+# d_tracebackEvery'th after it
+d_tracebackEvery = 1000
+
+# Local port of the Prometheus-style metrics endpoint (/metrics), or None
+d_metricsPort = 9464
+
+# logging.DEBUG adds per-event traces and a full field dump of every IOI
+d_logLevel = logging.INFO
+
+log = logging.getLogger("ioi.subscriber")
+
+class IOIWorker():
+
+    # Runs in each fan-out worker process, on the IOIs of its shard. This is
+    # where enrichment, matching or persistence would go.
+
+    def __init__(self, index):
+        self.index = index
+        self.book = IOIBook(ExpiryWheel(time.time()))
+        self.count = 0
+
+    def __call__(self, ioi):
+        self.count += 1
+        self.book.expire(time.time())
+        self.book.apply(ioi)
+
+    def close(self):
+        print("Worker %d: %d IOIs processed, %d live" % (self.index, self.count, len(self.book)))
+
 
 class SessionEventHandler():
     
+    def __init__(self):
+        fields = d_fields
+        if fields is not None:
+            fields = list(fields) + [f for f in ioi_book.FIELDS if f not in fields]
+
+        self.extractor = IOIFieldExtractor(fields)
+        self.accept = d_accept
+        self.rejected = 0
+        self.book = IOIBook(ExpiryWheel(time.time()))
+        self.batch = IOIColumnBatch(extractor=self.extractor)
+
+        # Recovery reads the journal, so comes before it is reopened for writing
+        self.snapshots = None
+        self.reconciliation = None
+        if d_snapshot and not d_workers:
+            self.snapshots = IOISnapshots(d_snapshot, list(self.extractor.types), d_snapshotInterval)
+            self.snapshots.recover(self.book, d_journal)
+            if len(self.book):
+                self.reconciliation = PaintReconciliation(self.book.iois)
+
+        self.journal = None
+        if d_journal:
+            self.journal = JournalWriter(d_journal, list(self.extractor.types))
+
+        self.degradedExtractor = IOIFieldExtractor(ioi_book.FIELDS + [f for f in d_degradedFields if f not in ioi_book.FIELDS])
+        self.degraded = False
+        self.pending = {}
+        self.coalesced = 0
+        self.lastFlush = 0.0
+
+        self.supervisor = SubscriptionSupervisor(d_ioi, [(d_ioi + "/ioi", ioiSubscriptionID)],
+                                                 onGap=self.markGap, onRestored=self.restored)
+
+        self.fanout = None
+        if d_workers:
+            self.fanout = IOIFanout(d_workers, IOIWorker).start()
+
+        # Handlers by event type, and by message type for the status events;
+        # event types not listed go to processStatusEvent, and message types
+        # not listed to otherMessage
+        self.eventHandlers = {
+            blpapi.Event.SUBSCRIPTION_DATA: self.processSubscriptionDataEvent,
+        }
+        self.messageHandlers = {
+            blpapi.Event.ADMIN: {
+                SLOW_CONSUMER_WARNING:          self.slowConsumerWarning,
+                SLOW_CONSUMER_WARNING_CLEARED:  self.slowConsumerWarningCleared,
+            },
+            blpapi.Event.SESSION_STATUS: {
+                SESSION_STARTED:                self.sessionStarted,
+                SESSION_STARTUP_FAILURE:        self.sessionStartupFailure,
+                SESSION_CONNECTION_UP:          self.sessionConnectionUp,
+                SESSION_CONNECTION_DOWN:        self.sessionConnectionDown,
+            },
+            blpapi.Event.SERVICE_STATUS: {
+                SERVICE_OPENED:                 self.serviceOpened,
+                SERVICE_OPEN_FAILURE:           self.serviceOpenFailure,
+            },
+            blpapi.Event.SUBSCRIPTION_STATUS: {
+                SUBSCRIPTION_STARTED:           self.subscriptionStarted,
+                SUBSCRIPTION_FAILURE:           self.subscriptionFailure,
+                SUBSCRIPTION_TERMINATED:        self.subscriptionTerminated,
+            },
+        }
+        self.errors = {}
+
+        self.conflation = None
+        self.consumer = None
+        if d_conflate and not d_workers:
+            self.conflation = ConflatingQueue()
+            self.consumer = threading.Thread(target=self.consumeIOIs, daemon=True)
+            self.consumer.start()
+
+        self.received = 0
+        self.receivedAt = 0
+        self.latency = TickLatency()
+        self.eventLatency = METRICS.histogram("ioi_event_processing_seconds",
+                                              "Time to process one SUBSCRIPTION_DATA event")
+        self.slowConsumerEpisodes = METRICS.counter("ioi_slow_consumer_episodes_total",
+                                                    "Times the session reported a slow consumer")
+        self.registerMetrics()
+
+    def registerMetrics(self):
+
+        # Counts this handler already keeps are only read when scraped, so
+        # cost nothing per tick
+        METRICS.sampled("ioi_ticks_total", "Ioidata ticks received",
+                        lambda: self.received, "counter")
+        METRICS.sampled("ioi_ticks_filtered_total", "Ticks dropped by the filter",
+                        lambda: self.rejected, "counter")
+        METRICS.sampled("ioi_ticks_failed_total", "Messages that failed to process",
+                        lambda: sum(self.errors.values()), "counter")
+        METRICS.sampled("ioi_subscription_gaps_total", "Times the IOI stream stopped",
+                        lambda: self.supervisor.gaps, "counter")
+
+        if self.fanout is not None:
+            METRICS.sampled("ioi_fanout_dropped_total", "IOIs dropped because a worker queue was full",
+                            lambda: self.fanout.dropped, "counter")
+        else:
+            METRICS.sampled("ioi_book_live_iois", "Live IOIs in the book", lambda: len(self.book))
+
+        for quantile in (0.5, 0.9, 0.99):
+            METRICS.sampled("ioi_tick_latency_seconds", "ioi_sentTime to handler, over the last %d ticks" % self.latency.size,
+                            lambda q=quantile: self.latency.percentiles((q,))[q], quantile=quantile)
+        METRICS.sampled("ioi_tick_lag_seconds", "Mean tick latency above its lowest level",
+                        lambda: self.latency.lag / 1e9)
+        METRICS.sampled("ioi_tick_lagging", "1 while tick latency is growing past the lag threshold",
+                        lambda: int(self.latency.lagging))
+
+        if self.conflation is not None:
+            METRICS.sampled("ioi_updates_conflated_total", "IOI updates superseded before they were applied",
+                            lambda: self.conflation.conflated, "counter")
+
     def createIOISubscription(self, session):
 
-        print("Create IOI subscription")
-    
-        #Create the topic string for the ioi subscription.
-        ioiTopic = d_ioi + "/ioi"
-    
-        subscriptions = blpapi.SubscriptionList()
-        
-        subscriptions.add(topic=ioiTopic,correlationId=ioiSubscriptionID)
+        log.info("Create IOI subscription")
 
-        print("Sending subscription: " + ioiTopic)
-        
-        session.subscribe(subscriptions)
+        # The supervisor subscribes to //blp/ioisub-beta/ioi, and resubscribes
+        # with the same correlation id whenever the subscription is lost
+        log.info("Sending subscription: %s", d_ioi + "/ioi")
 
-    def processAdminEvent(self,event):  
-        print("Processing ADMIN event")
+        self.supervisor.serviceOpened(session)
 
-        for msg in event:
-            print(msg)
-            if msg.messageType() == SLOW_CONSUMER_WARNING:
-                print("Warning: Entered Slow Consumer status")
-                
-            elif msg.messageType() == SLOW_CONSUMER_WARNING_CLEARED:
-                sys.stderr.write("Slow consumer status cleared")
-                
-            else:
-                print("ADMIN MESSAGE: %s" % (msg))
+    def markGap(self, reason):
 
+        log.warning("Gap in the IOI stream: %s", reason)
+        if self.journal is not None:
+            self.journal.writeGap()
 
-    def processSessionStatusEvent(self,event,session):  
-        print("Processing SESSION_STATUS event")
+    def restored(self, seconds):
 
-        for msg in event:
-            
-            print(msg)
-            
-            if msg.messageType() == SESSION_STARTED:
-                print("Session started...")
-                session.openServiceAsync(d_ioi)
-                
-            elif msg.messageType() == SESSION_STARTUP_FAILURE:
-                sys.stderr.write("Error: Session startup failed")
-                
-            elif msg.messageType() == SESSION_CONNECTION_UP:
-                print("Session connection is up")
+        # IOIs may have changed or gone while the stream was down; the
+        # service's paint on resubscribing brings the book back in line. The
+        # handles held are taken by the thread that owns the book: here, or
+        # by the consumer thread once it reaches the RESTORED marker, after
+        # every tick queued before it.
+        log.warning("IOI stream restored after %.1fs", seconds)
+        if self.fanout is not None:
+            return
 
-            elif msg.messageType() == SESSION_CONNECTION_DOWN:
-                print("Session connection is down")
+        self.reconciliation = PaintReconciliation()
+        if self.conflation is None:
+            self.reconciliation.hold(self.book.iois)
+        else:
+            self.conflation.put(RESTORED, {"reconciliation": self.reconciliation})
 
-            else:
-                print(msg)
-                
+    def slowConsumerWarning(self, msg, session):
+        log.warning("Entered Slow Consumer status: decoding %d fields and coalescing updates",
+                    len(self.degradedExtractor.fields))
+        self.degraded = True
+        self.slowConsumerEpisodes.inc()
 
-    def processServiceStatusEvent(self,event,session):
-        print ("Processing SERVICE_STATUS event")
-        
-        for msg in event:
-            
-            print(msg)
+    def slowConsumerWarningCleared(self, msg, session):
+        self.flushPending()
+        self.degraded = False
+        log.warning("Slow consumer status cleared: %d updates coalesced, back to full decode",
+                    self.coalesced)
+        self.coalesced = 0
 
-            if msg.messageType() == SERVICE_OPENED:
-                
-                print("IOIAPI service opened... Sending request...")
-                self.createIOISubscription(session)
-                
-            elif msg.messageType() == SERVICE_OPEN_FAILURE:
-                    print("Error: Service Failed to open")
-                
-                
-    def processSubscriptionStatusEvent(self,event):
+    def sessionStarted(self, msg, session):
+        log.info("Session started...")
+        self.supervisor.sessionStarted(session)
+
+    def sessionStartupFailure(self, msg, session):
+        log.error("Session startup failed: %s", msg)
+
+    def sessionConnectionUp(self, msg, session):
+        log.info("Session connection is up")
+        self.supervisor.connectionUp(session)
+
+    def sessionConnectionDown(self, msg, session):
+        log.warning("Session connection is down")
+        self.supervisor.connectionDown()
+
+    def serviceOpened(self, msg, session):
+        log.info("IOIAPI service opened... Sending request...")
+        self.createIOISubscription(session)
+
+    def serviceOpenFailure(self, msg, session):
+        log.error("Service Failed to open: %s", msg)
+        self.supervisor.serviceOpenFailed(session)
+
+    def subscriptionStarted(self, msg, session):
+        log.info("IOIAPI subscription started...")
+        self.supervisor.subscriptionStarted(msg.correlationIds()[0])
+        if self.reconciliation is not None:
+            self.reconciliation.start(time.time())
+            log.info("Reconciling the IOIs held against the initial paint")
+
+    def subscriptionFailure(self, msg, session):
+        log.error("IOI subscription failed: %s", msg)
+        self.supervisor.subscriptionLost(session, msg.correlationIds()[0], "failure")
+
+    def subscriptionTerminated(self, msg, session):
+        log.warning("IOI subscription terminated: %s", msg)
+        self.supervisor.subscriptionLost(session, msg.correlationIds()[0], "terminated")
+
+    def otherMessage(self, msg, session):
+        log.info("%s MESSAGE: %s", msg.messageType(), msg)
+
+    def processStatusEvent(self, event, session):
+
+        # Admin, session, service and subscription status messages, and any
+        # event type without a handler of its own
+        handlers = self.messageHandlers.get(event.eventType(), {})
 
-        print ("Processing SUBSCRIPTION_STATUS event")
-        
         for msg in event:
-            
-            print("SUBSCRIPTION_STATUS MESSAGE: %s" % (msg))
 
-            if msg.messageType() == SUBSCRIPTION_STARTED:
-                print("IOIAPI subscription started...")
-                
-            elif msg.messageType() == SERVICE_OPEN_FAILURE:
-                print("Error: IOI subscription failed")
-                print(msg)
+            log.debug("%s", msg)
 
-            
-    def processSubscriptionDataEvent(self,event):
+            try:
+                handlers.get(msg.messageType(), self.otherMessage)(msg, session)
+            except Exception:
+                self.messageFailed(msg)
+
+    def messageFailed(self, msg):
+
+        # Each failure is counted per message type; the traceback is only
+        # logged for the first and then every d_tracebackEvery'th, so a stream
+        # of bad ticks cannot flood the log
+        messageType = str(msg.messageType())
+        count = self.errors.get(messageType, 0) + 1
+        self.errors[messageType] = count
+
+        if count % d_tracebackEvery == 1 or d_tracebackEvery == 1:
+            log.error("Failed to process %s message (%d so far)", messageType, count, exc_info=True)
+
+    def processSubscriptionDataEvent(self, event, session=None):
         
-        print ("Processing SUBSCRIPTION_DATA event")
+        log.debug("Processing SUBSCRIPTION_DATA event")
+
+        started = time.perf_counter()
+        self.receivedAt = time.time_ns()
         
+        if d_batchMode:
+            # Cleared whatever happens, so no row is handed over twice
+            try:
+                self.received += self.batch.decodeEvent(event, IOI_DATA, self.messageFailed)
+                self.processIOIBatch(self.batch)
+            finally:
+                self.batch.clear()
+
+        else:
+            if self.conflation is None:
+                self.expireIOIs()
+
+            if self.reconciliation is not None and self.reconciliation.expired(time.time()):
+                self.reconcileIOIs()
+
+            if self.degraded:
+                self.coalesceIOIs(event)
+            else:
+                self.decodeIOIs(event)
+
+        self.eventLatency.record(time.perf_counter() - started)
+
+    def decodeIOIs(self, event):
+
+        debug = log.isEnabledFor(logging.DEBUG)
+
         for msg in event:
             
-            print (msg)
-            
             if msg.messageType() == IOI_DATA:
 
-                print ("IOI MESSAGE: CorrelationID(%s)" % (msg.correlationIds()[0].value()))
-                
-                ioi_instrument_type = msg.getElementAsString("ioi_instrument_type") if msg.hasElement("ioi_instrument_type")  else  ""
-                ioi_instrument_option_legs_count = msg.getElementAsInteger("ioi_instrument_option_legs_count") if msg.hasElement("ioi_instrument_option_legs_count") else 0
-                
-                ioi_instrument_option_legs_0_strike = msg.getElementAsFloat("ioi_instrument_option_legs_0_strike") if msg.hasElement("ioi_instrument_option_legs_0_strike") else 0
-                ioi_instrument_option_legs_0_expiry = msg.getElementAsString("ioi_instrument_option_legs_0_expiry") if msg.hasElement("ioi_instrument_option_legs_0_expiry") else ""
-                ioi_instrument_option_legs_0_type = msg.getElementAsString("ioi_instrument_option_legs_0_type") if msg.hasElement("ioi_instrument_option_legs_0_type") else ""
-                ioi_instrument_option_legs_0_ratio = msg.getElementAsFloat("ioi_instrument_option_legs_0_ratio") if msg.hasElement("ioi_instrument_option_legs_0_ratio") else 0
-                ioi_instrument_option_legs_0_underlying_type = msg.getElementAsString("ioi_instrument_option_legs_0_underlying_type") if msg.hasElement("ioi_instrument_option_legs_0_underlying_type") else ""
-                ioi_instrument_option_legs_0_underlying_ticker = msg.getElementAsString("ioi_instrument_option_legs_0_underlying_ticker") if msg.hasElement("ioi_instrument_option_legs_0_underlying_ticker") else ""
-                ioi_instrument_option_legs_0_underlying_figi = msg.getElementAsString("ioi_instrument_option_legs_0_underlying_figi") if msg.hasElement("ioi_instrument_option_legs_0_underlying_figi") else ""
-                ioi_instrument_option_legs_0_exchange = msg.getElementAsString("ioi_instrument_option_legs_0_exchange") if msg.hasElement("ioi_instrument_option_legs_0_exchange") else  ""
-                ioi_instrument_option_legs_0_style = msg.getElementAsString("ioi_instrument_option_legs_0_style") if msg.hasElement("ioi_instrument_option_legs_0_style") else ""
-                ioi_instrument_option_legs_0_futureRefDate = msg.getElementAsString("ioi_instrument_option_legs_0_futureRefDate") if msg.hasElement("ioi_instrument_option_legs_0_futureRefDate") else ""
-                ioi_instrument_option_legs_0_delta = msg.getElementAsFloat("ioi_instrument_option_legs_0_delta") if msg.hasElement("ioi_instrument_option_legs_0_delta") else 0
-    
-                ioi_instrument_option_legs_1_strike = msg.getElementAsFloat("ioi_instrument_option_legs_1_strike") if msg.hasElement("ioi_instrument_option_legs_1_strike") else 0
-                ioi_instrument_option_legs_1_expiry = msg.getElementAsString("ioi_instrument_option_legs_1_expiry") if msg.hasElement("ioi_instrument_option_legs_1_expiry") else ""
-                ioi_instrument_option_legs_1_type = msg.getElementAsString("ioi_instrument_option_legs_1_type") if msg.hasElement("ioi_instrument_option_legs_1_type") else ""
-                ioi_instrument_option_legs_1_ratio = msg.getElementAsFloat("ioi_instrument_option_legs_1_ratio") if msg.hasElement("ioi_instrument_option_legs_1_ratio") else 0
-                ioi_instrument_option_legs_1_underlying_type = msg.getElementAsString("ioi_instrument_option_legs_1_underlying_type") if msg.hasElement("ioi_instrument_option_legs_1_underlying_type") else ""
-                ioi_instrument_option_legs_1_underlying_ticker = msg.getElementAsString("ioi_instrument_option_legs_1_underlying_ticker") if msg.hasElement("ioi_instrument_option_legs_1_underlying_ticker") else ""
-                ioi_instrument_option_legs_1_underlying_figi = msg.getElementAsString("ioi_instrument_option_legs_1_underlying_figi") if msg.hasElement("ioi_instrument_option_legs_1_underlying_figi") else ""
-                ioi_instrument_option_legs_1_exchange = msg.getElementAsString("ioi_instrument_option_legs_1_exchange") if msg.hasElement("ioi_instrument_option_legs_1_exchange") else ""
-                ioi_instrument_option_legs_1_style = msg.getElementAsString("ioi_instrument_option_legs_1_style") if msg.hasElement("ioi_instrument_option_legs_1_style") else ""
-                ioi_instrument_option_legs_1_futureRefDate = msg.getElementAsString("ioi_instrument_option_legs_1_futureRefDate") if msg.hasElement("ioi_instrument_option_legs_1_futureRefDate") else ""
-                ioi_instrument_option_legs_1_delta = msg.getElementAsFloat("ioi_instrument_option_legs_1_delta") if msg.hasElement("ioi_instrument_option_legs_1_delta") else 0
-    
-                ioi_instrument_option_legs_2_strike = msg.getElementAsFloat("ioi_instrument_option_legs_2_strike") if msg.hasElement("ioi_instrument_option_legs_2_strike") else 0
-                ioi_instrument_option_legs_2_expiry = msg.getElementAsString("ioi_instrument_option_legs_2_expiry") if msg.hasElement("ioi_instrument_option_legs_2_expiry") else ""
-                ioi_instrument_option_legs_2_type = msg.getElementAsString("ioi_instrument_option_legs_2_type") if msg.hasElement("ioi_instrument_option_legs_2_type") else ""
-                ioi_instrument_option_legs_2_ratio = msg.getElementAsFloat("ioi_instrument_option_legs_2_ratio") if msg.hasElement("ioi_instrument_option_legs_2_ratio") else 0
-                ioi_instrument_option_legs_2_underlying_type = msg.getElementAsString("ioi_instrument_option_legs_2_underlying_type") if msg.hasElement("ioi_instrument_option_legs_2_underlying_type") else ""
-                ioi_instrument_option_legs_2_underlying_ticker = msg.getElementAsString("ioi_instrument_option_legs_2_underlying_ticker") if msg.hasElement("ioi_instrument_option_legs_2_underlying_ticker") else ""
-                ioi_instrument_option_legs_2_underlying_figi = msg.getElementAsString("ioi_instrument_option_legs_2_underlying_figi") if msg.hasElement("ioi_instrument_option_legs_2_underlying_figi") else ""
-                ioi_instrument_option_legs_2_exchange = msg.getElementAsString("ioi_instrument_option_legs_2_exchange") if msg.hasElement("ioi_instrument_option_legs_2_exchange") else ""
-                ioi_instrument_option_legs_2_style = msg.getElementAsString("ioi_instrument_option_legs_2_style") if msg.hasElement("ioi_instrument_option_legs_2_style") else ""
-                ioi_instrument_option_legs_2_futureRefDate = msg.getElementAsString("ioi_instrument_option_legs_2_futureRefDate") if msg.hasElement("ioi_instrument_option_legs_2_futureRefDate") else ""
-                ioi_instrument_option_legs_2_delta = msg.getElementAsFloat("ioi_instrument_option_legs_2_delta") if msg.hasElement("ioi_instrument_option_legs_2_delta") else 0
-    
-                ioi_instrument_option_legs_3_strike = msg.getElementAsFloat("ioi_instrument_option_legs_3_strike") if msg.hasElement("ioi_instrument_option_legs_3_strike") else 0
-                ioi_instrument_option_legs_3_expiry = msg.getElementAsString("ioi_instrument_option_legs_3_expiry") if msg.hasElement("ioi_instrument_option_legs_3_expiry") else ""
-                ioi_instrument_option_legs_3_type = msg.getElementAsString("ioi_instrument_option_legs_3_type") if msg.hasElement("ioi_instrument_option_legs_3_type") else ""
-                ioi_instrument_option_legs_3_ratio = msg.getElementAsFloat("ioi_instrument_option_legs_3_ratio") if msg.hasElement("ioi_instrument_option_legs_3_ratio") else 0
-                ioi_instrument_option_legs_3_underlying_type = msg.getElementAsString("ioi_instrument_option_legs_3_underlying_type") if msg.hasElement("ioi_instrument_option_legs_3_underlying_type") else ""
-                ioi_instrument_option_legs_3_underlying_ticker = msg.getElementAsString("ioi_instrument_option_legs_3_underlying_ticker") if msg.hasElement("ioi_instrument_option_legs_3_underlying_ticker") else ""
-                ioi_instrument_option_legs_3_underlying_figi = msg.getElementAsString("ioi_instrument_option_legs_3_underlying_figi") if msg.hasElement("ioi_instrument_option_legs_3_underlying_figi") else ""
-                ioi_instrument_option_legs_3_exchange = msg.getElementAsString("ioi_instrument_option_legs_3_exchange") if msg.hasElement("ioi_instrument_option_legs_3_exchange") else ""
-                ioi_instrument_option_legs_3_style = msg.getElementAsString("ioi_instrument_option_legs_3_style") if msg.hasElement("ioi_instrument_option_legs_3_style") else ""
-                ioi_instrument_option_legs_3_futureRefDate = msg.getElementAsString("ioi_instrument_option_legs_3_futureRefDate") if msg.hasElement("ioi_instrument_option_legs_3_futureRefDate") else ""
-                ioi_instrument_option_legs_3_delta = msg.getElementAsFloat("ioi_instrument_option_legs_3_delta") if msg.hasElement("ioi_instrument_option_legs_3_delta") else 0
-    
-                ioi_instrument_option_structure = msg.getElementAsString("ioi_instrument_option_structure") if msg.hasElement("ioi_instrument_option_structure") else ""
-                ioi_instrument_stock_security_ticker = msg.getElementAsString("ioi_instrument_stock_security_ticker") if msg.hasElement("ioi_instrument_stock_security_ticker") else ""
-                ioi_instrument_stock_security_figi = msg.getElementAsString("ioi_instrument_stock_security_figi") if msg.hasElement("ioi_instrument_stock_security_figi") else ""
-                ioi_goodUntil = msg.getElementAsString("ioi_goodUntil") if msg.hasElement("ioi_goodUntil") else ""
-    
-                ioi_bid_price_type = msg.getElementAsString("ioi_bid_price_type") if msg.hasElement("ioi_bid_price_type") else ""
-                ioi_bid_price_fixed_price = msg.getElementAsFloat("ioi_bid_price_fixed_price") if msg.hasElement("ioi_bid_price_fixed_price") else 0
-                ioi_bid_price_fixed_currency = msg.getElementAsString("ioi_bid_price_fixed_currency") if msg.hasElement("ioi_bid_price_fixed_currency") else ""
-                ioi_bid_price_pegged_offsetAmount = msg.getElementAsFloat("ioi_bid_price_pegged_offsetAmount") if msg.hasElement("ioi_bid_price_pegged_offsetAmount") else 0
-                ioi_bid_price_pegged_offsetFrom = msg.getElementAsString("ioi_bid_price_pegged_offsetFrom") if msg.hasElement("ioi_bid_price_pegged_offsetFrom") else ""
-                ioi_bid_price_pegged_limitPrice = msg.getElementAsFloat("ioi_bid_price_pegged_limitPrice") if msg.hasElement("ioi_bid_price_pegged_limitPrice") else 0
-                ioi_bid_price_reference = msg.getElementAsString("ioi_bid_price_reference") if msg.hasElement("ioi_bid_price_reference") else ""
-                ioi_bid_price_moneyness = msg.getElementAsFloat("ioi_bid_price_moneyness") if msg.hasElement("ioi_bid_price_moneyness") else 0
-                ioi_bid_size_type = msg.getElementAsString("ioi_bid_size_type") if msg.hasElement("ioi_bid_size_type") else ""
-                ioi_bid_size_quantity = msg.getElementAsInteger("ioi_bid_size_quantity") if msg.hasElement("ioi_bid_size_quantity") else 0
-                ioi_bid_size_quality = msg.getElementAsString("ioi_bid_size_quality") if msg.hasElement("ioi_bid_size_quality") else ""
-                ioi_bid_referencePrice_price = msg.getElementAsFloat("ioi_bid_referencePrice_price") if msg.hasElement("ioi_bid_referencePrice_price") else 0
-                ioi_bid_referencePrice_currency = msg.getElementAsString("ioi_bid_referencePrice_currency") if msg.hasElement("ioi_bid_referencePrice_currency") else ""
-                ioi_bid_volatility = msg.getElementAsFloat("ioi_bid_volatility") if msg.hasElement("ioi_bid_volatility") else 0
-                ioi_bid_notes = msg.getElementAsString("ioi_bid_notes") if msg.hasElement("ioi_bid_notes") else ""
-                ioi_bid_qualifiers_count = msg.getElementAsInteger("ioi_bid_qualifiers_count") if msg.hasElement("ioi_bid_qualifiers_count") else 0
-                ioi_bid_qualifiers_0 = msg.getElementAsString("ioi_bid_qualifiers_0") if msg.hasElement("ioi_bid_qualifiers_0") else ""
-                ioi_bid_qualifiers_1 = msg.getElementAsString("ioi_bid_qualifiers_1") if msg.hasElement("ioi_bid_qualifiers_1") else ""
-                ioi_bid_qualifiers_2 = msg.getElementAsString("ioi_bid_qualifiers_2") if msg.hasElement("ioi_bid_qualifiers_2") else ""
-                ioi_bid_qualifiers_3 = msg.getElementAsString("ioi_bid_qualifiers_3") if msg.hasElement("ioi_bid_qualifiers_3") else ""
-                ioi_bid_qualifiers_4 = msg.getElementAsString("ioi_bid_qualifiers_4") if msg.hasElement("ioi_bid_qualifiers_4") else ""
-    
-                ioi_offer_price_type = msg.getElementAsString("ioi_offer_price_type") if msg.hasElement("ioi_offer_price_type") else ""
-                ioi_offer_price_fixed_price = msg.getElementAsFloat("ioi_offer_price_fixed_price") if msg.hasElement("ioi_offer_price_fixed_price") else 0
-                ioi_offer_price_fixed_currency = msg.getElementAsString("ioi_offer_price_fixed_currency") if msg.hasElement("ioi_offer_price_fixed_currency") else ""
-                ioi_offer_price_pegged_offsetAmount = msg.getElementAsFloat("ioi_offer_price_pegged_offsetAmount") if msg.hasElement("ioi_offer_price_pegged_offsetAmount") else 0
-                ioi_offer_price_pegged_offsetFrom = msg.getElementAsString("ioi_offer_price_pegged_offsetFrom") if msg.hasElement("ioi_offer_price_pegged_offsetFrom") else ""
-                ioi_offer_price_pegged_limitPrice = msg.getElementAsFloat("ioi_offer_price_pegged_limitPrice") if msg.hasElement("ioi_offer_price_pegged_limitPrice") else 0
-                ioi_offer_price_reference = msg.getElementAsString("ioi_offer_price_reference") if msg.hasElement("ioi_offer_price_reference") else ""
-                ioi_offer_price_moneyness = msg.getElementAsFloat("ioi_offer_price_moneyness") if msg.hasElement("ioi_offer_price_moneyness") else 0
-                ioi_offer_size_type = msg.getElementAsString("ioi_offer_size_type") if msg.hasElement("ioi_offer_size_type") else ""
-                ioi_offer_size_quantity = msg.getElementAsInteger("ioi_offer_size_quantity") if msg.hasElement("ioi_offer_size_quantity") else 0
-                ioi_offer_size_quality = msg.getElementAsString("ioi_offer_size_quality") if msg.hasElement("ioi_offer_size_quality") else ""
-                ioi_offer_referencePrice_price = msg.getElementAsFloat("ioi_offer_referencePrice_price") if msg.hasElement("ioi_offer_referencePrice_price") else 0
-                ioi_offer_referencePrice_currency = msg.getElementAsString("ioi_offer_referencePrice_currency") if msg.hasElement("ioi_offer_referencePrice_currency") else ""
-                ioi_offer_volatility = msg.getElementAsFloat("ioi_offer_volatility") if msg.hasElement("ioi_offer_volatility") else 0
-                ioi_offer_notes = msg.getElementAsString("ioi_offer_notes") if msg.hasElement("ioi_offer_notes") else ""
-                ioi_offer_qualifiers_count = msg.getElementAsInteger("ioi_offer_qualifiers_count") if msg.hasElement("ioi_offer_qualifiers_count") else 0
-                ioi_offer_qualifiers_0 = msg.getElementAsString("ioi_offer_qualifiers_0") if msg.hasElement("ioi_offer_qualifiers_0") else ""
-                ioi_offer_qualifiers_1 = msg.getElementAsString("ioi_offer_qualifiers_1") if msg.hasElement("ioi_offer_qualifiers_1") else ""
-                ioi_offer_qualifiers_2 = msg.getElementAsString("ioi_offer_qualifiers_2") if msg.hasElement("ioi_offer_qualifiers_2") else ""
-                ioi_offer_qualifiers_3 = msg.getElementAsString("ioi_offer_qualifiers_3") if msg.hasElement("ioi_offer_qualifiers_3") else ""
-                ioi_offer_qualifiers_4 = msg.getElementAsString("ioi_offer_qualifiers_4") if msg.hasElement("ioi_offer_qualifiers_4") else ""
-    
-                ioi_routing_strategy_name = msg.getElementAsString("ioi_routing_strategy_name") if msg.hasElement("ioi_routing_strategy_name") else ""
-                ioi_routing_strategy_brief = msg.getElementAsString("ioi_routing_strategy_brief") if msg.hasElement("ioi_routing_strategy_brief") else ""
-                ioi_routing_strategy_detailed = msg.getElementAsString("ioi_routing_strategy_detailed") if msg.hasElement("ioi_routing_strategy_detailed") else ""
-                ioi_routing_customId = msg.getElementAsString("ioi_routing_customId") if msg.hasElement("ioi_routing_customId") else ""
-                ioi_routing_broker = msg.getElementAsString("ioi_routing_broker") if msg.hasElement("ioi_routing_broker") else ""
-    
-                ioi_sentTime = msg.getElementAsString("ioi_sentTime") if msg.hasElement("ioi_sentTime") else ""
-    
-                change = msg.getElementAsString("change") if msg.hasElement("change") else ""
-                
-                print("ioi_instrument_type: %s" % ioi_instrument_type)
-                print("ioi_instrument_option_legs_count: %d" % ioi_instrument_option_legs_count)
-                
-                print("ioi_instrument_option_legs_0_strike: %d" % ioi_instrument_option_legs_0_strike)
-                print("ioi_instrument_option_legs_0_expiry: %s" % ioi_instrument_option_legs_0_expiry)
-                print("ioi_instrument_option_legs_0_type: %s" % ioi_instrument_option_legs_0_type)
-                print("ioi_instrument_option_legs_0_ratio: %d" % ioi_instrument_option_legs_0_ratio)
-                print("ioi_instrument_option_legs_0_underlying_type: %s" % ioi_instrument_option_legs_0_underlying_type)
-                print("ioi_instrument_option_legs_0_underlying_ticker: %s" % ioi_instrument_option_legs_0_underlying_ticker)
-                print("ioi_instrument_option_legs_0_underlying_figi: %s" % ioi_instrument_option_legs_0_underlying_figi)
-                print("ioi_instrument_option_legs_0_exchange: %s" % ioi_instrument_option_legs_0_exchange)
-                print("ioi_instrument_option_legs_0_style: %s" % ioi_instrument_option_legs_0_style)
-                print("ioi_instrument_option_legs_0_futureRefDate: %s" % ioi_instrument_option_legs_0_futureRefDate)
-                print("ioi_instrument_option_legs_0_delta: %d" % ioi_instrument_option_legs_0_delta)
-
-                print("ioi_instrument_option_legs_1_strike: %d" % ioi_instrument_option_legs_1_strike)
-                print("ioi_instrument_option_legs_1_expiry: %s" % ioi_instrument_option_legs_1_expiry)
-                print("ioi_instrument_option_legs_1_type: %s" % ioi_instrument_option_legs_1_type)
-                print("ioi_instrument_option_legs_1_ratio: %d" % ioi_instrument_option_legs_1_ratio)
-                print("ioi_instrument_option_legs_1_underlying_type: %s" % ioi_instrument_option_legs_1_underlying_type)
-                print("ioi_instrument_option_legs_1_underlying_ticker: %s" % ioi_instrument_option_legs_1_underlying_ticker)
-                print("ioi_instrument_option_legs_1_underlying_figi: %s" % ioi_instrument_option_legs_1_underlying_figi)
-                print("ioi_instrument_option_legs_1_exchange: %s" % ioi_instrument_option_legs_1_exchange)
-                print("ioi_instrument_option_legs_1_style: %s" % ioi_instrument_option_legs_1_style)
-                print("ioi_instrument_option_legs_1_futureRefDate: %s" % ioi_instrument_option_legs_1_futureRefDate)
-                print("ioi_instrument_option_legs_1_delta: %d" % ioi_instrument_option_legs_1_delta)
-                
-                print("ioi_instrument_option_legs_2_strike: %d" % ioi_instrument_option_legs_2_strike)
-                print("ioi_instrument_option_legs_2_expiry: %s" % ioi_instrument_option_legs_2_expiry)
-                print("ioi_instrument_option_legs_2_type: %s" % ioi_instrument_option_legs_2_type)
-                print("ioi_instrument_option_legs_2_ratio: %d" % ioi_instrument_option_legs_2_ratio)
-                print("ioi_instrument_option_legs_2_underlying_type: %s" % ioi_instrument_option_legs_2_underlying_type)
-                print("ioi_instrument_option_legs_2_underlying_ticker: %s" % ioi_instrument_option_legs_2_underlying_ticker)
-                print("ioi_instrument_option_legs_2_underlying_figi: %s" % ioi_instrument_option_legs_2_underlying_figi)
-                print("ioi_instrument_option_legs_2_exchange: %s" % ioi_instrument_option_legs_2_exchange)
-                print("ioi_instrument_option_legs_2_style: %s" % ioi_instrument_option_legs_2_style)
-                print("ioi_instrument_option_legs_2_futureRefDate: %s" % ioi_instrument_option_legs_2_futureRefDate)
-                print("ioi_instrument_option_legs_2_delta: %d" % ioi_instrument_option_legs_2_delta)
-                
-                print("ioi_instrument_option_legs_3_strike: %d" % ioi_instrument_option_legs_3_strike)
-                print("ioi_instrument_option_legs_3_expiry: %s" % ioi_instrument_option_legs_3_expiry)
-                print("ioi_instrument_option_legs_3_type: %s" % ioi_instrument_option_legs_3_type)
-                print("ioi_instrument_option_legs_3_ratio: %d" % ioi_instrument_option_legs_3_ratio)
-                print("ioi_instrument_option_legs_3_underlying_type: %s" % ioi_instrument_option_legs_3_underlying_type)
-                print("ioi_instrument_option_legs_3_underlying_ticker: %s" % ioi_instrument_option_legs_3_underlying_ticker)
-                print("ioi_instrument_option_legs_3_underlying_figi: %s" % ioi_instrument_option_legs_3_underlying_figi)
-                print("ioi_instrument_option_legs_3_exchange: %s" % ioi_instrument_option_legs_3_exchange)
-                print("ioi_instrument_option_legs_3_style: %s" % ioi_instrument_option_legs_3_style)
-                print("ioi_instrument_option_legs_3_futureRefDate: %s" % ioi_instrument_option_legs_3_futureRefDate)
-                print("ioi_instrument_option_legs_3_delta: %d" % ioi_instrument_option_legs_3_delta)
-                
-                print("ioi_instrument_option_structure: %s" % ioi_instrument_option_structure)
-                print("ioi_instrument_stock_security_ticker: %s" % ioi_instrument_stock_security_ticker)
-                print("ioi_instrument_stock_security_figi: %s" % ioi_instrument_stock_security_figi)
-                print("ioi_goodUntil: %s" % ioi_goodUntil)
-                print("ioi_bid_price_type: %s" % ioi_bid_price_type)
-                print("ioi_bid_price_fixed_price: %d" % ioi_bid_price_fixed_price)
-                print("ioi_bid_price_fixed_currency: %s" % ioi_bid_price_fixed_currency)
-                print("ioi_bid_price_pegged_offsetAmount: %d" % ioi_bid_price_pegged_offsetAmount)
-                print("ioi_bid_price_pegged_offsetFrom: %s" % ioi_bid_price_pegged_offsetFrom)
-                print("ioi_bid_price_pegged_limitPrice: %d" % ioi_bid_price_pegged_limitPrice)
-                print("ioi_bid_price_reference: %s" % ioi_bid_price_reference)
-                print("ioi_bid_price_moneyness: %d" % ioi_bid_price_moneyness)
-                print("ioi_bid_size_type: %s" % ioi_bid_size_type)
-                print("ioi_bid_size_quantity: %d" % ioi_bid_size_quantity)
-                print("ioi_bid_size_quality: %s" % ioi_bid_size_quality)
-                print("ioi_bid_referencePrice_price: %d" % ioi_bid_referencePrice_price)
-                print("ioi_bid_referencePrice_currency: %s" % ioi_bid_referencePrice_currency)
-                print("ioi_bid_volatility: %d" % ioi_bid_volatility)
-                print("ioi_bid_notes: %s" % ioi_bid_notes)
-                print("ioi_bid_qualifiers_count: %d" % ioi_bid_qualifiers_count)
-                print("ioi_bid_qualifiers_0: %s" % ioi_bid_qualifiers_0)
-                print("ioi_bid_qualifiers_1: %s" % ioi_bid_qualifiers_1)
-                print("ioi_bid_qualifiers_2: %s" % ioi_bid_qualifiers_2)
-                print("ioi_bid_qualifiers_3: %s" % ioi_bid_qualifiers_3)
-                print("ioi_bid_qualifiers_4: %s" % ioi_bid_qualifiers_4)
-                print("ioi_offer_price_type: %s" % ioi_offer_price_type)
-                print("ioi_offer_price_fixed_price: %d" % ioi_offer_price_fixed_price)
-                print("ioi_offer_price_fixed_currency: %s" % ioi_offer_price_fixed_currency)
-                print("ioi_offer_price_pegged_offsetAmount: %d" % ioi_offer_price_pegged_offsetAmount)
-                print("ioi_offer_price_pegged_offsetFrom: %s" % ioi_offer_price_pegged_offsetFrom)
-                print("ioi_offer_price_pegged_limitPrice: %d" % ioi_offer_price_pegged_limitPrice)
-                print("ioi_offer_price_reference: %s" % ioi_offer_price_reference)
-                print("ioi_offer_price_moneyness: %d" % ioi_offer_price_moneyness)
-                print("ioi_offer_size_type: %s" % ioi_offer_size_type)
-                print("ioi_offer_size_quantity: %d" % ioi_offer_size_quantity)
-                print("ioi_offer_size_quality: %s" % ioi_offer_size_quality)
-                print("ioi_offer_referencePrice_price: %d" % ioi_offer_referencePrice_price)
-                print("ioi_offer_referencePrice_currency: %s" % ioi_offer_referencePrice_currency)
-                print("ioi_offer_volatility: %d" % ioi_offer_volatility)
-                print("ioi_offer_notes: %s" % ioi_offer_notes)
-                print("ioi_offer_qualifiers_count: %d" % ioi_offer_qualifiers_count)
-                print("ioi_offer_qualifiers_0: %s" % ioi_offer_qualifiers_0)
-                print("ioi_offer_qualifiers_1: %s" % ioi_offer_qualifiers_1)
-                print("ioi_offer_qualifiers_2: %s" % ioi_offer_qualifiers_2)
-                print("ioi_offer_qualifiers_3: %s" % ioi_offer_qualifiers_3)
-                print("ioi_offer_qualifiers_4: %s" % ioi_offer_qualifiers_4)
-                print("ioi_routing_strategy_name: %s" % ioi_routing_strategy_name)
-                print("ioi_routing_strategy_brief: %s" % ioi_routing_strategy_brief)
-                print("ioi_routing_strategy_detailed: %s" % ioi_routing_strategy_detailed)
-                print("ioi_routing_customId: %s" % ioi_routing_customId)
-                print("ioi_routing_broker: %s" % ioi_routing_broker)
-                print("ioi_sentTime: %s" % ioi_sentTime)
-                print("change: %s" % change)
+                try:
+                    ioi = self.decodeIOI(msg, self.extractor)
+                    if ioi is None:
+                        continue
+
+                    # Full per-field dumps are only built when DEBUG is on
+                    if debug:
+                        log.debug("IOI MESSAGE: CorrelationID(%s)", msg.correlationIds()[0].value(), extra={"fields": ioi})
+
+                    self.deliverIOI(ioi, self.measureIOI(msg, ioi))
+
+                except Exception:
+                    self.messageFailed(msg)
 
             else:
-                print("Error: Unexpected Message")
+                log.warning("Unexpected Message: %s", msg)
+
+        if self.conflation is None and self.fanout is None:
+            self.snapshotIOIs(self.journal.position if self.journal is not None else 0)
 
                 
-    def processMiscEvents(self, event):
-        print("Processing Unknown event")
-        
+    def decodeIOI(self, msg, extractor):
+
+        # Returns the decoded fields, or None if the filter drops the tick
+        self.received += 1
+
+        if self.accept is None:
+            ioi = extractor.extract(msg)
+        else:
+            view = extractor.view(msg)
+            if not ioi_book.isRemoval(view) and not self.accept(view):
+                self.rejected += 1
+                return None
+            ioi = view.extract()
+
+        if self.reconciliation is not None:
+            recap = msg.recapType() == blpapi.Message.RECAPTYPE_SOLICITED
+            if self.reconciliation.tick(ioi_book.handleOf(ioi), recap):
+                self.reconcileIOIs()
+
+        return ioi
+
+    def measureIOI(self, msg, ioi):
+
+        # Returns ioi_sentTime in epoch nanoseconds, or None. Recaps carry the
+        # IOI's original sent time, so only live ticks are measured.
+        sentTime = TIMESTAMPS.nanos(ioi.get(SENT_TIME_FIELD))
+        if sentTime is not None and msg.recapType() != blpapi.Message.RECAPTYPE_SOLICITED:
+            self.latency.record(sentTime, self.receivedAt)
+        return sentTime
+
+    def reconcileIOIs(self):
+
+        # Removes the recovered IOIs the initial paint did not include, by
+        # delivering a removal for each like any other tick
+        reconciliation = self.reconciliation
+        self.reconciliation = None
+
+        if not reconciliation.wait():
+            log.warning("Held IOIs not handed over by the consumer: reconciliation skipped")
+            return
+
+        if not reconciliation.painted:
+            log.warning("No initial paint received: keeping %d recovered IOIs unconfirmed",
+                        len(reconciliation.unconfirmed))
+            return
+
+        # Journalled at the time of the reconciliation, as they have no sentTime
+        now = time.time_ns()
+        unconfirmed = reconciliation.unconfirmed
+        for handle in unconfirmed:
+            self.deliverIOI({ioi_book.HANDLE_FIELDS[0]: handle, "state": "deleted"}, now)
+
+        log.info("Initial paint of %d IOIs: %d held IOIs no longer live",
+                 reconciliation.painted, len(unconfirmed))
+
+    def coalesceIOIs(self, event):
+
+        # Slow consumer mode: minimal decode, keeping only the merged latest
+        # state of each IOI until the next flush
         for msg in event:
 
-            print("MISC MESSAGE: %s" % (msg))
+            if msg.messageType() == IOI_DATA:
 
+                try:
+                    ioi = self.decodeIOI(msg, self.degradedExtractor)
+                except Exception:
+                    self.messageFailed(msg)
+                    continue
 
-    def processEvent(self, event, session):
-        
-        try:
-            
-            if event.eventType() == blpapi.Event.ADMIN:
-                self.processAdminEvent(event)
-            
-            if event.eventType() == blpapi.Event.SESSION_STATUS:
-                self.processSessionStatusEvent(event,session)
+                if ioi is None:
+                    continue
 
-            elif event.eventType() == blpapi.Event.SERVICE_STATUS:
-                self.processServiceStatusEvent(event,session)
+                self.measureIOI(msg, ioi)
+                handle = ioi_book.handleOf(ioi)
 
-            elif event.eventType() == blpapi.Event.SUBSCRIPTION_STATUS:
-                self.processSubscriptionStatusEvent(event)
-            
-            elif event.eventType() == blpapi.Event.SUBSCRIPTION_DATA:
-                self.processSubscriptionDataEvent(event)
+                pending = self.pending.get(handle)
+                if pending is None:
+                    self.pending[handle] = ioi
+                else:
+                    pending.update(ioi)
+                    self.coalesced += 1
+
+        now = time.time()
+        if now - self.lastFlush >= d_coalesceInterval:
+            self.flushPending(now)
+
+    def flushPending(self, now=None):
 
+        self.lastFlush = time.time() if now is None else now
+
+        for ioi in self.pending.values():
+            self.deliverIOI(ioi)
+
+        self.pending.clear()
+
+    def deliverIOI(self, ioi, sentTime=None):
+
+        if self.fanout is not None:
+            self.fanout.put(ioi)
+
+        else:
+            # With conflation on, the book belongs to the consumer thread
+            handle = ioi_book.handleOf(ioi)
+
+            if self.conflation is None or handle is None:
+                self.processIOI(ioi)
             else:
-                self.processMiscEvents(event)
+                self.conflation.put(handle, ioi)
+
+        # Journalled once queued, so a snapshot current to a journal offset
+        # has every tick before it (see ioi_snapshot.py)
+        if self.journal is not None:
+            self.journal.write(ioi, sentTime)
+
+    def consumeIOIs(self):
+
+        # Consumer thread: applies the latest state of each queued IOI, and
+        # evicts expired IOIs at least once a second
+        while True:
+            position = self.journal.position if self.journal is not None else 0
+            items = self.conflation.drain(1.0)
+            self.expireIOIs()
+
+            if not items and self.conflation.closed:
+                return
+
+            for handle, ioi in items:
+                if handle is RESTORED:
+                    ioi["reconciliation"].hold(self.book.iois)
+                else:
+                    self.processIOI(ioi)
+
+            self.snapshotIOIs(position)
+
+    def snapshotIOIs(self, position):
+
+        # On the thread that owns the book; position is a journal offset
+        # every tick before which has been applied
+        if self.snapshots is None or not self.snapshots.due(time.time()):
+            return
+
+        if self.journal is not None:
+            self.journal.flush()
+
+        count = self.snapshots.write(self.book, position)
+        log.debug("Snapshot of %d IOIs written to %s", count, self.snapshots.path)
+
+    def stop(self):
+
+        self.supervisor.stop()
+
+        if self.latency.count:
+            percentiles = self.latency.percentiles()
+            log.info("Tick latency p50 %.1fms, p90 %.1fms, p99 %.1fms over the last %d ticks",
+                     percentiles[0.5] * 1000, percentiles[0.9] * 1000, percentiles[0.99] * 1000,
+                     min(self.latency.count, self.latency.size))
+
+        for messageType, count in self.errors.items():
+            log.warning("%d %s messages failed to process", count, messageType)
+
+        if self.accept is not None:
+            log.info("%d IOIs rejected by the filter", self.rejected)
+            for rule, count in getattr(self.accept, "rejected", {}).items():
+                log.info("  %s: %d", rule, count)
+
+        if self.fanout is not None:
+            self.fanout.stop()
+            log.info("%d IOIs sent to %d workers, %d dropped",
+                     sum(self.fanout.sent), len(self.fanout.sent), self.fanout.dropped)
+
+        if self.conflation is not None:
+            self.conflation.close()
+            self.consumer.join()
+            log.info("%d IOI updates conflated", self.conflation.conflated)
+
+        if self.snapshots is not None:
+            self.snapshots.write(self.book, self.journal.position if self.journal is not None else 0)
+
+        if self.journal is not None:
+            self.journal.close()
+            log.info("%d ticks journalled to %s", self.journal.count, self.journal.path)
+
+    def processIOI(self, ioi):
+
+        action, handle = self.book.apply(ioi)
+
+        if action is None and handle is None:
+            log.warning("IOI without handle ignored")
+        elif action is not None:
+            log.debug("IOI %s: %s (%d live)", action, handle, len(self.book))
+
                 
-        except Exception as e:
-            print("Exception:  %s" % str(e))
-            
+    def expireIOIs(self):
+
+        # Runs on whichever thread owns the book: the dispatcher thread, ahead
+        # of each data event, or the conflation consumer thread
+        for handle in self.book.expire(time.time()):
+            log.debug("IOI expired: %s (%d live)", handle, len(self.book))
+
+                
+    def processIOIBatch(self, batch):
+
+        # Columns are only valid until the batch is cleared on return
+        log.debug("IOI BATCH: %d messages", batch.length)
+
+                
+    def processEvent(self, event, session):
+
+        # Errors are caught per message by the handlers; this only catches
+        # what fails around them
+        try:
+            self.eventHandlers.get(event.eventType(), self.processStatusEvent)(event, session)
+        except Exception:
+            log.exception("Failed to process event")
+
         return False
 
                 
 def main():
     
+    asyncLogging = AsyncLogging(d_logLevel).start()
+
     sessionOptions = blpapi.SessionOptions()
     sessionOptions.setServerHost(d_host)
     sessionOptions.setServerPort(d_port)
 
-    print("Connecting to %s:%d" % (d_host,d_port))
+    # The SDK reconnects by itself; the supervisor restores the subscription
+    sessionOptions.setAutoRestartOnDisconnection(True)
+
+    log.info("Connecting to %s:%d", d_host, d_port)
 
     eventHandler = SessionEventHandler()
 
-    session = blpapi.Session(sessionOptions, eventHandler.processEvent)
+    METRICS.sampled("ioi_log_dropped_total", "Log records dropped because the log queue was full",
+                    lambda: asyncLogging.handler.dropped, "counter")
+    metrics = MetricsServer(port=d_metricsPort).start() if d_metricsPort else None
 
-    if not session.startAsync():
-        print("Failed to start session.")
-        return
-    
-    global bEnd
-    while bEnd==False:
-        pass
-    
-    print ("Terminating...")
-    
-    session.stop()
+    try:
+        asyncio.run(run(sessionOptions, eventHandler))
+    finally:
+        eventHandler.stop()
+        if metrics is not None:
+            metrics.stop()
+        asyncLogging.stop()
+
+
+async def run(sessionOptions, eventHandler):
+
+    # Ticks are handled on the blpapi dispatcher thread; the event loop only
+    # waits here until the session terminates or Ctrl+C is pressed. A session
+    # that gives up reconnecting is replaced by a new one after a backoff.
+    restarting = False
+
+    while True:
+
+        session = AsyncSession(sessionOptions, eventHandler.processEvent)
+
+        try:
+            await session.start()
+        except Exception as e:
+            log.error("Failed to start session: %s", e)
+            if not restarting:
+                return
+            await asyncio.sleep(eventHandler.supervisor.backoff.next())
+            continue
+
+        try:
+            await session.terminated
+        finally:
+            if not session.terminated.done():
+                session.session.stop()
+
+        restarting = eventHandler.supervisor.sessionTerminated()
+        if not restarting:
+            log.info("Terminating...")
+            return
+
+        delay = eventHandler.supervisor.backoff.next()
+        log.warning("Session terminated while disconnected: starting a new session in %.1fs", delay)
+        await asyncio.sleep(delay)
 
 if __name__ == "__main__":
     print("Bloomberg - IOI API Example - DesktopAPI - SubscribeIOI")
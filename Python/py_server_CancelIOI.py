@@ -4,15 +4,14 @@ import sys
 import blpapi
 import datetime
 import time
+import asyncio
+
+from ioi_asyncio import RequestError
+from ioi_session_pool import SessionPool
+from ioi_metrics import MetricsServer
 
-SESSION_STARTED                 = blpapi.Name("SessionStarted")
-SESSION_STARTUP_FAILURE         = blpapi.Name("SessionStartupFailure")
-SERVICE_OPENED                  = blpapi.Name("ServiceOpened")
-SERVICE_OPEN_FAILURE            = blpapi.Name("ServiceOpenFailure")
 SLOW_CONSUMER_WARNING           = blpapi.Name("SlowConsumerWarning")
 SLOW_CONSUMER_WARNING_CLEARED   = blpapi.Name("SlowConsumerWarningCleared")
-AUTHORIZATION_SUCCESS           = blpapi.Name("AuthorizationSuccess")
-AUTHORIZATION_FAILURE           = blpapi.Name("AuthorizationFailure")
 HANDLE                          = blpapi.Name("handle")
 
 
@@ -23,29 +22,22 @@ d_port = 8294
 d_user = "my EMRS ID" #EMRSID or AuthID of the Server
 d_ip = "0.0.0.0" #IP Address of the server
 
-bEnd=False
+# Sessions kept started and authorized in the pool. This sample sends a single
+# request, so one is enough; a long-running server sizes the pool to the
+# requests it keeps in flight.
+d_sessions = 1
 
+# Local port of the Prometheus-style metrics endpoint, or None
+d_metricsPort = 9465
 
-class SessionEventHandler():
-    
-    def sendAuthRequest(self,session):
-                
-        authService = session.getService(d_auth)
-        authReq = authService.createAuthorizationRequest()
-        authReq.set("emrsId",d_user)
-        authReq.set("ipAddress", d_ip)
-        self.identity = session.createIdentity()
-        
-        print ("Sending authorization request: %s" % (authReq))
-        
-        session.sendAuthorizationRequest(authReq, self.identity)
-        
-        print ("Authorization request sent.")
 
+class SessionEventHandler():
     
-    def sendCancelIOI(self, session):
+    async def sendCancelIOI(self, pool):
 
-        service = session.getService(d_emsx)
+        # The request is built from, and sent on, the same pooled session
+        member = pool.acquire()
+        service = member.service
 
         request = service.createRequest("cancelIoi")
         
@@ -54,8 +46,17 @@ class SessionEventHandler():
 
         print("Sending Request: %s" % request.toString())
 
-        self.requestID = session.sendRequest(request, identity=self.identity)
-        print("CancelIOI request sent.")
+        # Sent with that session's cached identity
+        try:
+            response = member.sendRequest(request, "cancelIoi")
+            print("CancelIOI request sent.")
+            messages = await response
+        except RequestError as e:
+            print("Error: Request failed: %s" % e)
+            return
+
+        for msg in messages:
+            self.processResponse(msg)
 
     def processAdminEvent(self,event):  
         print("Processing ADMIN event")
@@ -71,125 +72,43 @@ class SessionEventHandler():
                 print(msg)
 
 
-    def processSessionStatusEvent(self,event,session):  
-        print("Processing SESSION_STATUS event")
+    def processResponse(self, msg):
+        print("Processing RESPONSE message")
 
-        for msg in event:
-            if msg.messageType() == SESSION_STARTED:
-                print("Session started...")
-                session.openServiceAsync(d_auth)
-                
-            elif msg.messageType() == SESSION_STARTUP_FAILURE:
-                sys.stderr.write("Error: Session startup failed")
-                
-            else:
-                print(msg)
-                
+        print("MESSAGE: %s" % msg.toString())
+        print("CORRELATION ID: %d" % msg.correlationIds()[0].value())
+        print("MESSAGE TYPE: %s" % msg.messageType())
 
-    def processServiceStatusEvent(self,event,session):
-        print ("Processing SERVICE_STATUS event")
-        
-        for msg in event:
-            
-            if msg.messageType() == SERVICE_OPENED:
-                
-                serviceName = msg.asElement().getElementAsString("serviceName");
-                
-                print("Service opened [%s]" % (serviceName))
+        if msg.messageType() == HANDLE:
+            val = msg.getElementAsString("value")
+            print("Response: Value=%s" % (val))
 
-                if serviceName==d_auth:
-                    
-                    print("Auth service opened... Opening EMSX service...")
-                    session.openServiceAsync(d_emsx)
-                
-                elif serviceName==d_emsx:
-                    
-                    print("EMSX service opened... Sending authorization request...")
-                    
-                    self.sendAuthRequest(session)
-                
-            elif msg.messageType() == SERVICE_OPEN_FAILURE:
-                    print("Error: Service Failed to open")
-                
-                
-    
-    def processAuthorizationStatusEvent(self,event):
-        
-        print ("Processing AUTHORIZATION_STATUS event")
-
-        for msg in event:
-
-            print("AUTHORIZATION_STATUS message: %s" % (msg))
-
-
-                
-    def processResponseEvent(self, event, session):
-        print("Processing RESPONSE event")
-        
-        for msg in event:
-            
-            print("MESSAGE: %s" % msg.toString())
-            print("CORRELATION ID: %d" % msg.correlationIds()[0].value())
-
-            if msg.messageType() == AUTHORIZATION_SUCCESS:
-                print("Authorization successful....")
-                print ("SeatType: %s" % (self.identity.getSeatType()))
-                self.sendCancelIOI(session)
-
-            elif msg.messageType() == AUTHORIZATION_FAILURE:
-                print("Authorization failed....")
-                # insert code here to automatically retry authorization...
-
-            elif msg.correlationIds()[0].value() == self.requestID.value():
-                print("MESSAGE TYPE: %s" % msg.messageType())
-                
-                if msg.messageType() == HANDLE:
-                    val = msg.getElementAsString("value")
-                    print("Response: Value=%s" % (val))
-                
-                else:
-                    print ("Unexpected message...")
-                    
-                global bEnd
-                bEnd = True
-            
-            else:
-                print ("Unexpected message...")
-                print (msg)
+        else:
+            print ("Unexpected message...")
                     
             
     def processMiscEvents(self, event):
         
-        print("Processing " + event.eventType() + " event")
+        print("Processing %s event" % event.eventType())
         
         for msg in event:
 
-            print("MISC MESSAGE: %s" % (msg.tostring()))
+            print("MISC MESSAGE: %s" % (msg.toString()))
 
 
     def processEvent(self, event, session):
         try:
             
+            # Session, service, authorization and response events are
+            # handled by the session pool
             if event.eventType() == blpapi.Event.ADMIN:
                 self.processAdminEvent(event)
             
-            if event.eventType() == blpapi.Event.SESSION_STATUS:
-                self.processSessionStatusEvent(event,session)
-
-            elif event.eventType() == blpapi.Event.SERVICE_STATUS:
-                self.processServiceStatusEvent(event,session)
-
-            elif event.eventType() == blpapi.Event.AUTHORIZATION_STATUS:
-                self.processAuthorizationStatusEvent(event)
-
-            elif event.eventType() == blpapi.Event.RESPONSE:
-                self.processResponseEvent(event,session)
-            
             else:
                 self.processMiscEvents(event)
                 
-        except:
-            print("Exception:  %s" % sys.exc_info()[0])
+        except Exception as e:
+            print("Exception:  %s" % e)
             
         return False
 
@@ -204,18 +123,34 @@ def main():
 
     eventHandler = SessionEventHandler()
 
-    session = blpapi.Session(sessionOptions, eventHandler.processEvent)
+    asyncio.run(run(sessionOptions, eventHandler))
+
+
+async def run(sessionOptions, eventHandler):
+
+    # Sessions are started and authorized once; the pool can then serve any
+    # number of requests without repeating that setup
+    pool = SessionPool(sessionOptions, d_auth, d_emsx, d_user, d_ip,
+                       size=d_sessions, handler=eventHandler.processEvent)
 
-    if not session.startAsync():
-        print("Failed to start session.")
+    metrics = MetricsServer(port=d_metricsPort).start() if d_metricsPort else None
+
+    try:
+        await pool.start()
+    except Exception as e:
+        print("Failed to start session pool: %s" % e)
+        if metrics is not None:
+            metrics.stop()
         return
-    
-    #global bEnd
-    #while bEnd==False:
-    #    pass
-    while True: 
-        time.sleep(1)
-    
+
+    try:
+        await eventHandler.sendCancelIOI(pool)
+        print ("Terminating...")
+    finally:
+        await pool.stop()
+        if metrics is not None:
+            metrics.stop()
+
 if __name__ == "__main__":
     print("Bloomberg - IOI API Example - CancelIOI")
     try:
@@ -0,0 +1,10 @@
+# conftest.py
+#
+# Run from the repository root with: python -m pytest Python/tests
+# Tests of modules that need blpapi are skipped where it is not installed.
+
+import os
+import sys
+
+# The modules under test are the flat scripts of the Python directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
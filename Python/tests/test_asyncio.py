@@ -0,0 +1,142 @@
+# test_asyncio.py
+
+import asyncio
+import threading
+
+import pytest
+
+blpapi = pytest.importorskip("blpapi")
+
+import ioi_asyncio
+from ioi_asyncio import AsyncSession, RequestError
+from ioi_metrics import requestFailures, requestLatency
+from ioi_simulator import IOIServiceSimulator
+
+REQUEST_SERVICE = "//blp/ioiapi-beta-request"
+
+
+@pytest.fixture
+def simulator(monkeypatch):
+
+    simulator = IOIServiceSimulator(tickRate=0, latency=0.001, jitter=0.0, seed=7)
+    monkeypatch.setattr(ioi_asyncio, "d_sessionFactory", simulator.createSession)
+    return simulator
+
+
+def cancelRequest(service, handle):
+    request = service.createRequest("cancelIoi")
+    request.getElement("handle").setElement("value", handle)
+    return request
+
+
+def test_start_open_and_stop(simulator):
+
+    async def run():
+        session = AsyncSession(blpapi.SessionOptions())
+        await session.start()
+        service = await session.openService(REQUEST_SERVICE)
+        await session.stop()
+        return service, session
+
+    service, session = asyncio.run(run())
+    assert service is simulator.requestService
+    assert session.terminated.done()
+    assert session.services == {} and session.requests == {}
+
+
+def test_request_is_sent_before_it_is_awaited(simulator):
+
+    handle = simulator.nextTick()["ioi_id"]
+    operation = "test_cancelIoi"
+
+    async def run():
+        session = AsyncSession(blpapi.SessionOptions())
+        await session.start()
+        service = await session.openService(REQUEST_SERVICE)
+
+        response = session.sendRequest(cancelRequest(service, handle), operation=operation)
+        sent = handle not in simulator.iois
+        messages = await response
+
+        await session.stop()
+        return sent, messages
+
+    sent, messages = asyncio.run(run())
+    assert sent
+    assert [msg.getElementAsString("value") for msg in messages] == [handle]
+    assert requestLatency(operation).count == 1
+
+
+def test_failed_request_raises_request_error(simulator):
+
+    simulator.failureRate = 1.0
+    operation = "test_failedIoi"
+
+    async def run():
+        session = AsyncSession(blpapi.SessionOptions())
+        await session.start()
+        service = await session.openService(REQUEST_SERVICE)
+        try:
+            with pytest.raises(RequestError):
+                await session.sendRequest(cancelRequest(service, "SIM-0"), operation=operation)
+            return session.requests
+        finally:
+            await session.stop()
+
+    assert asyncio.run(run()) == {}
+    assert requestFailures(operation, "error").value == 1
+
+
+def test_pending_requests_fail_when_the_session_terminates(simulator):
+
+    async def run():
+        session = AsyncSession(blpapi.SessionOptions())
+        await session.start()
+        service = await session.openService(REQUEST_SERVICE)
+
+        simulator.latency = 5.0
+        response = session.sendRequest(cancelRequest(service, "SIM-0"))
+        await session.stop()
+        with pytest.raises(RequestError):
+            await response
+
+    asyncio.run(run())
+
+
+def test_handler_sees_every_event_on_the_dispatcher_thread(simulator):
+
+    seen = []
+
+    def handler(event, session):
+        seen.append((event.eventType(), threading.current_thread()))
+
+    async def run():
+        session = AsyncSession(blpapi.SessionOptions(), handler)
+        await session.start()
+        await session.openService(REQUEST_SERVICE)
+        await session.stop()
+
+    asyncio.run(run())
+
+    eventTypes = [eventType for eventType, thread in seen]
+    assert blpapi.Event.SESSION_STATUS in eventTypes
+    assert blpapi.Event.SERVICE_STATUS in eventTypes
+    assert all(thread is not threading.main_thread() for eventType, thread in seen)
+
+
+def test_subscription_queue_receives_status_and_paint(simulator):
+
+    for i in range(3):
+        simulator.nextTick()
+
+    async def run():
+        session = AsyncSession(blpapi.SessionOptions())
+        await session.start()
+        queue = session.subscribe("//blp/ioisub-beta/ioi")
+        messages = [await asyncio.wait_for(queue.get(), 5) for i in range(4)]
+        await session.stop()
+        return messages
+
+    messages = asyncio.run(run())
+    assert str(messages[0].messageType()) == "SubscriptionStarted"
+    assert [str(msg.messageType()) for msg in messages[1:]] == ["Ioidata"] * 3
@@ -0,0 +1,93 @@
+# test_book.py
+
+import time
+
+import pytest
+
+pytest.importorskip("blpapi")
+
+from ioi_book import IOIBook, NEW, UPDATE, REMOVE
+from ioi_expiry import ExpiryWheel
+
+
+def test_apply_indexes_by_underlying_and_broker():
+
+    book = IOIBook()
+    assert book.apply({"ioi_id": "a", "ioi_routing_broker": "BLPA",
+                       "ioi_instrument_stock_security_ticker": "VOD LN Equity"}) == (NEW, "a")
+    assert book.apply({"ioi_id": "a", "ioi_routing_broker": "BLPB"}) == (UPDATE, "a")
+
+    assert [ioi.get("ioi_id") for ioi in book.forUnderlying("VOD LN Equity")] == ["a"]
+    assert book.forBroker("BLPA") == []
+    assert [ioi.get("ioi_id") for ioi in book.forBroker("BLPB")] == ["a"]
+
+    assert book.apply({"ioi_id": "a", "change": "Cancel"}) == (REMOVE, "a")
+    assert book.byUnderlying == {} and book.byBroker == {}
+
+
+def test_updates_merge_into_the_latest_state():
+
+    book = IOIBook()
+    book.apply({"id_value": "a", "ioi_bid_price_fixed_price": 83.63, "ioi_bid_size_quantity": 500})
+    book.apply({"id_value": "a", "ioi_bid_price_fixed_price": 83.64})
+
+    ioi = book.get("a")
+    assert ioi.get("ioi_bid_price_fixed_price") == 83.64
+    assert ioi.get("ioi_bid_size_quantity") == 500
+    assert len(book) == 1
+
+
+def test_option_legs_are_indexed_by_underlying():
+
+    book = IOIBook()
+    book.apply({"ioi_id": "a", "ioi_instrument_option_legs_0_underlying_ticker": "VOD LN Equity",
+                "ioi_instrument_option_legs_1_underlying_ticker": "BP/ LN Equity"})
+
+    assert [ioi.get("ioi_id") for ioi in book.forUnderlying("VOD LN Equity")] == ["a"]
+    assert [ioi.get("ioi_id") for ioi in book.forUnderlying("BP/ LN Equity")] == ["a"]
+
+
+def test_ticks_without_a_handle_or_held_ioi_are_ignored():
+
+    book = IOIBook()
+    assert book.apply({"ioi_routing_broker": "BLPA"}) == (None, None)
+    assert book.apply({"ioi_id": "b", "state": "cancelled"}) == (None, "b")
+    assert len(book) == 0
+
+
+def goodUntil(seconds):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds)) + ".500+00:00"
+
+
+def test_book_expires_on_good_until():
+
+    book = IOIBook(ExpiryWheel(1000))
+    book.apply({"ioi_id": "a", "ioi_routing_broker": "BLPA", "ioi_goodUntil": goodUntil(1010)})
+    book.apply({"ioi_id": "b", "ioi_routing_broker": "BLPA", "ioi_goodUntil": goodUntil(1020)})
+
+    # Half a second past 1010, so not expired until 1011
+    assert book.expire(1010) == []
+    assert book.expire(1011) == ["a"]
+    assert "a" not in book and "b" in book
+    assert [ioi.get("ioi_id") for ioi in book.forBroker("BLPA")] == ["b"]
+
+
+def test_book_reschedules_changed_good_until():
+
+    book = IOIBook(ExpiryWheel(1000))
+    book.apply({"ioi_id": "a", "ioi_goodUntil": goodUntil(1010)})
+    book.apply({"ioi_id": "a", "ioi_goodUntil": goodUntil(1030)})
+
+    assert book.expire(1025) == []
+    assert book.expire(1031) == ["a"]
+
+
+def test_book_removal_cancels_expiry():
+
+    wheel = ExpiryWheel(1000)
+    book = IOIBook(wheel)
+    book.apply({"ioi_id": "a", "ioi_goodUntil": goodUntil(1010)})
+    book.apply({"ioi_id": "a", "state": "cancelled"})
+
+    assert len(wheel) == 0
+    assert book.expire(1100) == []
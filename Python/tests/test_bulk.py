@@ -0,0 +1,131 @@
+# test_bulk.py
+
+import pytest
+
+blpapi = pytest.importorskip("blpapi")
+
+from ioi_bulk import BulkSubmitter, buildRequest
+from ioi_requests import RequestTimeout
+from ioi_simulator import IOIServiceSimulator
+
+
+class SilentSession():
+
+    # Accepts requests and never answers them
+    def __init__(self):
+        self.sent = []
+
+    def sendRequest(self, request, identity=None, correlationId=None):
+        self.sent.append(correlationId)
+        return correlationId
+
+
+def simulatedSubmission(items, window, jitter=0.002, **kwargs):
+
+    # A submitter on a started simulator session, fed that session's responses
+    simulator = IOIServiceSimulator(tickRate=0, latency=0.003, jitter=jitter, seed=11)
+    live = [simulator.nextTick()["ioi_id"] for i in range(5)]
+    submitter = []
+
+    session = simulator.createSession(handler=lambda event, session: submitter[0].processResponseEvent(event))
+    session.startAsync()
+
+    inFlight = []
+    send = session.sendRequest
+
+    def sendRequest(request, identity=None, correlationId=None):
+        inFlight.append(len(submitter[0].requests))
+        return send(request, identity=identity, correlationId=correlationId)
+
+    session.sendRequest = sendRequest
+    submitter.append(BulkSubmitter(session, simulator.requestService, items(live), window, **kwargs))
+    return simulator, session, submitter[0], live, inFlight
+
+
+def cancel(handle):
+    return ("cancelIoi", {"handle": {"value": handle}})
+
+
+def test_every_item_is_answered_within_the_window():
+
+    simulator, session, submitter, live, inFlight = simulatedSubmission(
+        lambda live: [cancel(h) for h in live] + [cancel("SIM-UNKNOWN")], window=2)
+
+    submitter.start()
+    assert submitter.done.wait(5)
+    session.stop()
+
+    results = submitter.results
+    assert [r.handle for r in results[:5]] == live
+    assert all(r.error is None and r.latency is not None for r in results[:5])
+    assert results[5].handle is None and "Unknown IOI handle" in results[5].error
+    assert simulator.live == []
+    assert max(inFlight) <= 2
+    assert len(submitter.requests) == 0
+
+
+def test_results_are_reported_as_they_complete():
+
+    reported = []
+    simulator, session, submitter, live, inFlight = simulatedSubmission(
+        lambda live: [cancel(h) for h in live], window=5, onResult=reported.append)
+
+    submitter.start()
+    assert submitter.done.wait(5)
+    session.stop()
+
+    assert sorted(r.index for r in reported) == list(range(5))
+    assert submitter.completed == 5
+
+
+def test_an_item_that_fails_to_build_does_not_stop_the_rest():
+
+    simulator, session, submitter, live, inFlight = simulatedSubmission(
+        lambda live: [cancel(live[0]), ("cancelIoi", {"no_such_element": 1}), cancel(live[1])], window=1)
+
+    submitter.start()
+    assert submitter.done.wait(5)
+    session.stop()
+
+    assert isinstance(submitter.results[1].error, Exception)
+    assert [submitter.results[0].handle, submitter.results[2].handle] == live[:2]
+
+
+def test_unanswered_requests_time_out_and_free_the_window():
+
+    simulator = IOIServiceSimulator(tickRate=0, seed=1)
+    session = SilentSession()
+    submitter = BulkSubmitter(session, simulator.requestService, [cancel("SIM-%d" % i) for i in range(5)],
+                              window=2, timeout=0.05)
+
+    submitter.start()
+    assert len(session.sent) == 2
+    assert submitter.done.wait(5)
+
+    assert len(session.sent) == 5
+    assert all(isinstance(r.error, RequestTimeout) for r in submitter.results)
+    assert submitter.requests.timedOut == 5
+
+
+def test_requests_are_built_by_the_build_function():
+
+    built = []
+
+    def build(service, operation, spec):
+        built.append(operation)
+        return buildRequest(service, operation, spec)
+
+    simulator, session, submitter, live, inFlight = simulatedSubmission(
+        lambda live: [cancel(h) for h in live[:2]], window=4, build=build)
+
+    submitter.start()
+    assert submitter.done.wait(5)
+    session.stop()
+    assert built == ["cancelIoi", "cancelIoi"]
+
+
+def test_nothing_to_submit():
+
+    submitter = BulkSubmitter(SilentSession(), None, [])
+    submitter.start()
+    assert submitter.done.is_set()
@@ -0,0 +1,134 @@
+# test_columnar.py
+
+import pytest
+
+blpapi = pytest.importorskip("blpapi")
+
+import py_dapi_SubscribeIOI
+from ioi_columnar import IOIColumnBatch, EPOCH
+from ioi_fields import IOIFieldExtractor
+from ioi_simulator import IOIServiceSimulator
+
+IOI_DATA = blpapi.Name("Ioidata")
+
+# The failing field is last, so a bad message has already written the others
+FIELDS = ["ioi_id", "ioi_routing_broker", "ioi_bid_price_fixed_price", "ioi_goodUntil", "ioi_bid_notes"]
+
+
+def ticks(count, seed=5):
+    simulator = IOIServiceSimulator(seed=seed)
+    return simulator, [simulator.nextTick() for i in range(count)]
+
+
+def failingExtractor(bad):
+
+    # Decoding ioi_bid_notes raises for the IOIs whose handle is in bad
+    extractor = IOIFieldExtractor(FIELDS)
+    plan = []
+    for field, name, get in extractor.plan:
+        if field == "ioi_bid_notes":
+            def get(el, name, get=get):
+                if el.getElementAsString("ioi_id") in bad:
+                    raise ValueError("bad tick")
+                return get(el, name)
+        plan.append((field, name, get))
+    extractor.plan = tuple(plan)
+    return extractor
+
+
+def test_decodes_columns():
+
+    simulator, stream = ticks(10)
+    batch = IOIColumnBatch(FIELDS, capacity=4)
+
+    assert batch.decodeEvent(simulator.dataEvent(stream, blpapi.CorrelationId(1)), IOI_DATA) == 10
+    assert batch.values("ioi_id") == [tick.get("ioi_id") for tick in stream]
+    assert batch.values("ioi_routing_broker") == [tick.get("ioi_routing_broker") for tick in stream]
+    assert batch.kinds["ioi_goodUntil"] == EPOCH
+    assert all(isinstance(value, int) for value in batch.values("ioi_goodUntil") if value is not None)
+
+    batch.clear()
+    assert batch.length == 0
+    assert batch.values("ioi_id") == []
+
+
+def test_failed_message_is_skipped_and_rolled_back():
+
+    simulator, stream = ticks(6)
+    bad = set([stream[2]["ioi_id"], stream[5]["ioi_id"]])
+    batch = IOIColumnBatch(capacity=2, extractor=failingExtractor(bad))
+    failed = []
+
+    appended = batch.decodeEvent(simulator.dataEvent(stream, blpapi.CorrelationId(1)), IOI_DATA, failed.append)
+
+    good = [tick for tick in stream if tick["ioi_id"] not in bad]
+    assert appended == batch.length == len(good)
+    assert len(failed) == 2
+    assert batch.values("ioi_id") == [tick["ioi_id"] for tick in good]
+    assert batch.values("ioi_bid_notes") == [tick.get("ioi_bid_notes") for tick in good]
+    assert batch.values("ioi_bid_price_fixed_price") == [tick.get("ioi_bid_price_fixed_price") for tick in good]
+
+    # Nothing written past the rows kept
+    column = batch.columns["ioi_id"]
+    assert all(value is None for value in list(column)[batch.length:])
+
+
+def test_failure_without_on_error_raises_and_keeps_earlier_rows():
+
+    simulator, stream = ticks(4)
+    batch = IOIColumnBatch(extractor=failingExtractor(set([stream[1]["ioi_id"]])))
+
+    with pytest.raises(ValueError):
+        batch.decodeEvent(simulator.dataEvent(stream, blpapi.CorrelationId(1)), IOI_DATA)
+
+    assert batch.values("ioi_id") == [stream[0]["ioi_id"]]
+
+
+@pytest.fixture
+def batchSubscriber(monkeypatch):
+
+    monkeypatch.setattr(py_dapi_SubscribeIOI, "d_batchMode", True)
+    monkeypatch.setattr(py_dapi_SubscribeIOI, "d_conflate", False)
+    monkeypatch.setattr(py_dapi_SubscribeIOI, "d_journal", None)
+    monkeypatch.setattr(py_dapi_SubscribeIOI, "d_snapshot", None)
+    monkeypatch.setattr(py_dapi_SubscribeIOI, "d_workers", 0)
+
+    handler = py_dapi_SubscribeIOI.SessionEventHandler()
+    yield handler
+    handler.stop()
+
+
+def test_subscriber_counts_failures_and_clears_the_batch(batchSubscriber):
+
+    simulator, stream = ticks(8)
+    handler = batchSubscriber
+    handler.batch = IOIColumnBatch(extractor=failingExtractor(set([stream[3]["ioi_id"]])))
+
+    seen = []
+    handler.processIOIBatch = lambda batch: seen.append(batch.values("ioi_id"))
+    handler.processSubscriptionDataEvent(simulator.dataEvent(stream, blpapi.CorrelationId(1)))
+
+    assert seen == [[tick["ioi_id"] for i, tick in enumerate(stream) if i != 3]]
+    assert sum(handler.errors.values()) == 1
+    assert handler.received == 7
+    assert handler.batch.length == 0
+
+
+def test_subscriber_clears_the_batch_when_its_handler_fails(batchSubscriber):
+
+    simulator, stream = ticks(8)
+    handler = batchSubscriber
+
+    def fail(batch):
+        raise RuntimeError("handler failed")
+
+    handler.processIOIBatch = fail
+    with pytest.raises(RuntimeError):
+        handler.processSubscriptionDataEvent(simulator.dataEvent(stream[:4], correlationId=blpapi.CorrelationId(1)))
+    assert handler.batch.length == 0
+
+    # The next event's rows are not mixed with the failed one's
+    seen = []
+    handler.processIOIBatch = lambda batch: seen.append(batch.length)
+    handler.processSubscriptionDataEvent(simulator.dataEvent(stream[4:], blpapi.CorrelationId(1)))
+    assert seen == [4]
@@ -0,0 +1,80 @@
+# test_conflation.py
+
+import threading
+
+from ioi_conflation import ConflatingQueue
+
+
+def test_updates_to_a_queued_ioi_are_merged():
+
+    queue = ConflatingQueue()
+    queue.put("a", {"ioi_id": "a", "bid": 1.0, "size": 100})
+    queue.put("b", {"ioi_id": "b", "bid": 2.0})
+    queue.put("a", {"bid": 1.5})
+
+    assert queue.conflated == 1
+    assert queue.drain(0) == [("a", {"ioi_id": "a", "bid": 1.5, "size": 100}), ("b", {"ioi_id": "b", "bid": 2.0})]
+    assert len(queue) == 0
+
+
+def test_put_copies_the_tick():
+
+    queue = ConflatingQueue()
+    tick = {"bid": 1.0}
+    queue.put("a", tick)
+    queue.put("a", {"bid": 2.0})
+
+    assert tick == {"bid": 1.0}
+
+
+def test_get_in_first_put_order():
+
+    queue = ConflatingQueue()
+    for handle in ("a", "b", "c"):
+        queue.put(handle, {"n": 1})
+    queue.put("a", {"n": 2})
+
+    assert [queue.get(0)[0] for i in range(3)] == ["a", "b", "c"]
+    assert queue.get(0) is None
+
+
+def test_drain_waits_for_the_first_item():
+
+    queue = ConflatingQueue()
+    threading.Timer(0.05, queue.put, ("a", {"n": 1})).start()
+
+    assert queue.drain(5.0) == [("a", {"n": 1})]
+
+
+def test_close_wakes_a_waiting_consumer():
+
+    queue = ConflatingQueue()
+    threading.Timer(0.05, queue.close).start()
+
+    assert queue.drain(5.0) == []
+    assert queue.closed
+
+
+def test_consumer_sees_the_latest_state_of_every_ioi():
+
+    # Whatever is conflated away, the consumer ends on each IOI's last tick
+    queue = ConflatingQueue()
+    latest = {}
+
+    def consume():
+        while True:
+            items = queue.drain(1.0)
+            if not items and queue.closed:
+                return
+            for handle, ioi in items:
+                latest.setdefault(handle, {}).update(ioi)
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+
+    for n in range(20000):
+        queue.put(n % 50, {"n": n})
+    queue.close()
+    consumer.join()
+
+    assert latest == dict((h, {"n": 19950 + h}) for h in range(50))
@@ -0,0 +1,77 @@
+# test_expiry.py
+
+from ioi_expiry import ExpiryWheel, SPAN
+
+
+def test_expires_at_deadline():
+
+    wheel = ExpiryWheel(1000)
+    wheel.schedule("a", 1005)
+
+    assert wheel.advance(1004) == []
+    assert wheel.advance(1005) == ["a"]
+    assert len(wheel) == 0
+
+
+def test_deadlines_on_every_level():
+
+    # One deadline per level, each cascading down to level 0 and expiring
+    # neither early nor late
+    wheel = ExpiryWheel(1000)
+    deadlines = {"s": 1010, "m": 1000 + 500, "h": 1000 + 5000, "d": 1000 + 300000}
+    for key, deadline in deadlines.items():
+        wheel.schedule(key, deadline)
+
+    for key, deadline in sorted(deadlines.items(), key=lambda item: item[1]):
+        assert wheel.advance(deadline - 1) == []
+        assert wheel.advance(deadline) == [key]
+
+
+def test_advance_in_one_step():
+
+    wheel = ExpiryWheel(0)
+    for i in range(200):
+        wheel.schedule(i, 1 + i * 37)
+
+    assert sorted(wheel.advance(4000)) == [i for i in range(200) if 1 + i * 37 <= 4000]
+    assert len(wheel) == len([i for i in range(200) if 1 + i * 37 > 4000])
+
+
+def test_fractional_deadlines_round_up():
+
+    wheel = ExpiryWheel(100)
+    wheel.schedule("a", 101.2)
+
+    assert wheel.advance(101) == []
+    assert wheel.advance(102) == ["a"]
+
+
+def test_overdue_deadline_expires_on_next_tick():
+
+    wheel = ExpiryWheel(100)
+    wheel.schedule("a", 50)
+
+    assert wheel.advance(101) == ["a"]
+
+
+def test_cancel_and_reschedule():
+
+    wheel = ExpiryWheel(0)
+    wheel.schedule("a", 10)
+    wheel.schedule("b", 10)
+    wheel.cancel("a")
+    wheel.cancel("missing")
+    wheel.schedule("b", 20)
+
+    assert wheel.advance(15) == []
+    assert wheel.advance(20) == ["b"]
+
+
+def test_deadline_beyond_span():
+
+    # Parked in the top level rather than wrapped around into an early slot
+    wheel = ExpiryWheel(0)
+    wheel.schedule("a", SPAN + 100)
+
+    assert wheel.advance(300000) == []
+    assert len(wheel) == 1
@@ -0,0 +1,160 @@
+# test_fanout.py
+
+import functools
+import marshal
+import os
+import time
+
+import pytest
+
+pytest.importorskip("blpapi")
+
+from ioi_expiry import ExpiryWheel
+from ioi_fanout import RingBuffer, IOIFanout
+
+
+class RecordingWorker():
+
+    # Appends each IOI it is handed to a file of its own, in arrival order
+    def __init__(self, directory, index):
+        self.file = open(os.path.join(directory, "worker-%d" % index), "wb")
+
+    def __call__(self, ioi):
+        marshal.dump(ioi, self.file)
+
+    def close(self):
+        self.file.close()
+
+
+def exitingWorker(index):
+    raise SystemExit(3)
+
+
+def readWorker(path):
+    records = []
+    with open(path, "rb") as f:
+        while True:
+            try:
+                records.append(marshal.load(f))
+            except EOFError:
+                return records
+
+
+@pytest.fixture
+def ring():
+    ring = RingBuffer(capacity=64, create=True)
+    yield ring
+    ring.release(unlink=True)
+
+
+def test_records_come_out_in_order_across_the_wrap(ring):
+
+    consumer = RingBuffer(ring.name, 64)
+    try:
+        payloads = [bytes([i]) * (i % 13) for i in range(200)]
+        for payload in payloads:
+            assert ring.put(payload)
+            assert consumer.get() == payload
+        assert consumer.get() is None
+        assert ring.tail > 10 * ring.capacity
+    finally:
+        consumer.release()
+
+
+def test_a_full_ring_refuses_at_once(ring):
+
+    consumer = RingBuffer(ring.name, 64)
+    try:
+        puts = 0
+        while ring.put(b"x" * 12):
+            puts += 1
+        assert puts == 4
+
+        started = time.time()
+        assert not ring.put(b"x" * 12)
+        assert time.time() - started < 0.1
+
+        # Space freed by the consumer is reused
+        assert consumer.get() == b"x" * 12
+        assert ring.put(b"y" * 12)
+        assert [consumer.get() for i in range(4)] == [b"x" * 12] * 3 + [b"y" * 12]
+    finally:
+        consumer.release()
+
+
+def test_record_and_capacity_limits(ring):
+
+    with pytest.raises(ValueError):
+        ring.put(b"x" * 40)
+    with pytest.raises(ValueError):
+        RingBuffer(capacity=62, create=True)
+
+
+@pytest.fixture
+def fanout():
+    fanout = IOIFanout(3, exitingWorker, capacity=256)
+    yield fanout
+    for ring in fanout.rings:
+        ring.release(unlink=True)
+
+
+def test_an_ioi_stays_on_its_shard_until_removed(fanout):
+
+    first = fanout.shardOf({"ioi_id": "a", "ioi_instrument_stock_security_ticker": "VOD LN Equity"})
+    assert fanout.shardOf({"ioi_id": "b", "ioi_instrument_stock_security_ticker": "VOD LN Equity"}) == first
+
+    # Updates without the underlying, or with another one, follow the pin
+    for ticker in (None, "BP/ LN Equity", "AAPL US Equity", "MSFT US Equity"):
+        assert fanout.shardOf({"ioi_id": "a", "ioi_instrument_stock_security_ticker": ticker}) == first
+
+    fanout.shardOf({"ioi_id": "a", "state": "cancelled"})
+    assert "a" not in fanout.shards
+
+
+def test_pins_expire_with_good_until(fanout):
+
+    fanout.wheel = ExpiryWheel(990)
+    fanout.shardOf({"ioi_id": "a", "ioi_goodUntil": "1970-01-01T00:16:40.500+00:00"})
+    fanout.shardOf({"ioi_id": "b", "ioi_goodUntil": "1970-01-01T00:16:50.000+00:00"})
+
+    fanout.expire(1000)
+    assert set(fanout.shards) == set(["a", "b"])
+    fanout.expire(1001)
+    assert set(fanout.shards) == set(["b"])
+
+
+def test_workers_see_each_ioi_in_order(tmp_path):
+
+    fanout = IOIFanout(2, functools.partial(RecordingWorker, str(tmp_path))).start()
+    ticks = []
+    for i in range(300):
+        ticks.append({"ioi_id": "h%d" % (i % 17), "seq": i,
+                      "ioi_instrument_stock_security_ticker": "T%d" % (i % 5)})
+    for tick in ticks:
+        fanout.put(tick)
+    fanout.stop()
+
+    seen = [readWorker(str(tmp_path / ("worker-%d" % i))) for i in range(2)]
+    assert sum(len(records) for records in seen) == len(ticks) == sum(fanout.sent)
+    for records in seen:
+        for handle in set(r["ioi_id"] for r in records):
+            mine = [r["seq"] for r in records if r["ioi_id"] == handle]
+            assert mine == [t["seq"] for t in ticks if t["ioi_id"] == handle]
+    assert not set(r["ioi_id"] for r in seen[0]) & set(r["ioi_id"] for r in seen[1])
+
+
+def test_a_dead_worker_never_stalls_the_caller():
+
+    fanout = IOIFanout(1, exitingWorker, capacity=256).start()
+    fanout.processes[0].join(5)
+
+    started = time.time()
+    for i in range(2000):
+        fanout.put({"ioi_id": "h%d" % i, "ioi_bid_notes": "bid notes"})
+    elapsed = time.time() - started
+
+    fanout.stop()
+    assert elapsed < 1.0
+    assert fanout.dead == [True]
+    assert fanout.sent[0] + fanout.dropped == 2000
+    assert fanout.dropped > 1900
@@ -0,0 +1,139 @@
+# test_fields.py
+
+import pytest
+
+blpapi = pytest.importorskip("blpapi")
+
+from ioi_fields import IOIFieldExtractor, loadSchema, EXTRA_FIELDS
+from ioi_simulator import IOIServiceSimulator
+
+FIELDS = ["ioi_id", "ioi_routing_broker", "trader_uuid", "ioi_bid_price_fixed_price",
+          "ioi_bid_price_pegged_offsetAmount", "ioi_goodUntil"]
+
+
+def messages(count, seed=1):
+    simulator = IOIServiceSimulator(seed=seed)
+    ticks = [simulator.nextTick() for i in range(count)]
+    return ticks, list(simulator.dataEvent(ticks, blpapi.CorrelationId(1)))
+
+
+def test_load_schema():
+
+    fields = loadSchema()
+    types = dict(fields)
+
+    assert fields[0][0] == "ioi_instrument_type"
+    assert types["ioi_id"] == "String"
+    assert types["ioi_goodUntil"] == "Datetime"
+    assert types["ioi_bid_price_fixed_price"] == "Float64"
+    assert types["trader_uuid"] == "Int64"
+
+    with pytest.raises(ValueError):
+        loadSchema(eventName="NoSuchEvent")
+
+
+def test_unknown_field_is_refused():
+
+    with pytest.raises(ValueError) as e:
+        IOIFieldExtractor(["ioi_id", "ioi_no_such_field"])
+    assert "ioi_no_such_field" in str(e.value)
+
+
+def test_all_fields_by_default():
+
+    extractor = IOIFieldExtractor()
+    assert extractor.fields[:len(loadSchema())] == tuple(f for f, t in loadSchema())
+    for field, datatype in EXTRA_FIELDS:
+        assert field in extractor.fields
+
+
+def test_defaults_by_type():
+
+    extractor = IOIFieldExtractor(FIELDS)
+    assert extractor.default("ioi_id") == ""
+    assert extractor.default("ioi_goodUntil") == ""
+    assert extractor.default("ioi_bid_price_fixed_price") == 0.0
+    assert extractor.default("trader_uuid") == 0
+
+
+def test_extract_returns_the_projected_fields_present():
+
+    extractor = IOIFieldExtractor(FIELDS)
+    ticks, msgs = messages(50)
+
+    for tick, msg in zip(ticks, msgs):
+        values = extractor.extract(msg)
+        assert set(values) == set(f for f in FIELDS if f in tick)
+        for field in ("ioi_id", "ioi_routing_broker", "trader_uuid", "ioi_bid_price_fixed_price",
+                      "ioi_bid_price_pegged_offsetAmount"):
+            if field in tick:
+                assert values[field] == tick[field]
+        assert isinstance(values["ioi_goodUntil"], str)
+
+
+def countingExtractor(fields):
+
+    # An extractor that records every field its getters decode
+    extractor = IOIFieldExtractor(fields)
+    decoded = []
+
+    def counted(field, get):
+        def counting(el, name):
+            decoded.append(field)
+            return get(el, name)
+        return counting
+
+    extractor.lookup = dict((f, (name, counted(f, get))) for f, (name, get) in extractor.lookup.items())
+    extractor.plan = tuple((f, name, counted(f, get)) for f, name, get in extractor.plan)
+    return extractor, decoded
+
+
+def test_view_decodes_only_what_is_read():
+
+    extractor, decoded = countingExtractor(FIELDS)
+    ticks, msgs = messages(1)
+    view = extractor.view(msgs[0])
+
+    assert decoded == []
+    assert view["ioi_id"] == ticks[0]["ioi_id"]
+    assert view.get("ioi_routing_broker") == ticks[0]["ioi_routing_broker"]
+    assert view["ioi_id"] == ticks[0]["ioi_id"]
+    assert decoded == ["ioi_id", "ioi_routing_broker"]
+
+
+def test_view_of_absent_and_unknown_fields():
+
+    extractor, decoded = countingExtractor(FIELDS)
+    ticks, msgs = messages(20)
+    tick, msg = next((t, m) for t, m in zip(ticks, msgs) if "ioi_bid_price_pegged_offsetAmount" not in t)
+    view = extractor.view(msg)
+
+    assert view.get("ioi_bid_price_pegged_offsetAmount") is None
+    assert view.get("ioi_bid_price_pegged_offsetAmount", 0.0) == 0.0
+    assert "ioi_bid_price_pegged_offsetAmount" not in view
+    with pytest.raises(KeyError):
+        view["ioi_bid_price_pegged_offsetAmount"]
+
+    # An absent field is never decoded
+    assert decoded == []
+    assert view.get("no_such_field", "default") == "default"
+
+    # Fields outside the projection can still be read
+    assert view["state"] == tick["state"]
+
+
+def test_view_extract_matches_the_extractor_and_reuses_reads():
+
+    extractor, decoded = countingExtractor(FIELDS)
+    ticks, msgs = messages(30)
+
+    for msg in msgs:
+        view = extractor.view(msg)
+        view.get("ioi_id")
+        view.get("ioi_bid_price_pegged_offsetAmount")
+        del decoded[:]
+
+        values = view.extract()
+        assert "ioi_id" not in decoded
+        assert "ioi_bid_price_pegged_offsetAmount" not in decoded
+        assert values == extractor.extract(msg)
@@ -0,0 +1,89 @@
+# test_filter.py
+
+import pytest
+
+blpapi = pytest.importorskip("blpapi")
+
+from ioi_fields import IOIFieldExtractor
+from ioi_filter import IOIFilter, oneOf, underlyingIn, anySideWithin, SIZE_FIELDS
+from ioi_record import IOIRecord
+from ioi_simulator import IOIServiceSimulator
+
+STOCK = {"ioi_instrument_type": "stock", "ioi_instrument_stock_security_ticker": "VOD LN Equity",
+         "ioi_bid_size_quantity": 500, "ioi_offer_size_quantity": 2000}
+
+SPREAD = {"ioi_instrument_type": "option", "ioi_instrument_option_structure": "CallSpread",
+          "ioi_instrument_option_legs_count": 1,
+          "ioi_instrument_option_legs_0_underlying_ticker": "AAPL US Equity",
+          "ioi_instrument_option_legs_1_underlying_figi": "BBG000B9XRY4",
+          "ioi_bid_price_moneyness": 0.95}
+
+
+def test_one_of():
+
+    predicate = oneOf("ioi_instrument_type", ["stock"])
+    assert predicate(STOCK)
+    assert not predicate(SPREAD)
+    assert not predicate({})
+
+
+def test_underlying_is_looked_for_on_the_stock_and_the_legs_it_has():
+
+    assert underlyingIn(["VOD LN Equity"])(STOCK)
+    assert underlyingIn(["AAPL US Equity"])(SPREAD)
+    assert not underlyingIn(["AAPL US Equity"])(STOCK)
+
+    # Leg 1 is past the leg count
+    assert not underlyingIn(["BBG000B9XRY4"])(SPREAD)
+    assert underlyingIn(["BBG000B9XRY4"])(dict(SPREAD, ioi_instrument_option_legs_count=2))
+
+
+def test_any_side_within():
+
+    assert anySideWithin(SIZE_FIELDS, 1000, None)(STOCK)
+    assert anySideWithin(SIZE_FIELDS, None, 1000)(STOCK)
+    assert not anySideWithin(SIZE_FIELDS, 600, 1900)(STOCK)
+    assert anySideWithin(SIZE_FIELDS, 500, 500)(STOCK)
+    assert not anySideWithin(SIZE_FIELDS, None, None)({})
+
+
+def test_every_rule_must_pass_and_rejections_are_counted_by_rule():
+
+    ioiFilter = IOIFilter({"underlyings": ["VOD LN Equity", "AAPL US Equity"], "instrumentTypes": ["stock"],
+                           "minSize": 1000})
+    assert ioiFilter.rules == ("instrumentTypes", "minSize", "underlyings")
+
+    assert ioiFilter(STOCK)
+    assert not ioiFilter(SPREAD)
+    assert not ioiFilter(dict(STOCK, ioi_offer_size_quantity=900))
+    assert not ioiFilter(dict(STOCK, ioi_instrument_stock_security_ticker="BP/ LN Equity"))
+    assert ioiFilter.rejected == {"instrumentTypes": 1, "minSize": 1, "underlyings": 1}
+
+
+def test_moneyness_bounds():
+
+    assert IOIFilter({"moneyness": (0.9, 1.1)})(SPREAD)
+    assert not IOIFilter({"moneyness": (1.0, None)})(SPREAD)
+    assert not IOIFilter({"moneyness": (0.9, 1.1)})(STOCK)
+
+
+def test_unknown_rules_are_refused():
+
+    with pytest.raises(ValueError) as e:
+        IOIFilter({"minSize": 1, "colour": "red"})
+    assert "colour" in str(e.value)
+
+
+def test_views_dicts_and_records_filter_alike():
+
+    simulator = IOIServiceSimulator(seed=5)
+    ticks = [simulator.nextTick() for i in range(200)]
+    msgs = list(simulator.dataEvent(ticks, blpapi.CorrelationId(1)))
+    extractor = IOIFieldExtractor()
+
+    rules = {"instrumentTypes": ["option"], "minSize": 1000}
+    expected = [IOIFilter(rules)(tick) for tick in ticks]
+    assert any(expected) and not all(expected)
+
+    assert [IOIFilter(rules)(extractor.view(msg)) for msg in msgs] == expected
+    assert [IOIFilter(rules)(IOIRecord.fromFields(tick)) for tick in ticks] == expected
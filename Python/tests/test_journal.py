@@ -0,0 +1,131 @@
+# test_journal.py
+
+import marshal
+import os
+import time
+
+import pytest
+
+pytest.importorskip("blpapi")
+
+from ioi_journal import JournalWriter, JournalReader, RECORD
+
+FIELDS = ["ioi_id", "ioi_bid_price_fixed_price", "ioi_sentTime", "state"]
+
+
+def writeTicks(path, ticks):
+    writer = JournalWriter(str(path), FIELDS)
+    for tick in ticks:
+        writer.write(tick)
+    writer.close()
+    return writer
+
+
+def test_round_trip(tmp_path):
+
+    ticks = [
+        {"ioi_id": "a", "ioi_bid_price_fixed_price": 83.63, "ioi_sentTime": "2017-12-15T12:00:00.125+00:00"},
+        {"ioi_id": "b", "state": "active"},
+        {"ioi_id": "a", "ioi_bid_price_fixed_price": 83.64},
+    ]
+    writeTicks(tmp_path / "j", ticks)
+
+    reader = JournalReader(str(tmp_path / "j"))
+    records = list(reader.records())
+    reader.close()
+
+    assert [ioi for writtenAt, sentTime, ioi in records] == ticks
+    assert [sentTime for writtenAt, sentTime, ioi in records] == [1513339200125000000, 0, 0]
+
+
+def test_reopen_appends_and_drops_a_torn_record(tmp_path):
+
+    path = str(tmp_path / "j")
+    writeTicks(path, [{"ioi_id": "a"}, {"ioi_id": "b"}])
+
+    # A crash part-way through the last record
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 3)
+
+    writeTicks(path, [{"ioi_id": "c"}])
+
+    reader = JournalReader(path)
+    assert [ioi["ioi_id"] for writtenAt, sentTime, ioi in reader.records()] == ["a", "c"]
+    reader.close()
+
+
+def test_reopen_with_other_fields_is_refused(tmp_path):
+
+    path = str(tmp_path / "j")
+    writeTicks(path, [{"ioi_id": "a"}])
+
+    with pytest.raises(ValueError):
+        JournalWriter(path, ["ioi_id"])
+
+
+def test_range_replay_is_on_write_time(tmp_path):
+
+    # sentTimes out of order, as a paint, a reconciliation and ticks without
+    # a sentTime leave them; ranges follow the order ticks were written in
+    path = str(tmp_path / "j")
+    writer = JournalWriter(path, FIELDS)
+    marks = []
+    for handle, sentTime in [("a", "2017-12-15T10:00:00.000+00:00"), ("b", "2017-12-15T09:00:00.000+00:00"),
+                             ("c", None), ("d", "2017-12-15T10:00:05.000+00:00"), ("e", None)]:
+        marks.append(time.time_ns())
+        time.sleep(0.002)
+        tick = {"ioi_id": handle}
+        if sentTime:
+            tick["ioi_sentTime"] = sentTime
+        writer.write(tick)
+    writer.writeGap()
+    writer.close()
+
+    reader = JournalReader(path)
+
+    def handles(**kwargs):
+        return [ioi and ioi["ioi_id"] for writtenAt, sentTime, ioi in reader.records(**kwargs)]
+
+    assert handles() == ["a", "b", "c", "d", "e", None]
+    assert handles(start=marks[1], end=marks[4]) == ["b", "c", "d"]
+    assert handles(end=marks[3]) == ["a", "b", "c"]
+    assert handles(start=marks[4]) == ["e", None]
+    assert len(reader) == 6
+
+    replayed, gaps = [], []
+    assert reader.replay(replayed.append, start=marks[2], onGap=gaps.append) == 3
+    assert [ioi["ioi_id"] for ioi in replayed] == ["c", "d", "e"]
+    assert len(gaps) == 1
+    reader.close()
+
+
+def test_write_times_never_decrease(tmp_path, monkeypatch):
+
+    path = str(tmp_path / "j")
+    writer = JournalWriter(path, FIELDS)
+    clock = iter([5000, 4000, 6000])
+    monkeypatch.setattr(time, "time_ns", lambda: next(clock))
+    for handle in "abc":
+        writer.write({"ioi_id": handle})
+    monkeypatch.undo()
+    writer.close()
+
+    reader = JournalReader(path)
+    assert [writtenAt for writtenAt, sentTime, ioi in reader.records()] == [5000, 5000, 6000]
+    reader.close()
+
+
+def test_offsets_resume_replay(tmp_path):
+
+    path = str(tmp_path / "j")
+    writer = JournalWriter(path, FIELDS)
+    writer.write({"ioi_id": "a"})
+    position = writer.position
+    writer.write({"ioi_id": "b"})
+    writer.close()
+
+    assert os.path.getsize(path) == position + RECORD.size + len(marshal.dumps({0: "b"}))
+
+    reader = JournalReader(path)
+    assert [ioi["ioi_id"] for writtenAt, sentTime, ioi in reader.records(offset=position)] == ["b"]
+    reader.close()
@@ -0,0 +1,69 @@
+# test_latency.py
+
+import logging
+import random
+
+from ioi_latency import TickLatency, NANOS
+
+MILLIS = NANOS // 1000
+
+
+def feed(latency, start, seconds, perSecond=100, value=None):
+
+    # perSecond ticks a second for the given seconds, each value(i) late
+    step = NANOS // perSecond
+    for i in range(int(seconds * perSecond)):
+        received = start + i * step
+        latency.record(received - (value(i) if value else 0), received)
+    return start + int(seconds * NANOS)
+
+
+def test_percentiles_over_the_last_samples():
+
+    latency = TickLatency(samples=1000)
+    assert latency.percentiles() == {0.5: 0.0, 0.9: 0.0, 0.99: 0.0}
+
+    rng = random.Random(2)
+    older = [rng.randrange(500 * MILLIS, 600 * MILLIS) for i in range(500)]
+    recent = [rng.randrange(1 * MILLIS, 100 * MILLIS) for i in range(1000)]
+    for i, value in enumerate(older + recent):
+        latency.record(i * MILLIS, i * MILLIS + value)
+
+    ordered = sorted(recent)
+    assert latency.percentiles((0.5, 0.99)) == {0.5: ordered[500] / NANOS, 0.99: ordered[990] / NANOS}
+    assert latency.percentiles((1.0,))[1.0] == ordered[-1] / NANOS
+    assert latency.count == 1500
+
+
+def test_lag_is_measured_against_the_lowest_window_mean(caplog):
+
+    latency = TickLatency(window=1.0, threshold=0.5)
+    offset = 3 * NANOS
+
+    # Clock offset alone never counts as lag
+    now = feed(latency, 10 * NANOS, 3, value=lambda i: offset + 20 * MILLIS)
+    assert latency.baseline == offset + 20 * MILLIS
+    assert latency.lag == 0 and not latency.lagging
+
+    with caplog.at_level(logging.WARNING, logger="ioi.latency"):
+        now = feed(latency, now, 1.5, value=lambda i: offset + 400 * MILLIS)
+        assert not latency.lagging
+        now = feed(latency, now, 2, value=lambda i: offset + 900 * MILLIS)
+        assert latency.lagging
+        assert abs(latency.lag - 880 * MILLIS) < MILLIS
+        now = feed(latency, now, 2, value=lambda i: offset + 30 * MILLIS)
+        assert not latency.lagging
+
+    warnings = [r.getMessage() for r in caplog.records]
+    assert len(warnings) == 2
+    assert "falling behind" in warnings[0] and "back within" in warnings[1]
+    assert latency.baseline == offset + 20 * MILLIS
+
+
+def test_a_lower_window_resets_the_baseline():
+
+    latency = TickLatency(window=1.0)
+    now = feed(latency, 0, 2.5, value=lambda i: 200 * MILLIS)
+    now = feed(latency, now, 2, value=lambda i: 50 * MILLIS)
+    assert latency.baseline == 50 * MILLIS
+    assert latency.lag == 0
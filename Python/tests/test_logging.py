@@ -0,0 +1,113 @@
+# test_logging.py
+
+import io
+import logging
+import threading
+
+import ioi_logging
+from ioi_logging import AsyncLogging
+
+log = logging.getLogger("ioi.test")
+
+
+class StalledStream(io.StringIO):
+
+    # A writer stream that blocks until released
+    def __init__(self):
+        io.StringIO.__init__(self)
+        self.release = threading.Event()
+        self.writing = threading.Event()
+
+    def write(self, text):
+        self.writing.set()
+        self.release.wait()
+        return io.StringIO.write(self, text)
+
+
+def test_records_are_written_in_order_with_their_fields():
+
+    stream = io.StringIO()
+    asyncLogging = AsyncLogging(logging.INFO, stream=stream, fmt="%(levelname)s %(message)s").start()
+
+    log.info("tick %d", 1, extra={"fields": {"handle": "a", "px": 83.63}})
+    log.debug("not written")
+    log.warning("tick %d", 2)
+    asyncLogging.stop()
+
+    assert stream.getvalue().splitlines() == ["INFO tick 1 handle=a px=83.63", "WARNING tick 2"]
+
+
+def test_fields_are_copied_at_the_call():
+
+    stream = io.StringIO()
+    asyncLogging = AsyncLogging(logging.INFO, stream=stream, fmt="%(message)s")
+
+    # Queued while the writer is not running yet, then changed by the caller
+    fields = {"state": "active"}
+    values = ["before"]
+    log.info("%s", values, extra={"fields": fields})
+    fields["state"] = "cancelled"
+    values[0] = "after"
+
+    asyncLogging.start()
+    asyncLogging.stop()
+
+    assert stream.getvalue().splitlines() == ["['before'] state=active"]
+
+
+def test_full_queue_drops_instead_of_blocking():
+
+    stream = io.StringIO()
+    asyncLogging = AsyncLogging(logging.INFO, stream=stream, queueSize=2, fmt="%(message)s")
+
+    for i in range(5):
+        log.info("record %d", i)
+    assert asyncLogging.handler.dropped == 3
+
+    asyncLogging.start()
+    asyncLogging.stop()
+    assert stream.getvalue().splitlines() == ["record 0", "record 1"]
+
+
+def test_stop_waits_for_room_on_a_full_queue():
+
+    stream = StalledStream()
+    asyncLogging = AsyncLogging(logging.INFO, stream=stream, queueSize=1, fmt="%(message)s").start()
+
+    log.info("first")
+    assert stream.writing.wait(5)
+    log.info("second")
+
+    # The queue is full until the writer is released
+    timer = threading.Timer(0.2, stream.release.set)
+    timer.start()
+    asyncLogging.stop()
+    timer.join()
+
+    assert stream.getvalue().splitlines() == ["first", "second"]
+    assert asyncLogging.handler.dropped == 0
+
+
+def test_stop_gives_up_on_a_stalled_writer(monkeypatch, capsys):
+
+    monkeypatch.setattr(ioi_logging, "d_stopTimeout", 0.1)
+    stream = StalledStream()
+    asyncLogging = AsyncLogging(logging.INFO, stream=stream, queueSize=1, fmt="%(message)s").start()
+
+    log.info("first")
+    assert stream.writing.wait(5)
+    log.info("second")
+    log.info("dropped")
+
+    try:
+        asyncLogging.stop()
+    finally:
+        stream.release.set()
+
+    err = capsys.readouterr().err
+    assert "1 records unwritten" in err
+    assert "1 records dropped" in err
+
+    # Nothing reaches the stopped logger's queue afterwards
+    log.info("after stop")
+    assert asyncLogging.handler.dropped == 1
@@ -0,0 +1,83 @@
+# test_metrics.py
+
+import random
+
+from ioi_metrics import LatencyHistogram, MetricsRegistry, bucketIndex, bucketCeiling, d_precisionBits
+
+
+def test_bucket_ceiling_bounds_its_values():
+
+    # Every value lands in a bucket whose ceiling is at least the value and
+    # within the histogram's relative precision of it
+    error = 1.0 / (1 << (d_precisionBits - 1))
+    previous = 0
+    for value in list(range(100000)) + [random.randrange(1 << 40) for i in range(10000)]:
+        index = bucketIndex(value)
+        ceiling = bucketCeiling(index)
+        assert value <= ceiling <= value + max(1, value * error)
+        assert bucketIndex(ceiling) == index
+        if value < 100000:
+            assert index >= previous
+            previous = index
+
+
+def test_exact_below_precision():
+
+    for value in range(1 << d_precisionBits):
+        assert bucketCeiling(bucketIndex(value)) == value
+
+
+def test_percentiles_match_sorted_samples():
+
+    rng = random.Random(7)
+    samples = [rng.lognormvariate(-7, 1.5) for i in range(20000)]
+    histogram = LatencyHistogram()
+    for sample in samples:
+        histogram.record(sample)
+
+    ordered = sorted(samples)
+    error = 1.0 / (1 << (d_precisionBits - 1))
+    for quantile, value in histogram.percentiles().items():
+        exact = ordered[max(1, int(quantile * len(ordered) + 0.5)) - 1]
+        assert exact - 1e-6 <= value <= exact * (1 + error) + 2e-6
+
+    assert histogram.count == len(samples)
+    assert abs(histogram.max - max(samples)) < 1e-12
+
+
+def test_empty_and_reset():
+
+    histogram = LatencyHistogram()
+    assert histogram.percentile(0.99) == 0.0
+
+    histogram.record(0.25)
+    assert histogram.percentile(0.5) >= 0.25
+
+    histogram.reset()
+    assert histogram.count == 0
+    assert histogram.percentile(0.5) == 0.0
+
+
+def test_values_past_the_range_are_clamped():
+
+    histogram = LatencyHistogram(maxSeconds=1.0)
+    histogram.record(50.0)
+    histogram.record(-1.0)
+
+    assert histogram.count == 2
+    assert histogram.max == 50.0
+    assert histogram.percentile(0.99) <= 1.01
+
+
+def test_registry_renders_summaries_and_counters():
+
+    registry = MetricsRegistry()
+    registry.histogram("ioi_test_seconds", "Test latency", operation="createIoi").record(0.002)
+    registry.counter("ioi_test_total", "Test counter").inc(3)
+    registry.sampled("ioi_test_live", "Test gauge", lambda: 42)
+
+    text = registry.render()
+    assert 'ioi_test_seconds{operation="createIoi",quantile="0.5"}' in text
+    assert 'ioi_test_seconds_count{operation="createIoi"} 1' in text
+    assert "ioi_test_total 3" in text
+    assert "ioi_test_live 42" in text
@@ -0,0 +1,92 @@
+# test_record.py
+
+import random
+
+import pytest
+
+pytest.importorskip("blpapi")
+
+from ioi_fields import loadSchema, EXTRA_FIELDS
+from ioi_record import IOIRecord, QuoteRecord, LegRecord, LOCATIONS, IOI_SLOTS, QUOTE_SLOTS, LEG_SLOTS
+from ioi_simulator import syntheticIOI
+
+
+def synthetic(seed, legs=3, qualifiers=3):
+    return syntheticIOI(random.Random(seed), "SIM-%d" % seed, legs=legs, qualifiers=qualifiers)
+
+
+def test_every_field_has_a_place():
+
+    for field, datatype in loadSchema() + EXTRA_FIELDS:
+        assert field in LOCATIONS, field
+
+    assert LOCATIONS["ioi_goodUntil"] == ("ioi", "goodUntil")
+    assert LOCATIONS["id_value"] == ("ioi", "id_value")
+    assert LOCATIONS["ioi_bid_price_fixed_price"] == ("quote", "bid", "price_fixed_price")
+    assert LOCATIONS["ioi_offer_qualifiers_2"] == ("qualifier", "offer", 2)
+    assert LOCATIONS["ioi_instrument_option_legs_1_strike"] == ("leg", 1, "strike")
+    assert "goodUntil" in IOI_SLOTS and "size_quantity" in QUOTE_SLOTS and "strike" in LEG_SLOTS
+
+
+def test_generated_init_and_shallow_copy_cover_every_slot():
+
+    for cls in (IOIRecord, QuoteRecord, LegRecord):
+        record = cls()
+        assert all(getattr(record, attr) is None for attr in cls.__slots__)
+        assert not hasattr(record, "__dict__")
+
+        for i, attr in enumerate(cls.__slots__):
+            setattr(record, attr, i)
+        other = record.shallowCopy()
+        assert other is not record and other.__class__ is cls
+        assert [getattr(other, attr) for attr in cls.__slots__] == list(range(len(cls.__slots__)))
+
+
+def test_fields_round_trip():
+
+    for seed, legs in enumerate((0, 1, 2, 3, 4)):
+        fields = synthetic(seed, legs=legs, qualifiers=seed % 4)
+        assert IOIRecord.fromFields(fields).toFields() == fields
+
+
+def test_get_by_field_name():
+
+    fields = synthetic(1, legs=2, qualifiers=2)
+    record = IOIRecord.fromFields(dict(fields, no_such_field=1))
+
+    for field, value in fields.items():
+        assert record.get(field) == value
+    assert record.get("goodUntil") == fields["ioi_goodUntil"]
+
+    assert record.get("no_such_field") is None
+    assert record.get("ioi_instrument_option_legs_3_strike", "none") == "none"
+    assert record.get("ioi_bid_qualifiers_4", "none") == "none"
+    assert IOIRecord().get("ioi_offer_notes", "none") == "none"
+
+
+def test_copy_does_not_share_sub_records():
+
+    record = IOIRecord.fromFields(synthetic(2))
+    other = record.copy()
+    assert other == record
+
+    other.setFields({"ioi_bid_size_quantity": 1, "ioi_instrument_option_legs_0_strike": 1.0})
+    assert record.get("ioi_bid_size_quantity") != 1
+    assert record.get("ioi_instrument_option_legs_0_strike") != 1.0
+
+
+def test_update_keeps_fields_the_tick_does_not_carry():
+
+    first = synthetic(3, legs=2, qualifiers=0)
+    tick = {"ioi_id": first["ioi_id"], "ioi_bid_size_quantity": 700, "ioi_instrument_option_legs_1_strike": 99.0,
+            "ioi_instrument_option_legs_3_strike": 101.0}
+    expected = dict(first, **tick)
+
+    fromDict = IOIRecord.fromFields(first)
+    fromDict.update(tick)
+    assert fromDict.toFields() == expected
+
+    fromRecord = IOIRecord.fromFields(first)
+    fromRecord.update(IOIRecord.fromFields(tick))
+    assert fromRecord.toFields() == expected
+    assert fromRecord == fromDict
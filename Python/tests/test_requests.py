@@ -0,0 +1,158 @@
+# test_requests.py
+
+import time
+
+import pytest
+
+blpapi = pytest.importorskip("blpapi")
+
+from ioi_metrics import requestFailures
+from ioi_requests import RequestRegistry, RequestTimeout
+from ioi_simulator import IOIServiceSimulator, adminEvent
+
+
+class SilentSession():
+
+    # Accepts requests and never answers them
+    def __init__(self):
+        self.sent = []
+
+    def sendRequest(self, request, identity=None, correlationId=None):
+        self.sent.append(correlationId)
+        return correlationId
+
+
+class FailingSession():
+
+    def sendRequest(self, request, identity=None, correlationId=None):
+        raise Exception("session not started")
+
+
+def responseEvent(eventType, correlationId):
+    return adminEvent(eventType, "RequestFailure", correlationId)
+
+
+@pytest.fixture
+def registry():
+    registry = RequestRegistry(timeout=5)
+    yield registry
+    registry.close()
+
+
+def test_responses_are_matched_to_their_requests_in_any_order(registry):
+
+    simulator = IOIServiceSimulator(tickRate=0, latency=0.002, jitter=0.01, seed=4)
+    handles = [simulator.nextTick()["ioi_id"] for i in range(20)]
+    session = simulator.createSession(handler=lambda event, session: registry.processResponseEvent(event))
+    session.startAsync()
+
+    order = []
+    sent = []
+    for handle in handles:
+        request = simulator.requestService.createRequest("cancelIoi")
+        request.getElement("handle").setElement("value", handle)
+        sent.append(registry.send(session, request, "cancelIoi", callback=order.append, context=handle))
+
+    for pending in sent:
+        assert pending.future.result(5) is pending
+    session.stop()
+
+    for pending in sent:
+        assert pending.response.getElementAsString("value") == pending.context
+        assert pending.error is None and pending.latency > 0
+    assert sorted(order, key=sent.index) == sent
+    assert order != sent
+    assert (registry.completed, registry.failed, len(registry)) == (20, 0, 0)
+    assert registry.histograms["cancelIoi"].count >= 20
+
+
+def test_partial_responses_are_kept_until_the_response(registry):
+
+    pending = registry.send(SilentSession(), None)
+
+    for i in range(2):
+        assert registry.processResponseEvent(responseEvent(blpapi.Event.PARTIAL_RESPONSE, pending.correlationId))
+    assert not pending.future.done()
+
+    assert registry.processResponseEvent(responseEvent(blpapi.Event.RESPONSE, pending.correlationId))
+    assert pending.future.result(1) is pending
+    assert len(pending.partial) == 2 and pending.response is not None
+    assert registry.completed == 1
+
+
+def test_a_request_status_fails_the_request(registry):
+
+    pending = registry.send(SilentSession(), None)
+    assert registry.processResponseEvent(responseEvent(blpapi.Event.REQUEST_STATUS, pending.correlationId))
+
+    assert pending.future.result(1).error is not None and pending.response is None
+    assert (registry.completed, registry.failed) == (0, 1)
+
+    # Other requests' events are not ours
+    assert not registry.processResponseEvent(responseEvent(blpapi.Event.RESPONSE, blpapi.CorrelationId(7)))
+
+
+def test_unanswered_requests_time_out(registry):
+
+    failures = requestFailures("testTimeout", "timeout")
+    before = failures.value
+
+    pending = registry.send(SilentSession(), None, "testTimeout", timeout=0.05)
+    assert isinstance(pending.future.result(2).error, RequestTimeout)
+    assert "testTimeout" in str(pending.error)
+    assert (registry.timedOut, registry.failed, len(registry)) == (1, 1, 0)
+    assert failures.value == before + 1
+
+    # A response arriving after the deadline is ignored
+    assert not registry.processResponseEvent(responseEvent(blpapi.Event.RESPONSE, pending.correlationId))
+    assert registry.completed == 0
+
+
+def test_a_shorter_deadline_wakes_the_watchdog(registry):
+
+    session = SilentSession()
+    slow = registry.send(session, None, timeout=10)
+    started = time.time()
+    fast = registry.send(session, None, timeout=0.05)
+
+    assert isinstance(fast.future.result(2).error, RequestTimeout)
+    assert time.time() - started < 1
+    assert not slow.future.done()
+
+
+def test_a_request_that_fails_to_send_is_forgotten(registry):
+
+    with pytest.raises(Exception):
+        registry.send(FailingSession(), None, timeout=0.05)
+    assert len(registry) == 0
+
+    time.sleep(0.2)
+    assert registry.timedOut == 0
+
+
+def test_a_failing_callback_fails_the_future_not_the_caller(registry):
+
+    def callback(pending):
+        raise ValueError("callback failed")
+
+    pending = registry.send(SilentSession(), None, callback=callback)
+    registry.processResponseEvent(responseEvent(blpapi.Event.RESPONSE, pending.correlationId))
+
+    with pytest.raises(ValueError):
+        pending.future.result(1)
+
+
+def test_callbacks_may_send_further_requests(registry):
+
+    session = SilentSession()
+    chained = []
+
+    def callback(pending):
+        chained.append(registry.send(session, None))
+
+    first = registry.send(session, None, callback=callback)
+    registry.processResponseEvent(responseEvent(blpapi.Event.RESPONSE, first.correlationId))
+
+    assert first.future.result(1) is first
+    assert len(chained) == 1 and len(registry) == 1
+    assert chained[0].correlationId.value() == first.correlationId.value() + 1
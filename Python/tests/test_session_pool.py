@@ -0,0 +1,125 @@
+# test_session_pool.py
+
+import asyncio
+
+import pytest
+
+blpapi = pytest.importorskip("blpapi")
+
+import ioi_asyncio
+from ioi_asyncio import RequestError
+from ioi_session_pool import SessionPool
+from ioi_simulator import IOIServiceSimulator
+
+AUTH_SERVICE = "//blp/apiauth"
+REQUEST_SERVICE = "//blp/ioiapi-beta-request"
+
+
+@pytest.fixture
+def simulator(monkeypatch):
+
+    simulator = IOIServiceSimulator(tickRate=0, latency=0.001, jitter=0.0, seed=3)
+
+    def createSession(sessionOptions=None, handler=None):
+
+        # Records what each session sends, and with which identity
+        session = simulator.createSession(sessionOptions, handler)
+        session.sent = []
+        send = session.sendRequest
+
+        def sendRequest(request, identity=None, correlationId=None):
+            session.sent.append(identity)
+            return send(request, identity=identity, correlationId=correlationId)
+
+        session.sendRequest = sendRequest
+        return session
+
+    monkeypatch.setattr(ioi_asyncio, "d_sessionFactory", createSession)
+    return simulator
+
+
+def newPool(size=3, reauthInterval=3600):
+    return SessionPool(blpapi.SessionOptions(), AUTH_SERVICE, REQUEST_SERVICE, "emrs", "0.0.0.0",
+                       size=size, reauthInterval=reauthInterval)
+
+
+def test_members_are_started_authorized_and_rotated(simulator):
+
+    async def run():
+        pool = newPool()
+        await pool.start()
+        acquired = [pool.acquire() for i in range(6)]
+        await pool.stop()
+        return pool, acquired
+
+    pool, acquired = asyncio.run(run())
+
+    assert len(pool.members) == 3
+    assert acquired == pool.members * 2
+    for member in pool.members:
+        assert member.service is simulator.requestService
+        assert member.identity is not None
+        assert member.session.terminated.done()
+
+
+def test_a_request_goes_out_on_the_member_it_was_built_from(simulator):
+
+    handle = simulator.nextTick()["ioi_id"]
+
+    async def run():
+        pool = newPool()
+        await pool.start()
+        pool.acquire()
+
+        member = pool.acquire()
+        request = member.service.createRequest("cancelIoi")
+        request.getElement("handle").setElement("value", handle)
+        messages = await member.sendRequest(request, "cancelIoi")
+
+        await pool.stop()
+        return pool, member, messages
+
+    pool, member, messages = asyncio.run(run())
+
+    assert [msg.getElementAsString("value") for msg in messages] == [handle]
+    assert member.session.session.sent == [member.identity]
+    for other in pool.members:
+        if other is not member:
+            assert other.session.session.sent == []
+
+
+def test_identities_are_renewed_in_the_background(simulator):
+
+    async def run():
+        pool = newPool(size=2, reauthInterval=0.05)
+        await pool.start()
+        first = [m.identity for m in pool.members]
+        await asyncio.sleep(0.3)
+        renewed = [m.identity for m in pool.members]
+        await pool.stop()
+        return first, renewed
+
+    first, renewed = asyncio.run(run())
+    assert all(new is not None and new is not old for old, new in zip(first, renewed))
+
+
+def test_a_failed_start_stops_the_members_already_started(simulator, monkeypatch):
+
+    createSession = ioi_asyncio.d_sessionFactory
+
+    def disconnected(sessionOptions=None, handler=None):
+        session = createSession(sessionOptions, handler)
+        session.connected = False
+        return session
+
+    # Services fail to open on a session that is not connected
+    monkeypatch.setattr(ioi_asyncio, "d_sessionFactory", disconnected)
+
+    async def run():
+        pool = newPool(size=2)
+        with pytest.raises(RequestError):
+            await pool.start()
+        return pool
+
+    pool = asyncio.run(run())
+    assert all(m.session.terminated.done() for m in pool.members)
@@ -0,0 +1,132 @@
+# test_snapshot.py
+
+import pytest
+
+blpapi = pytest.importorskip("blpapi")
+
+import py_dapi_SubscribeIOI
+from ioi_book import IOIBook
+from ioi_journal import JournalWriter, JournalReader
+from ioi_simulator import IOIServiceSimulator
+from ioi_snapshot import IOISnapshots, PaintReconciliation
+
+FIELDS = ["ioi_id", "ioi_routing_broker", "ioi_bid_price_fixed_price", "state", "ioi_sentTime"]
+
+
+def asDicts(book):
+    return dict((handle, dict(ioi.items())) for handle, ioi in book.iois.items())
+
+
+def test_snapshot_round_trip(tmp_path):
+
+    book = IOIBook()
+    book.apply({"ioi_id": "a", "ioi_routing_broker": "BLPA", "ioi_bid_price_fixed_price": 83.63})
+    book.apply({"ioi_id": "b", "state": "active"})
+
+    snapshots = IOISnapshots(str(tmp_path / "s"), FIELDS)
+    assert snapshots.write(book, 1234) == 2
+
+    position, takenAt, iois = snapshots.read()
+    assert position == 1234
+    assert sorted(iois, key=lambda ioi: ioi["ioi_id"]) == sorted(asDicts(book).values(), key=lambda ioi: ioi["ioi_id"])
+
+
+def test_recover_replays_the_journal_after_the_snapshot(tmp_path):
+
+    journalPath = str(tmp_path / "j")
+    ticks = [
+        {"ioi_id": "a", "ioi_bid_price_fixed_price": 1.0},
+        {"ioi_id": "b", "ioi_bid_price_fixed_price": 2.0},
+        {"ioi_id": "a", "ioi_bid_price_fixed_price": 1.5},
+        {"ioi_id": "c", "ioi_routing_broker": "BLPB"},
+        {"ioi_id": "b", "state": "deleted"},
+    ]
+
+    book = IOIBook()
+    journal = JournalWriter(journalPath, FIELDS)
+    snapshots = IOISnapshots(str(tmp_path / "s"), FIELDS)
+
+    for i, tick in enumerate(ticks):
+        if i == 3:
+            journal.flush()
+            snapshots.write(book, journal.position)
+        book.apply(tick)
+        journal.write(tick)
+    journal.close()
+
+    recovered = IOIBook()
+    assert snapshots.recover(recovered, journalPath) == (2, 2)
+    assert asDicts(recovered) == asDicts(book)
+
+
+def test_recover_without_a_snapshot(tmp_path):
+
+    book = IOIBook()
+    assert IOISnapshots(str(tmp_path / "s"), FIELDS).recover(book, None) == (0, 0)
+    assert len(book) == 0
+
+
+def test_paint_reconciliation():
+
+    reconciliation = PaintReconciliation()
+    assert reconciliation.unconfirmed == set()
+    assert not reconciliation.wait(0)
+
+    # Paint ticks can arrive before the held handles are handed over
+    assert reconciliation.tick("a", True) is False
+    reconciliation.hold(["a", "b", "c"])
+    assert reconciliation.tick("c", True) is False
+    assert reconciliation.tick("d", False) is True
+
+    assert reconciliation.wait(0)
+    assert reconciliation.painted == 2
+    assert reconciliation.unconfirmed == set(["b"])
+
+
+@pytest.fixture
+def subscriber(monkeypatch, tmp_path):
+
+    # A subscriber handler with no session: events are fed to it directly
+    monkeypatch.setattr(py_dapi_SubscribeIOI, "d_journal", str(tmp_path / "j"))
+    monkeypatch.setattr(py_dapi_SubscribeIOI, "d_snapshot", None)
+    monkeypatch.setattr(py_dapi_SubscribeIOI, "d_workers", 0)
+
+    def create(conflate):
+        monkeypatch.setattr(py_dapi_SubscribeIOI, "d_conflate", conflate)
+        return py_dapi_SubscribeIOI.SessionEventHandler()
+
+    return create
+
+
+@pytest.mark.parametrize("conflate", [False, True])
+def test_paint_after_a_gap_removes_ioi_no_longer_live(subscriber, tmp_path, conflate):
+
+    simulator = IOIServiceSimulator(seed=11, liveIOIs=20)
+    correlationId = blpapi.CorrelationId(1)
+    handler = subscriber(conflate)
+
+    try:
+        handler.processSubscriptionDataEvent(simulator.dataEvent([simulator.nextTick() for i in range(20)], correlationId))
+        handler.processIOI({"ioi_id": "STALE-1", "ioi_routing_broker": "BLPA"})
+        handler.processIOI({"ioi_id": "STALE-2", "ioi_routing_broker": "BLPA"})
+
+        handler.restored(1.0)
+        paint = simulator.paint()
+        handler.processSubscriptionDataEvent(simulator.dataEvent(paint, correlationId, recap=True))
+        live = simulator.nextTick()
+        handler.processSubscriptionDataEvent(simulator.dataEvent([live], correlationId))
+    finally:
+        handler.stop()
+
+    # The book holds what was painted, give or take the IOI of the live tick
+    painted = set(ioi["ioi_id"] for ioi in paint)
+    assert set(handler.book.iois) ^ painted <= set([live["ioi_id"]])
+    assert handler.reconciliation is None
+
+    # Removals are journalled with the time of the reconciliation
+    reader = JournalReader(str(tmp_path / "j"))
+    removals = [(sentTime, ioi) for writtenAt, sentTime, ioi in reader.records()
+                if ioi is not None and ioi.get("ioi_id", ioi.get("id_value", "")).startswith("STALE")]
+    reader.close()
+    assert len(removals) == 2
+    assert all(sentTime > 0 for sentTime, ioi in removals)
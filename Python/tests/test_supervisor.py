@@ -0,0 +1,170 @@
+# test_supervisor.py
+
+import random
+import threading
+import time
+
+import pytest
+
+blpapi = pytest.importorskip("blpapi")
+
+from ioi_supervisor import Backoff, SubscriptionSupervisor, STARTING, OPENING, SUBSCRIBING, LIVE, DOWN, STOPPED
+
+SERVICE = "//blp/ioiapi-beta"
+
+
+class RecordingSession():
+
+    # Records the calls the supervisor makes; opens and subscribes succeed
+    # unless told otherwise
+    def __init__(self, opens=True, subscribes=True):
+        self.opens = opens
+        self.subscribes = subscribes
+        self.calls = []
+        self.called = threading.Event()
+
+    def openServiceAsync(self, serviceName):
+        self.calls.append("open")
+        self.called.set()
+        return self.opens
+
+    def unsubscribe(self, subscriptions):
+        self.calls.append("unsubscribe")
+
+    def subscribe(self, subscriptions):
+        self.calls.append("subscribe")
+        self.called.set()
+        if not self.subscribes:
+            raise Exception("not connected")
+
+
+def newSupervisor(count=2, **kwargs):
+    subscriptions = [("%s/ioi/sub%d" % (SERVICE, i), blpapi.CorrelationId(i)) for i in range(count)]
+    return SubscriptionSupervisor(SERVICE, subscriptions, backoff=Backoff(0.01, 0.01), **kwargs)
+
+
+def goLive(supervisor, session):
+    supervisor.sessionStarted(session)
+    supervisor.serviceOpened(session)
+    for topic, correlationId in supervisor.subscriptions:
+        supervisor.subscriptionStarted(correlationId)
+
+
+def waitFor(predicate, timeout=2):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.005)
+    return predicate()
+
+
+def test_backoff_grows_to_its_cap_with_jitter():
+
+    backoff = Backoff(0.5, 4.0, random.Random(1))
+    delays = [backoff.next() for i in range(6)]
+    for delay, ceiling in zip(delays, (0.5, 1.0, 2.0, 4.0, 4.0, 4.0)):
+        assert ceiling / 2 <= delay <= ceiling
+    assert len(set(delays)) == len(delays)
+
+    backoff.reset()
+    assert backoff.next() <= 0.5
+
+
+def test_startup_reaches_live_once_every_subscription_started():
+
+    session = RecordingSession()
+    supervisor = newSupervisor()
+    assert supervisor.state == STARTING
+
+    supervisor.sessionStarted(session)
+    assert supervisor.state == OPENING
+    supervisor.serviceOpened(session)
+    assert supervisor.state == SUBSCRIBING
+    assert session.calls == ["open", "unsubscribe", "subscribe"]
+
+    supervisor.subscriptionStarted(blpapi.CorrelationId(0))
+    assert supervisor.state == SUBSCRIBING
+    supervisor.subscriptionStarted(blpapi.CorrelationId(1))
+    assert supervisor.state == LIVE
+
+
+def test_connection_loss_reports_a_gap_and_resubscribes_after_reopening():
+
+    gaps, restored = [], []
+    session = RecordingSession()
+    supervisor = newSupervisor(onGap=gaps.append, onRestored=restored.append)
+    goLive(supervisor, session)
+
+    supervisor.connectionDown()
+    supervisor.connectionDown()
+    assert supervisor.state == DOWN
+    assert gaps == ["connection down"]
+
+    del session.calls[:]
+    supervisor.connectionUp(session)
+    assert supervisor.state == OPENING
+    supervisor.serviceOpened(session)
+    for topic, correlationId in supervisor.subscriptions:
+        supervisor.subscriptionStarted(correlationId)
+
+    assert supervisor.state == LIVE
+    assert session.calls == ["open", "unsubscribe", "subscribe"]
+    assert len(restored) == 1 and restored[0] >= 0
+    assert supervisor.gaps == 1
+
+
+def test_a_lost_subscription_is_retried():
+
+    gaps = []
+    session = RecordingSession()
+    supervisor = newSupervisor(onGap=gaps.append)
+    goLive(supervisor, session)
+
+    session.called.clear()
+    supervisor.subscriptionLost(session, blpapi.CorrelationId(1), "terminated")
+    assert gaps == ["terminated"]
+    assert session.called.wait(2)
+    assert supervisor.state == SUBSCRIBING
+
+    # Terminations of the subscriptions being replaced are expected
+    supervisor.subscriptionLost(session, blpapi.CorrelationId(0), "terminated")
+    assert gaps == ["terminated"]
+    supervisor.stop()
+
+
+def test_failed_opens_and_subscribes_are_retried_until_they_succeed():
+
+    session = RecordingSession(opens=False)
+    supervisor = newSupervisor()
+    supervisor.sessionStarted(session)
+    assert waitFor(lambda: session.calls.count("open") >= 3)
+
+    session.opens = True
+    assert waitFor(lambda: supervisor.timer is not None and not supervisor.timer.is_alive())
+    session.subscribes = False
+    supervisor.serviceOpened(session)
+    assert waitFor(lambda: session.calls.count("subscribe") >= 3)
+
+    supervisor.stop()
+    count = len(session.calls)
+    time.sleep(0.1)
+    assert supervisor.state == STOPPED
+    assert len(session.calls) == count
+
+
+def test_a_session_ending_while_down_is_restarted():
+
+    session = RecordingSession()
+    supervisor = newSupervisor()
+    goLive(supervisor, session)
+
+    supervisor.connectionDown()
+    assert supervisor.sessionTerminated()
+    assert supervisor.state == STARTING
+
+    goLive(supervisor, session)
+    assert not supervisor.sessionTerminated()
+    assert supervisor.state == STOPPED
+
+    # Nothing happens once stopped
+    supervisor.sessionStarted(session)
+    assert supervisor.state == STOPPED
@@ -0,0 +1,99 @@
+# test_template.py
+
+import datetime
+
+import pytest
+
+blpapi = pytest.importorskip("blpapi")
+
+from ioi_bulk import buildRequest
+from ioi_simulator import IOIServiceSimulator, flattenElement
+from ioi_template import RequestTemplate, Param, CALL_SPREAD
+
+VALUES = {"goodUntil": datetime.datetime(2017, 12, 15, 12, 15), "bidPrice": 83.63, "bidSize": 1000,
+          "offerPrice": 83.64, "offerSize": 2000}
+
+
+@pytest.fixture(scope="module")
+def service():
+    return IOIServiceSimulator(tickRate=0, seed=1).requestService
+
+
+def resolve(spec, values):
+
+    # The spec with each Param replaced by its value, dropping those left unset
+    if isinstance(spec, dict):
+        resolved = {}
+        for name, sub in spec.items():
+            sub = resolve(sub, values)
+            if sub is not None:
+                resolved[name] = sub
+        return resolved
+    if isinstance(spec, (list, tuple)):
+        return [resolve(item, values) for item in spec]
+    if isinstance(spec, Param):
+        return values.get(spec.name, spec.default)
+    return spec
+
+
+def fields(request):
+    out = {}
+    flattenElement(request.asElement().getElement("ioi"), "ioi", out)
+    return out
+
+
+def test_create_matches_a_request_built_from_the_spec(service):
+
+    template = RequestTemplate(service, "createIoi", CALL_SPREAD, prepared=0)
+    request = template.create(**VALUES)
+
+    expected = fields(buildRequest(service, "createIoi", resolve(CALL_SPREAD, VALUES)))
+    assert fields(request) == expected
+    assert expected["ioi_bid_price_fixed_price"] == 83.63
+    assert expected["ioi_offer_size_quantity"] == 2000
+
+
+def test_every_leg_has_its_type(service):
+
+    request = RequestTemplate(service, "createIoi", CALL_SPREAD, prepared=0).create(**VALUES)
+
+    values = fields(request)
+    assert values["ioi_instrument_option_legs_count"] == 2
+    assert values["ioi_instrument_option_legs_0_type"] == "Call"
+    assert values["ioi_instrument_option_legs_1_type"] == "Call"
+    assert values["ioi_instrument_option_legs_1_ratio"] == -1.25
+
+
+def test_unset_parameters_take_their_default_or_stay_unset(service):
+
+    spec = {"ioi": {"bid": {"price": {"fixed": {"price": Param("bidPrice", 80.0)}},
+                            "size": {"quantity": Param("bidSize")}}}}
+    request = RequestTemplate(service, "createIoi", spec, prepared=0).create()
+
+    values = fields(request)
+    assert values["ioi_bid_price_fixed_price"] == 80.0
+    assert "ioi_bid_size_quantity" not in values
+
+
+def test_prepared_requests_are_used_first_and_never_shared(service):
+
+    template = RequestTemplate(service, "createIoi", CALL_SPREAD, prepared=2)
+    template.prepare()
+    assert len(template.pool) == 2
+
+    first = template.create(**dict(VALUES, bidPrice=1.0))
+    second = template.create(**dict(VALUES, bidPrice=2.0))
+    third = template.create(**dict(VALUES, bidPrice=3.0))
+
+    assert template.pool == []
+    assert [fields(r)["ioi_bid_price_fixed_price"] for r in (first, second, third)] == [1.0, 2.0, 3.0]
+    assert fields(first)["ioi_instrument_option_structure"] == "CallSpread"
+
+
+def test_update_with_a_handle(service):
+
+    spec = {"handle": {"value": Param("handle")}, "ioi": {"bid": {"notes": Param("notes")}}}
+    request = RequestTemplate(service, "updateIoi", spec, prepared=0).create(handle="SIM-1", notes="bid notes")
+
+    assert request.asElement().getElement("handle").getElementAsString("value") == "SIM-1"
+    assert fields(request)["ioi_bid_notes"] == "bid notes"
@@ -0,0 +1,95 @@
+# test_timestamps.py
+
+import calendar
+import datetime
+import random
+
+from ioi_timestamps import TimestampDecoder, daysFromCivil, NANOS
+
+
+def epochNanos(value):
+    return calendar.timegm(value.utctimetuple()) * NANOS + value.microsecond * 1000
+
+
+def test_days_from_civil_matches_datetime():
+
+    epoch = datetime.date(1970, 1, 1)
+    for date in (datetime.date(1970, 1, 1), datetime.date(2000, 2, 29), datetime.date(2017, 12, 15),
+                 datetime.date(1969, 12, 31), datetime.date(2100, 3, 1), datetime.date(1600, 1, 1)):
+        assert daysFromCivil(date.year, date.month, date.day) == (date - epoch).days
+
+
+def test_formats():
+
+    decoder = TimestampDecoder()
+    noon = 1513339200 * NANOS
+
+    assert decoder.nanos("2017-12-15T12:00:00.000+00:00") == noon
+    assert decoder.nanos("2017-12-15T12:00:00") == noon
+    assert decoder.nanos("2017-12-15T12:00:00Z") == noon
+    assert decoder.nanos("2017-12-15 12:00:00.123456") == noon + 123456000
+    assert decoder.nanos("2017-12-15T12:00:00.123456789") == noon + 123456789
+    assert decoder.nanos("2017-12-15T13:30:00.5+01:30") == noon + 500000000
+    assert decoder.nanos("2017-12-15T07:00:00-05:00") == noon
+    assert decoder.nanos("2017-12-15") == noon - 12 * 3600 * NANOS
+
+
+def test_date_with_offset():
+
+    decoder = TimestampDecoder()
+    midnight = 1513296000 * NANOS
+
+    assert decoder.nanos("2017-12-15+00:00") == midnight
+    assert decoder.nanos("2017-12-15Z") == midnight
+    assert decoder.nanos("2017-12-15+02:00") == midnight - 2 * 3600 * NANOS
+    assert decoder.nanos("2017-12-15-05:00") == midnight + 5 * 3600 * NANOS
+
+    # The date it cached is not mistaken for a time of day
+    assert decoder.nanos("2017-12-15T12:00:00") == midnight + 12 * 3600 * NANOS
+    assert decoder.cached("2017-12-15+00:00") == midnight
+
+
+def test_malformed_values():
+
+    decoder = TimestampDecoder()
+    for text in ("", None, "2017-12-15T12:00", "2017-12-15X", "2017-12-15.5", "2017-12-15T12:00:00.",
+                 "2017-12-15T12:00:00+0100", "2017-1x-15", "not a time"):
+        assert decoder.nanos(text) is None, text
+
+
+def test_matches_datetime_across_shared_prefixes():
+
+    decoder = TimestampDecoder()
+    rng = random.Random(3)
+    start = datetime.datetime(2017, 12, 15, 23, 59, 58)
+
+    # Values sharing their date or second with the previous one, and not
+    for i in range(2000):
+        value = start + datetime.timedelta(seconds=rng.choice((0, 0, 1, 86400, -3600)) * i,
+                                           microseconds=rng.randint(0, 999999))
+        assert decoder.nanos(value.isoformat(" ")) == epochNanos(value)
+        assert decoder.nanos(value.strftime("%Y-%m-%dT%H:%M:%S.%f+00:00")) == epochNanos(value)
+
+
+def test_cache_generations():
+
+    decoder = TimestampDecoder(cacheSize=2)
+
+    first = decoder.cached("2017-12-15")
+    decoder.cached("2017-12-16")
+    decoder.cached("2017-12-17")
+    assert "2017-12-15" in decoder.older and "2017-12-17" in decoder.recent
+
+    # A value still recurring is carried over from the older generation
+    assert decoder.cached("2017-12-15") == first
+    assert "2017-12-15" in decoder.recent
+
+    assert decoder.cached("garbage") is None
+    assert "garbage" not in decoder.recent
+
+
+def test_parser_for_per_tick_fields():
+
+    decoder = TimestampDecoder()
+    assert decoder.parserFor("ioi_sentTime") == decoder.nanos
+    assert decoder.parserFor("ioi_goodUntil") == decoder.cached